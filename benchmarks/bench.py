@@ -0,0 +1,245 @@
+"""Microbenchmarks for tiptop's rendering primitives.
+
+Run the suite and print the results with
+```
+python benchmarks/bench.py
+```
+Store the results as the baseline with `--save`, and compare a later run against
+it with `--compare`. The comparison exits with a nonzero status if any primitive
+got slower by more than `--threshold` percent:
+```
+python benchmarks/bench.py --save
+# ... change something ...
+python benchmarks/bench.py --compare --threshold 10
+```
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import random
+import sys
+from pathlib import Path
+from timeit import Timer
+
+from tiptop import BlockCharStream, BrailleMultiStream, BrailleStream
+from tiptop._collectors import create_sampler
+from tiptop._cpu import CPU, chunks, transpose, val_to_color
+from tiptop._helpers import sizeof_fmt
+
+this_dir = Path(__file__).resolve().parent
+default_baseline = this_dir / "baseline.json"
+
+widths = [50, 200, 1000]
+heights = [1, 10, 50]
+stream_counts = [4, 32, 256]
+
+
+def _filled(stream_type, width: int, height: int):
+    stream = stream_type(width, height, 0.0, 100.0)
+    for _ in range(2 * width + 1):
+        stream.add_value(random.uniform(0.0, 100.0))
+    return stream
+
+
+def _stream_add_value(stream_type, width: int, height: int):
+    stream = _filled(stream_type, width, height)
+    values = [random.uniform(0.0, 100.0) for _ in range(1000)]
+    it = itertools.cycle(values)
+
+    def fun():
+        stream.add_value(next(it))
+        # read the graph, as widgets do on every tick
+        stream.graph
+
+    return fun
+
+
+def _braille_reset_width(width: int, height: int):
+    stream = _filled(BrailleStream, width, height)
+
+    def fun():
+        stream.reset_width(width + 1 if stream.width == width else width)
+        stream.graph
+
+    return fun
+
+
+def _braille_reset_height(width: int, height: int):
+    stream = _filled(BrailleStream, width, height)
+
+    def fun():
+        stream.reset_height(height + 1 if stream.height == height else height)
+        stream.graph
+
+    return fun
+
+
+def _sizeof_fmt():
+    nums = [random.uniform(0.0, 1.0e15) for _ in range(100)]
+
+    def fun():
+        for num in nums:
+            sizeof_fmt(num, fmt=".1f")
+
+    return fun
+
+
+def _val_to_color():
+    vals = [random.uniform(0.0, 100.0) for _ in range(100)]
+
+    def fun():
+        for val in vals:
+            val_to_color(val, 0.0, 100.0)
+
+    return fun
+
+
+def _cpu_info_box(num_threads: int):
+    # The widget sets itself up from the sampler of the app; only the thread layout
+    # and the loads are replaced.
+    cpu = CPU(create_sampler(["lo"]))
+    num_cores = max(num_threads // 2, 1)
+    cpu.core_threads = transpose(list(chunks(range(num_threads), num_cores)))
+    cpu.thread_load_stream = BrailleMultiStream(num_threads, 10, 1, 0.0, 100.0)
+    cpu.has_core_temps = False
+    loads = [random.uniform(0.0, 100.0) for _ in range(num_threads)]
+    for _ in range(21):
+        cpu.thread_load_stream.add_values(loads)
+
+    def fun():
+        cpu.thread_load_stream.add_values(loads)
+        cpu._info_box_lines(loads)
+
+    return fun
+
+
+def get_benchmarks():
+    benchmarks = {}
+    for w in widths:
+        for h in heights:
+            benchmarks[f"BrailleStream.add_value[{w}x{h}]"] = (
+                _stream_add_value,
+                (BrailleStream, w, h),
+            )
+            benchmarks[f"BrailleStream.reset_width[{w}x{h}]"] = (
+                _braille_reset_width,
+                (w, h),
+            )
+            benchmarks[f"BrailleStream.reset_height[{w}x{h}]"] = (
+                _braille_reset_height,
+                (w, h),
+            )
+            benchmarks[f"BlockCharStream.add_value[{w}x{h}]"] = (
+                _stream_add_value,
+                (BlockCharStream, w, h),
+            )
+    benchmarks["sizeof_fmt[100]"] = (_sizeof_fmt, ())
+    benchmarks["val_to_color[100]"] = (_val_to_color, ())
+    for n in stream_counts:
+        benchmarks[f"cpu_info_box[{n} threads]"] = (_cpu_info_box, (n,))
+    return benchmarks
+
+
+def run(pattern: str | None = None, repeat: int = 5) -> dict[str, float]:
+    """Returns the best time per call in seconds for each benchmark."""
+    random.seed(0)
+    results = {}
+    for name, (setup, args) in get_benchmarks().items():
+        if pattern is not None and pattern not in name:
+            continue
+        timer = Timer(setup(*args))
+        number, _ = timer.autorange()
+        results[name] = min(timer.repeat(repeat=repeat, number=number)) / number
+        print(f"{name:45s} {_fmt_time(results[name]):>10s}", flush=True)
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float):
+    """Prints the relative change for every benchmark and returns the names of
+    the ones that regressed by more than `threshold` percent.
+    """
+    regressions = []
+    print()
+    print(f"{'benchmark':45s} {'baseline':>10s} {'current':>10s} {'change':>8s}")
+    for name, t in results.items():
+        if name not in baseline:
+            print(f"{name:45s} {'-':>10s} {_fmt_time(t):>10s}")
+            continue
+        t0 = baseline[name]
+        change = (t - t0) / t0 * 100
+        marker = ""
+        if change > threshold:
+            regressions.append(name)
+            marker = "  <-- regression"
+        print(
+            f"{name:45s} {_fmt_time(t0):>10s} {_fmt_time(t):>10s} "
+            f"{change:+7.1f}%{marker}"
+        )
+    return regressions
+
+
+def _fmt_time(t: float) -> str:
+    for unit, factor in [("s", 1.0), ("ms", 1.0e-3), ("us", 1.0e-6)]:
+        if t >= factor:
+            return f"{t / factor:.2f} {unit}"
+    return f"{t / 1.0e-9:.1f} ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--save",
+        action="store_true",
+        help="store the results as baseline",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="compare against the stored baseline",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=default_baseline,
+        help=f"baseline file (default: {default_baseline.name})",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="maximum allowed slowdown in percent (default: 10)",
+    )
+    parser.add_argument(
+        "-k",
+        type=str,
+        default=None,
+        help="only run benchmarks whose name contains this string",
+    )
+    args = parser.parse_args(argv)
+    # check before running the suite, which takes a while
+    if args.compare and not args.save and not args.baseline.exists():
+        parser.error(f"no baseline at {args.baseline}; run with --save first")
+
+    results = run(args.k)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nbaseline written to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold}%")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
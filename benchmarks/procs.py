@@ -0,0 +1,87 @@
+"""Compare the psutil process collector with the /proc fast path, on a synthetic
+/proc with a given number of processes.
+
+Run with
+```
+python benchmarks/procs.py
+```
+"""
+
+import os
+import random
+import tempfile
+from timeit import repeat
+
+import psutil
+
+from tiptop._collectors import ProcessCollector
+from tiptop._procfs import ProcfsProcessCollector
+
+process_counts = [1000, 10000, 50000]
+max_num_procs = 50
+
+
+def _write(path: str, content: str):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _create_procfs(root: str, num_procs: int):
+    # only what psutil and tiptop read
+    _write(f"{root}/stat", "cpu  100 0 100 10000 0 0 0 0 0 0\nbtime 1700000000\n")
+    for pid in range(1, num_procs + 1):
+        d = f"{root}/{pid}"
+        os.mkdir(d)
+        name = f"proc{pid}"
+        utime = random.randint(0, 10000)
+        stime = random.randint(0, 10000)
+        num_threads = random.randint(1, 20)
+        rss = random.randint(100, 100000)
+        _write(
+            f"{d}/stat",
+            f"{pid} ({name}) S 1 {pid} {pid} 0 -1 4194560 100 0 0 0 {utime} {stime} "
+            f"0 0 20 0 {num_threads} 0 {pid} 100000000 {rss} 18446744073709551615 "
+            "1 1 0 0 0 0 0 4096 1088 0 0 0 17 0 0 0 0 0 0 0 0 0 0 0 0 0 0\n",
+        )
+        _write(
+            f"{d}/status",
+            f"Name:\t{name}\nState:\tS (sleeping)\nPid:\t{pid}\n"
+            f"Uid:\t0\t0\t0\t0\nGid:\t0\t0\t0\t0\nThreads:\t{num_threads}\n",
+        )
+        _write(f"{d}/statm", f"10000 {rss} 100 10 0 1000 0\n")
+        _write(f"{d}/cmdline", f"/usr/bin/{name}\0--some\0--args\0")
+
+
+def _time_ms(fun) -> float:
+    # best of 3
+    return min(repeat(fun, number=1, repeat=3)) * 1000
+
+
+def main():
+    random.seed(0)
+    print(f"{'processes':>10} {'psutil':>12} {'/proc':>12} {'speedup':>8}")
+    for num_procs in process_counts:
+        with tempfile.TemporaryDirectory() as root:
+            _create_procfs(root, num_procs)
+
+            psutil.PROCFS_PATH = root
+            try:
+                collector = ProcessCollector(max_num_procs)
+                # the first call sets up the process cache
+                collector()
+                t_psutil = _time_ms(collector)
+            finally:
+                psutil.PROCFS_PATH = "/proc"
+
+            collector = ProcfsProcessCollector(max_num_procs, root=root)
+            collector()
+            t_procfs = _time_ms(collector)
+
+        print(
+            f"{num_procs:10d} {t_psutil:9.1f} ms {t_procfs:9.1f} ms "
+            f"{t_psutil / t_procfs:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
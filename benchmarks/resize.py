@@ -0,0 +1,51 @@
+"""Time BrailleStream.reset_height and reset_width for a range of graph widths.
+
+Run with
+```
+python benchmarks/resize.py
+```
+"""
+
+import random
+from timeit import repeat
+
+from tiptop import BrailleStream
+
+widths = [100, 200, 500, 1000, 2000]
+heights = [10, 50]
+
+
+def _filled_stream(width: int, height: int) -> BrailleStream:
+    stream = BrailleStream(width, height, 0.0, 100.0)
+    for _ in range(2 * width + 1):
+        stream.add_value(random.uniform(0.0, 100.0))
+    return stream
+
+
+def _time_ms(fun) -> float:
+    # best of 5
+    return min(repeat(fun, number=1, repeat=5)) * 1000
+
+
+def main():
+    print(f"{'width':>6} {'height':>6} {'reset_height':>13} {'reset_width':>12}")
+    for height in heights:
+        for width in widths:
+            stream = _filled_stream(width, height)
+
+            def resize_height():
+                # toggle between two heights and render, as on_resize does
+                stream.reset_height(height + 1 if stream.height == height else height)
+                stream.graph
+
+            def resize_width():
+                stream.reset_width(width + 1 if stream.width == width else width)
+                stream.graph
+
+            t_height = _time_ms(resize_height)
+            t_width = _time_ms(resize_width)
+            print(f"{width:6d} {height:6d} {t_height:10.2f} ms {t_width:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
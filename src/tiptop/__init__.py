@@ -1,6 +1,13 @@
 from .__about__ import __version__
 from ._app import run
-from .blockchar_stream import BlockCharStream
-from .braille_stream import BrailleStream
+from .blockchar_stream import BlockCharMultiStream, BlockCharStream
+from .braille_stream import BrailleMultiStream, BrailleStream
 
-__all__ = ["BrailleStream", "BlockCharStream", "run", "__version__"]
+__all__ = [
+    "BrailleStream",
+    "BrailleMultiStream",
+    "BlockCharStream",
+    "BlockCharMultiStream",
+    "run",
+    "__version__",
+]
@@ -1,33 +1,20 @@
 from __future__ import annotations
 
 import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from datetime import time as dt_time
 from sys import version_info
 
-from textual.app import App
-
 from .__about__ import __version__
-from ._cpu import CPU
-from ._disk import Disk
-from ._info import InfoLine
-from ._mem import Mem
-from ._net import Net
-from ._procs_list import ProcsList
-
-# class TiptopApp(App):
-#     async def on_mount(self) -> None:
-#         await self.view.dock(InfoLine(), edge="top", size=1, name="info")
-#         await self.view.dock(CPU(), edge="top", size=14, name="cpu")
-#         await self.view.dock(ProcsList(), edge="right", size=70, name="proc")
-#         await self.view.dock(Mem(), edge="top", size=20, name="mem")
-#         await self.view.dock(Net(), edge="bottom", name="net")
-#
-#     async def on_load(self, _):
-#         await self.bind("i", "view.toggle('info')", "Toggle info")
-#         await self.bind("c", "view.toggle('cpu')", "Toggle cpu")
-#         await self.bind("m", "view.toggle('mem')", "Toggle mem")
-#         await self.bind("n", "view.toggle('net')", "Toggle net")
-#         await self.bind("p", "view.toggle('proc')", "Toggle proc")
-#         await self.bind("q", "quit", "quit")
+from ._collectors import _autoselect_interface, create_sampler
+from ._openmetrics import MetricsServer
+from ._recording import Recording, record
+from ._remote import DEFAULT_PORT, Agent, Connection
+from ._replay import Player
+from ._sampler import Sampler, SamplerThread
 
 
 def run(argv=None):
@@ -57,47 +44,290 @@ def run(argv=None):
         "-n",
         type=str,
         default=None,
-        help="network interface to display (default: auto)",
+        help=(
+            "network interfaces to display, comma-separated (default: auto)\n"
+            "glob patterns like 'eth*' add up all matching interfaces"
+        ),
+    )
+
+    parser.add_argument(
+        "--record",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="record all metrics to a new FILE every 2 s, without display",
+    )
+
+    parser.add_argument(
+        "--replay",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help=(
+            "replay a recording instead of showing live data\n"
+            "space: pause, +/-: speed, left/right: 1 min, pgup/pgdn: 1 h"
+        ),
+    )
+
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="playback speed of --replay (default: 1.0)",
+    )
+
+    parser.add_argument(
+        "--start",
+        type=str,
+        default=None,
+        metavar="TIME",
+        help="start --replay at TIME, e.g., '2022-03-01 14:30' or '14:30'",
+    )
+
+    parser.add_argument(
+        "--serve-metrics",
+        type=str,
+        default=None,
+        metavar="HOST:PORT",
+        help="serve all metrics at http://HOST:PORT/metrics (OpenMetrics)",
+    )
+
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="collect without display, e.g., for --serve-metrics",
+    )
+
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="write all metrics as one JSON object per line, without display",
+    )
+
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="time between two lines of --json (default: 1.0)",
+    )
+
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=None,
+        metavar="N",
+        help="stop --json after N lines",
+    )
+
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    agent_parser = subparsers.add_parser(
+        "agent",
+        help="stream all metrics to viewers, without display",
+        description="Stream all metrics to viewers that connect with `tiptop connect`.",
+    )
+    agent_parser.add_argument(
+        "--listen",
+        type=str,
+        default=f"127.0.0.1:{DEFAULT_PORT}",
+        metavar="ADDRESS",
+        help=f"HOST[:PORT] or the path of a Unix socket (default: 127.0.0.1:{DEFAULT_PORT})",
+    )
+    connect_parser = subparsers.add_parser(
+        "connect",
+        help="show the metrics of an agent",
+        description="Show the metrics of a `tiptop agent`.",
+    )
+    connect_parser.add_argument(
+        "address",
+        type=str,
+        metavar="ADDRESS",
+        help=f"HOST[:PORT] or the path of a Unix socket (default port: {DEFAULT_PORT})",
     )
 
     args = parser.parse_args(argv)
+    _check_options(parser, args)
+
+    if args.replay is not None:
+        _replay(parser, args)
+        return
+    if args.command == "connect":
+        _connect(parser, args)
+        return
+
+    interfaces = [_autoselect_interface()] if args.net is None else args.net.split(",")
+    # All data is collected by one sampler, in a background thread. The widgets
+    # subscribe to the metrics they display.
+    interval = args.interval or 1.0
+    # every line of --json has new data of all metrics
+    sampler = create_sampler(
+        interfaces, interval=interval, cadence=interval if args.json else None
+    )
+    exporter = _serve_metrics(parser, sampler, args.serve_metrics)
+
+    if args.command == "agent":
+        _agent(parser, sampler, args.listen)
+    elif args.json:
+        _print_json(sampler, args.count)
+    elif args.record is not None:
+        try:
+            record(sampler, args.record)
+        except FileExistsError:
+            parser.error(f"{args.record} exists")
+    elif args.headless:
+        try:
+            SamplerThread(sampler).run(sampler.notify)
+        except KeyboardInterrupt:
+            pass
+    else:
+        sampler_thread = SamplerThread(sampler)
+        # Textual and Rich are only imported for the user interface
+        from ._tui import TiptopApp
+
+        TiptopApp.run(
+            sampler=sampler,
+            sampler_thread=sampler_thread,
+            interfaces=interfaces,
+            log=args.log,
+        )
+        sampler_thread.stop()
+
+    if exporter is not None:
+        exporter.stop()
+
+
+def _check_options(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    if not args.json:
+        for option, value in [("--interval", args.interval), ("--count", args.count)]:
+            if value is not None:
+                parser.error(f"{option} only applies to --json")
+    if args.interval is not None and args.interval <= 0.0:
+        parser.error("the interval must be positive")
+    if args.count is not None and args.count < 1:
+        parser.error("the count must be positive")
+    # without display, the data has to go somewhere
+    if args.headless and args.serve_metrics is None and args.record is None:
+        parser.error("--headless needs --serve-metrics or --record")
+
+
+def _replay(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    try:
+        recording = Recording(args.replay)
+    except (OSError, ValueError) as e:
+        parser.error(f"can't replay {args.replay}: {e}")
+    start = None
+    if args.start is not None:
+        try:
+            start = _parse_time(args.start, recording.time(recording.first))
+        except ValueError:
+            parser.error(f"invalid time {args.start}")
+    player = Player(recording, args.speed, start)
+    exporter = _serve_metrics(parser, player.sampler, args.serve_metrics)
+    # the interfaces and patterns that were recorded
+    interfaces = list(player.sample["net"])
+    from ._tui import ReplayApp
+
+    ReplayApp.run(
+        sampler=player.sampler,
+        sampler_thread=player,
+        interfaces=interfaces,
+        log=args.log,
+    )
+    player.stop()
+    if exporter is not None:
+        exporter.stop()
+    recording.close()
+
+
+def _agent(parser: argparse.ArgumentParser, sampler: Sampler, address: str):
+    try:
+        agent = Agent(sampler, address)
+    except (OSError, ValueError) as e:
+        parser.error(f"can't listen at {address}: {e}")
+    agent.start()
+
+    def broadcast(snapshot):
+        sampler.notify(snapshot)
+        agent.broadcast(snapshot)
+
+    try:
+        SamplerThread(sampler).run(broadcast)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.stop()
+
+
+def _connect(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    try:
+        connection = Connection(args.address)
+    except (OSError, ValueError) as e:
+        parser.error(f"can't connect to {args.address}: {e}")
+    exporter = _serve_metrics(parser, connection.sampler, args.serve_metrics)
+    from ._tui import TiptopApp
+
+    TiptopApp.run(
+        sampler=connection.sampler,
+        sampler_thread=connection,
+        # the interfaces and patterns of the agent
+        interfaces=list(connection.data["net"]),
+        log=args.log,
+    )
+    connection.stop()
+    if exporter is not None:
+        exporter.stop()
+
+
+def _serve_metrics(
+    parser: argparse.ArgumentParser, sampler: Sampler, address: str | None
+) -> MetricsServer | None:
+    if address is None:
+        return None
+    host, _, port = address.rpartition(":")
+    try:
+        # IPv6 addresses are in brackets, like [::1]:9100
+        exporter = MetricsServer(sampler, host.strip("[]"), int(port))
+    except (OSError, ValueError) as e:
+        parser.error(f"can't serve metrics at {address}: {e}")
+    exporter.start()
+    return exporter
+
+
+def _print_json(sampler: Sampler, count: int | None):
+    # Every tick, the latest data of all metrics goes out as one line. All metrics
+    # are collected in every tick, see run().
+    encoder = json.JSONEncoder(separators=(",", ":"), check_circular=False)
+    sampler_thread = SamplerThread(sampler)
+    num_lines = 0
+
+    def write(snapshot):
+        nonlocal num_lines
+        sampler.notify(snapshot)
+        sys.stdout.write(encoder.encode(sampler.latest) + "\n")
+        # one line at a time, also into pipes
+        sys.stdout.flush()
+        num_lines += 1
+        if count is not None and num_lines >= count:
+            sampler_thread.stop()
+
+    try:
+        sampler_thread.run(write)
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # e.g., piped into `head`; don't complain when stdout is closed at exit
+        sys.stdout = open(os.devnull, "w")
+
 
-    # with a grid
-    class TiptopApp(App):
-        async def on_mount(self) -> None:
-            grid = await self.view.dock_grid(edge="left")
-
-            # 34/55: approx golden ratio. See
-            # <https://gist.github.com/nschloe/ab6c3c90b4a6bc02c40405803fa8fa35>
-            # for the error.
-            grid.add_column(fraction=55, name="left")
-            grid.add_column(fraction=34, name="right")
-
-            grid.add_row(size=1, name="r0")
-            grid.add_row(fraction=1, name="r1")
-            grid.add_row(fraction=1, name="r2")
-            grid.add_row(fraction=1, name="r3")
-            grid.add_areas(
-                area0="left-start|right-end,r0",
-                area1="left,r1",
-                area2a="right,r1",
-                area2b="right,r2",
-                area2c="right,r3",
-                area3="left,r2-start|r3-end",
-            )
-            grid.place(
-                area0=InfoLine(),
-                area1=CPU(),
-                area2a=Mem(),
-                area2b=Disk(),
-                area2c=Net(args.net),
-                area3=ProcsList(),
-            )
-
-        async def on_load(self, _):
-            await self.bind("q", "quit", "quit")
-
-    TiptopApp.run(log=args.log)
+def _parse_time(string: str, reference: float) -> float:
+    # A date and time, or a time of day on the day of `reference`, to seconds since
+    # the epoch
+    try:
+        return datetime.fromisoformat(string).timestamp()
+    except ValueError:
+        t = dt_time.fromisoformat(string)
+        day = datetime.fromtimestamp(reference).date()
+        return datetime.combine(day, t).timestamp()
 
 
 def _get_version_text():
@@ -1,15 +1,19 @@
-import psutil
 from rich import box
 from rich.panel import Panel
 from rich.text import Text
 from textual.widget import Widget
 
+from ._helpers import render_key
+from ._sampler import Sampler
 from .braille_stream import BrailleStream
 
 
 class Battery(Widget):
-    def on_mount(self):
+    def __init__(self, sampler: Sampler):
+        super().__init__()
+        self.sampler = sampler
         self.bat_stream = BrailleStream(40, 3, 0.0, 100.0)
+        self.graph_key = None
 
         self.panel = Panel(
             "",
@@ -19,21 +23,19 @@ class Battery(Widget):
             border_style="white",
             box=box.SQUARE,
         )
-        self.collect_data()
-        # update frequency: 1 min
-        self.set_interval(60.0, self.collect_data)
+        self.sampler.subscribe(self.collect_data, "battery")
 
-    def collect_data(self):
-        bat = psutil.sensors_battery()
+    def collect_data(self, snapshot: dict):
+        bat = snapshot["battery"]
         assert bat is not None
 
-        self.bat_stream.add_value(bat.percent)
+        self.bat_stream.add_value(bat["percent"])
         self.refresh_graph()
 
-        if bat.power_plugged:
+        if bat["power_plugged"]:
             status = "charging"
         else:
-            mm = bat.secsleft // 60
+            mm = bat["secsleft"] // 60
             hh, mm = divmod(mm, 60)
             time_left_str = []
             if hh > 0:
@@ -42,8 +44,8 @@ class Battery(Widget):
                 time_left_str.append(f"{mm}min")
             status = " ".join(time_left_str) + " left"
 
-        title = f"[b]battery[/] - {self.bat_stream.values[-1]:.1f}% - {status}"
-        if bat.percent < 15 and not bat.power_plugged:
+        title = f"[b]battery[/] - {self.bat_stream.last_value:.1f}% - {status}"
+        if bat["percent"] < 15 and not bat["power_plugged"]:
             title = "[red reverse bold]" + title + "[/]"
 
         self.panel.title = title
@@ -51,6 +53,10 @@ class Battery(Widget):
         self.refresh()
 
     def refresh_graph(self):
+        key = render_key(self.bat_stream)
+        if key == self.graph_key:
+            return
+        self.graph_key = key
         self.panel.renderable = Text("\n".join(self.bat_stream.graph), style="yellow")
 
     def render(self) -> Panel:
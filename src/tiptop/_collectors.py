@@ -0,0 +1,661 @@
+"""Data collectors. Everything in here returns plain Python data (numbers, strings,
+lists, dicts) and doesn't depend on textual or rich.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import getpass
+import heapq
+import os
+import platform
+import queue
+import re
+import socket
+import threading
+import time
+from math import inf
+from typing import Any, Callable
+
+import distro
+import psutil
+
+from . import _procfs, _sysfs
+from ._sampler import Sampler
+
+
+def get_cpu_model():
+    # cpuinfo does computation in addition to reading data, see
+    # <https://github.com/workhorsy/py-cpuinfo/issues/155#issuecomment-678923252>.
+    # Try to work around this.
+    # TODO keep an eye on the above bug.
+    try:
+        # On Linux, the file contains lines like
+        # ```
+        # model name	: Intel(R) Core(TM) i5-8350U CPU @ 1.70GHz
+        # ```
+        with open("/proc/cpuinfo") as f:
+            content = f.read()
+        m = re.search(r"model name\t: (.*)", content)
+        model_name = m.group(1)
+    except Exception:
+        import cpuinfo
+
+        model_name = cpuinfo.get_cpu_info()["brand_raw"]
+    return model_name
+
+
+def get_host_info() -> dict:
+    """Static information about the machine. The widgets take it from here instead
+    of asking the system, so recordings of other machines can be replayed.
+    """
+    # The getlogin docs say:
+    # > For most purposes, it is more useful to use getpass.getuser() [...]
+    # username = os.getlogin()
+    username = getpass.getuser()
+
+    system = platform.system()
+    if system == "Linux":
+        ri = distro.os_release_info()
+        system_list = [ri["name"]]
+        if "version_id" in ri:
+            system_list.append(ri["version_id"])
+        system_list.append(f"{platform.architecture()[0]} / {platform.release()}")
+        system_string = " ".join(system_list)
+    elif system == "Darwin":
+        system_string = f"macOS {platform.mac_ver()[0]}"
+    else:
+        # fallback
+        system_string = ""
+
+    return {
+        "username": username,
+        "node": platform.node(),
+        "system": system_string,
+        "boot_time": psutil.boot_time(),
+        "num_cores": psutil.cpu_count(logical=False),
+        "num_threads": psutil.cpu_count(logical=True),
+    }
+
+
+def get_cpu_load():
+    # On Linux, _procfs.ProcStatCPUCollector gets all of this from one read
+    times = psutil.cpu_times_percent()
+    return {
+        "total": psutil.cpu_percent(),
+        "per_thread": psutil.cpu_percent(percpu=True),
+        "breakdown": {
+            # not all fields are available on all platforms
+            "user": times.user + getattr(times, "nice", 0.0),
+            "system": times.system,
+            "iowait": getattr(times, "iowait", 0.0),
+            "irq": getattr(times, "irq", 0.0),
+            "softirq": getattr(times, "softirq", 0.0),
+            "steal": getattr(times, "steal", 0.0),
+        },
+    }
+
+
+def get_current_temps():
+    # Slow, see <https://github.com/giampaolo/psutil/issues/2082>. On Linux,
+    # _sysfs.HwmonCollector is used instead.
+    try:
+        temps = psutil.sensors_temperatures()
+    except AttributeError:
+        return None
+    else:
+        # coretemp: intel, k10temp: amd
+        # <https://github.com/nschloe/tiptop/issues/37>
+        for key in ["coretemp", "k10temp"]:
+            if key not in temps:
+                continue
+            return [t.current for t in temps[key]]
+
+    return None
+
+
+def get_current_freq():
+    # psutil.cpu_freq() is slow; on Linux, _sysfs.CpufreqCollector is used instead.
+    # <https://github.com/nschloe/tiptop/issues/37>
+    try:
+        freqs = [freq.current for freq in psutil.cpu_freq(percpu=True)]
+    except Exception:
+        # https://github.com/nschloe/tiptop/issues/25#issuecomment-1061390966
+        return None
+
+    if psutil.__version__ == "5.9.0":
+        # Work around <https://github.com/giampaolo/psutil/issues/2049>
+        freqs = [freq * 1000 if freq < 10 else freq for freq in freqs]
+    return _sysfs.freq_summary(freqs)
+
+
+def get_fan_speed():
+    try:
+        return list(psutil.sensors_fans().values())[0][0].current
+    except (AttributeError, IndexError):
+        return None
+
+
+def get_mem():
+    mem = psutil.virtual_memory()
+    out = {"total": mem.total}
+    # check which mem sections are available on the machine
+    for attr in ["free", "available", "cached", "used"]:
+        if hasattr(mem, attr):
+            out[attr] = getattr(mem, attr)
+
+    swap = psutil.swap_memory()
+    if swap is not None:
+        out["swap_used"] = swap.used
+        out["swap_total"] = swap.total
+    return out
+
+
+def get_disk_counters():
+    # the same data as _procfs.Diskstats, from psutil
+    # io counters aren't always available, see
+    # <https://github.com/nschloe/tiptop/issues/79>
+    try:
+        counters = psutil.disk_io_counters(perdisk=True)
+    except Exception:
+        return None
+    if not counters:
+        return None
+    return {
+        name: (
+            c.read_count,
+            c.write_count,
+            c.read_bytes,
+            c.write_bytes,
+            c.read_time,
+            c.write_time,
+            # only on Linux and FreeBSD
+            getattr(c, "busy_time", None),
+            None,
+        )
+        for name, c in counters.items()
+        if not name.startswith(_procfs.Diskstats.skip_prefixes)
+    }
+
+
+class DiskIOCollector:
+    """Throughput, IOPS, latency, queue depth, and utilization of every disk, from
+    the differences of the counters to the previous call. `read_counters` returns
+    the counters of all disks, see _procfs.Diskstats.
+
+    Returns the total bytes read and written, the total throughput, and the rates
+    per device. All rates are None in the first call. The totals never go down, even
+    if a disk is removed.
+    """
+
+    def __init__(self, read_counters: Callable[[], dict | None]):
+        self.read_counters = read_counters
+        self.totals = _sysfs.CounterTotals(2)
+        self.last_counters: dict[str, tuple] = {}
+        self.last_time: float | None = None
+
+    def __call__(self):
+        counters = self.read_counters()
+        if counters is None:
+            return None
+        now = time.monotonic()
+        dt = None if self.last_time is None else now - self.last_time
+        last_counters = self.last_counters
+        self.last_counters = counters
+        self.last_time = now
+
+        devices = {}
+        for name, c in counters.items():
+            last = last_counters.get(name)
+            devices[name] = None if last is None or not dt else _disk_rates(c, last, dt)
+
+        rates = [r for r in devices.values() if r is not None]
+        read_bytes, write_bytes = self.totals.update(
+            {name: [c[2], c[3]] for name, c in counters.items()}
+        )
+        return {
+            "read_bytes": read_bytes,
+            "write_bytes": write_bytes,
+            "read_bytes_s": sum(r["read_bytes_s"] for r in rates) if rates else None,
+            "write_bytes_s": sum(r["write_bytes_s"] for r in rates) if rates else None,
+            "devices": devices,
+        }
+
+
+def _disk_rates(counters: tuple, last: tuple, dt: float) -> dict:
+    # counters may wrap around
+    reads, writes, read_bytes, write_bytes, read_ms, write_ms, busy_ms, weighted_ms = (
+        None if a is None else max(a - b, 0) for a, b in zip(counters, last)
+    )
+    ios = reads + writes
+    return {
+        "read_bytes_s": read_bytes / dt,
+        "write_bytes_s": write_bytes / dt,
+        "read_iops": reads / dt,
+        "write_iops": writes / dt,
+        # the average time per request, including the time in the queue
+        "latency_ms": (read_ms + write_ms) / ios if ios > 0 else None,
+        # the average number of requests in flight
+        "queue_depth": None if weighted_ms is None else weighted_ms / dt / 1000,
+        # the share of time with at least one request in flight
+        "util": None if busy_ms is None else min(busy_ms / dt / 10, 100.0),
+    }
+
+
+# file systems that don't hold any data on a device
+_pseudo_fstypes = {
+    "autofs",
+    "binfmt_misc",
+    "bpf",
+    "cgroup",
+    "cgroup2",
+    "configfs",
+    "debugfs",
+    "devpts",
+    "devtmpfs",
+    "efivarfs",
+    "fusectl",
+    "hugetlbfs",
+    "mqueue",
+    "nsfs",
+    "overlay",
+    "proc",
+    "pstore",
+    "ramfs",
+    "rpc_pipefs",
+    "securityfs",
+    "selinuxfs",
+    "squashfs",
+    "sysfs",
+    "tmpfs",
+    "tracefs",
+}
+
+
+def _disk_usage(mountpoint: str, results: dict):
+    try:
+        results[mountpoint] = psutil.disk_usage(mountpoint)
+    except OSError:
+        # https://github.com/nschloe/tiptop/issues/71
+        results[mountpoint] = None
+
+
+class _Job:
+    def __init__(self, fun: Callable, args: tuple):
+        self.fun = fun
+        self.args = args
+        self.done = threading.Event()
+        self.started = False
+        self.finished = False
+        # if another thread took the place of the one that runs this job
+        self.replaced = False
+
+
+class _Workers:
+    """A few daemon threads that run calls from a queue, so that no thread is
+    started per call.
+
+    A call can hang, e.g., on a dead NFS server. After `stuck()`, another thread
+    takes the place of the one that runs it. Once the call returns, that thread
+    exits if there are enough threads by then.
+    """
+
+    def __init__(self, num_threads: int = 4):
+        self.num_threads = num_threads
+        self.jobs: queue.SimpleQueue[_Job] = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        # the threads that aren't stuck
+        self.num_active = 0
+        with self.lock:
+            for _ in range(num_threads):
+                self._start()
+
+    def _start(self):
+        # called with the lock held
+        self.num_active += 1
+        threading.Thread(target=self._run, name="tiptop-du", daemon=True).start()
+
+    def submit(self, fun: Callable, *args) -> _Job:
+        job = _Job(fun, args)
+        self.jobs.put(job)
+        return job
+
+    def stuck(self, job: _Job):
+        """`job` takes too long; if it has started, its thread is replaced."""
+        with self.lock:
+            if job.started and not job.finished and not job.replaced:
+                job.replaced = True
+                self.num_active -= 1
+                self._start()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            with self.lock:
+                job.started = True
+            job.fun(*job.args)
+            with self.lock:
+                job.finished = True
+                job.done.set()
+                if job.replaced:
+                    if self.num_active >= self.num_threads:
+                        return
+                    self.num_active += 1
+
+
+class DiskUsageCollector:
+    """The usage of all mounted file systems, one per device.
+
+    The disk_usage() calls run on a few worker threads. The collector waits at most
+    `timeout` seconds for them and leaves out the mounts that didn't answer, e.g., a
+    hung NFS server. Such a mount isn't asked again until its call returns.
+
+    On Linux, the list of mounts is only read again if /proc/self/mountinfo signals
+    a change. Elsewhere, it's read again every `refresh_interval` seconds.
+    """
+
+    def __init__(
+        self, timeout: float = 0.5, refresh_interval: float = 60.0, root="/proc"
+    ):
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+        try:
+            self.mountinfo = _procfs.MountInfo(root)
+        except OSError:
+            self.mountinfo = None
+        self.mountpoints: list[str] = []
+        self.last_refresh = -inf
+        self.workers = _Workers()
+        # mountpoint -> disk_usage() call that hasn't returned yet
+        self.pending: dict[str, _Job] = {}
+        self._refresh_mountpoints()
+
+    def _refresh_mountpoints(self):
+        if self.mountinfo is not None:
+            mounts = [
+                (device, mp)
+                for device, mp, fstype, source in self.mountinfo.read()
+                # In a container, the root is an overlay.
+                if (fstype not in _pseudo_fstypes or mp == "/")
+                # kick out /dev/loop* devices
+                and not source.startswith("/dev/loop")
+            ]
+        else:
+            mounts = [
+                (item.device, item.mountpoint)
+                for item in psutil.disk_partitions()
+                if not item.device.startswith("/dev/loop")
+            ]
+        # The same device can be mounted many times, e.g., bind mounts in
+        # containers. Only keep the first mount.
+        devices = set()
+        self.mountpoints = []
+        for device, mp in mounts:
+            if device not in devices:
+                devices.add(device)
+                self.mountpoints.append(mp)
+        self.last_refresh = time.monotonic()
+
+    def __call__(self):
+        if self.mountinfo is not None:
+            if self.mountinfo.changed():
+                self._refresh_mountpoints()
+        elif time.monotonic() - self.last_refresh > self.refresh_interval:
+            self._refresh_mountpoints()
+
+        results: dict[str, Any] = {}
+        jobs = {}
+        for mp in self.mountpoints:
+            if mp in self.pending:
+                if not self.pending[mp].done.is_set():
+                    continue
+                del self.pending[mp]
+            jobs[mp] = self.workers.submit(_disk_usage, mp, results)
+
+        deadline = time.monotonic() + self.timeout
+        for mp, job in jobs.items():
+            if not job.done.wait(max(deadline - time.monotonic(), 0.0)):
+                self.workers.stuck(job)
+                self.pending[mp] = job
+
+        rows = []
+        for mp in self.mountpoints:
+            du = results.get(mp)
+            if du is not None:
+                rows.append((mp, du.free, du.used, du.total, du.percent))
+        return rows
+
+
+def _autoselect_interface():
+    """try to find non-lo and non-docker interface that is up"""
+    if os.path.isdir("/sys/class/net"):
+        # psutil.net_if_stats() gets all stats of all interfaces, which is slow
+        # with thousands of them
+        isup = _sysfs.net_interfaces_up()
+    else:
+        isup = {name: stats.isup for name, stats in psutil.net_if_stats().items()}
+    score_dict = {}
+    for name, up in isup.items():
+        if not up:
+            score_dict[name] = 0
+        elif (
+            # On Unix, we have `lo`, on Windows `Loopback Pseudo-Interface k`
+            # and `Local Area Connection k` (the latter is valid)
+            name.startswith("lo")
+            or name.lower().startswith("loopback")
+            or name.lower().startswith("docker")
+        ):
+            score_dict[name] = 1
+        elif name.lower().startswith("fw") or name.lower().startswith("Bluetooth"):
+            # firewire <https://github.com/nschloe/tiptop/issues/45#issuecomment-991884364>
+            # or bluetooth
+            score_dict[name] = 2
+        else:
+            score_dict[name] = 3
+
+    # Amongst all keys with max score, get the alphabetically first.
+    # This is to prefer en0 over en5, <https://github.com/nschloe/tiptop/issues/81>.
+    max_score = max(score_dict.values())
+    max_keys = [key for key, score in score_dict.items() if score == max_score]
+    return sorted(max_keys)[0]
+
+
+class NetCollector:
+    """The watched network interfaces. `patterns` are interface names or glob
+    patterns like "eth*"; the counters of all interfaces that match a pattern are
+    added up with _sysfs.CounterTotals. On Linux, _sysfs.NetStatsCollector reads the
+    counters instead.
+    """
+
+    def __init__(self, patterns: list[str]):
+        self.patterns = patterns
+        num_counters = len(_sysfs.NetStatsCollector.counters)
+        self.totals = {
+            pattern: _sysfs.CounterTotals(num_counters)
+            for pattern in patterns
+            if _sysfs.is_pattern(pattern)
+        }
+
+    def io_counters(self):
+        pernic = psutil.net_io_counters(pernic=True)
+        names = _sysfs.NetStatsCollector.counters
+        out = {}
+        for pattern in self.patterns:
+            if pattern in self.totals:
+                counters = {
+                    iface: [getattr(pernic[iface], name) for name in names]
+                    for iface in fnmatch.filter(pernic, pattern)
+                }
+                values = self.totals[pattern].update(counters)
+            elif pattern in pernic:
+                values = [getattr(pernic[pattern], name) for name in names]
+            else:
+                values = [0] * len(names)
+            out[pattern] = dict(zip(names, values))
+        return out
+
+    def addresses(self):
+        """The IP addresses of the watched interfaces; not for patterns."""
+        all_addrs = psutil.net_if_addrs()
+        out = {}
+        for name in self.patterns:
+            if _sysfs.is_pattern(name) or name not in all_addrs:
+                continue
+            addrs = all_addrs[name]
+            ipv4 = []
+            for addr in addrs:
+                # ipv4?
+                if addr.family == socket.AF_INET:
+                    ipv4.append(addr.address + " / " + addr.netmask)
+            ipv6 = []
+            for addr in addrs:
+                # ipv4?
+                if addr.family == socket.AF_INET6:
+                    ipv6.append(addr.address)
+            out[name] = {"ipv4": ipv4, "ipv6": ipv6}
+        return out
+
+
+class ProcessCollector:
+    """The top processes by CPU load.
+
+    Only the CPU load is determined for all processes. The other attributes are
+    only retrieved for the top `max_num_procs` processes. Attributes that never
+    change during the lifetime of a process are cached.
+    """
+
+    # identified by (pid, create_time) since pids are reused
+    static_attrs = ["name", "username", "cmdline"]
+    dynamic_attrs = ["num_threads", "memory_info", "status"]
+
+    def __init__(self, max_num_procs: int = 100):
+        # set by the process list according to its height
+        self.max_num_procs = max_num_procs
+        # pid -> (create_time, static attributes)
+        self.static_cache: dict[int, tuple[float, dict]] = {}
+
+    def __call__(self):
+        # First pass: the CPU load of all processes. process_iter() keeps the
+        # Process objects between calls, so cpu_percent() returns the load since
+        # the last call.
+        loads = []
+        pids = set()
+        for p in psutil.process_iter():
+            if p.pid == 0:
+                # Skip the process with PID 0. On Windows, that's SYSTEM IDLE, and
+                # we don't want that to appear at the top of the list.
+                # <https://twitter.com/andre_roberge/status/1488885893716975622/photo/1>
+                continue
+            try:
+                cpu_percent = p.cpu_percent()
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                cpu_percent = None
+            except psutil.NoSuchProcess:
+                continue
+            loads.append((cpu_percent or 0.0, cpu_percent, p))
+            pids.add(p.pid)
+
+        # evict the processes that have exited
+        for pid in self.static_cache.keys() - pids:
+            del self.static_cache[pid]
+
+        top = heapq.nlargest(self.max_num_procs, loads, key=lambda item: item[0])
+
+        # Second pass: all other attributes, only for the top processes
+        processes = []
+        for _, cpu_percent, p in top:
+            try:
+                with p.oneshot():
+                    info = p.as_dict(self.dynamic_attrs)
+                    info.update(self._static_attrs(p))
+            except psutil.NoSuchProcess:
+                continue
+            # Everything can be None here if access was denied
+            info["pid"] = p.pid
+            info["cpu_percent"] = cpu_percent
+            # only keep the resident set size of the memory info
+            mem_info = info.pop("memory_info")
+            info["rss"] = None if mem_info is None else mem_info.rss
+            processes.append(info)
+        return processes
+
+    def _static_attrs(self, p: psutil.Process) -> dict:
+        try:
+            create_time = p.create_time()
+        except (psutil.AccessDenied, psutil.ZombieProcess):
+            create_time = None
+        cached = self.static_cache.get(p.pid)
+        if cached is not None and cached[0] == create_time:
+            return cached[1]
+        attrs = p.as_dict(self.static_attrs)
+        self.static_cache[p.pid] = (create_time, attrs)
+        return attrs
+
+
+def get_battery():
+    try:
+        bat = psutil.sensors_battery()
+    except AttributeError:
+        return None
+    if bat is None:
+        return None
+    return {
+        "percent": bat.percent,
+        "power_plugged": bat.power_plugged,
+        "secsleft": bat.secsleft,
+    }
+
+
+def create_sampler(
+    interfaces: list[str], interval: float = 1.0, cadence: float | None = None
+) -> Sampler:
+    """A sampler with all metrics that tiptop displays, at their cadences.
+    `interfaces` are the network interfaces to monitor, or glob patterns of them.
+    The cadences are rounded to multiples of `interval`. If `cadence` is given, all
+    metrics that are collected more than once are collected at that cadence instead,
+    e.g., to have new data in every line of --json.
+    """
+    sampler = Sampler(interval=interval)
+    sampler.add_metric("host", get_host_info, every=None)
+    sampler.add_metric("cpu_model", get_cpu_model, every=None)
+    # every tick
+    sampler.add_metric("time", time.time, every=interval)
+    if _procfs.is_available():
+        sampler.add_metric("cpu", _procfs.ProcStatCPUCollector(), every=2.0)
+    else:
+        sampler.add_metric("cpu", get_cpu_load, every=2.0)
+    hwmon = _sysfs.HwmonCollector()
+    if hwmon.cpu_chip is not None:
+        sampler.add_metric("temps", hwmon.cpu_temps, every=2.0)
+    else:
+        sampler.add_metric("temps", get_current_temps, every=2.0)
+    sampler.add_metric("sensors", hwmon.sensors, every=10.0)
+    cpufreq = _sysfs.CpufreqCollector()
+    if cpufreq.policies:
+        sampler.add_metric("freq", cpufreq, every=2.0)
+    else:
+        sampler.add_metric("freq", get_current_freq, every=2.0)
+    sampler.add_metric("fan", get_fan_speed, every=2.0)
+    sampler.add_metric("mem", get_mem, every=2.0)
+    if os.path.isfile("/proc/diskstats"):
+        sampler.add_metric("disk_io", DiskIOCollector(_procfs.Diskstats()), every=2.0)
+    else:
+        sampler.add_metric("disk_io", DiskIOCollector(get_disk_counters), every=2.0)
+    # Disk usage changes slowly, and a hung network mount may take a while
+    sampler.add_metric("disk_usage", DiskUsageCollector(), every=10.0)
+    net = NetCollector(interfaces)
+    if os.path.isdir("/sys/class/net"):
+        sampler.add_metric("net", _sysfs.NetStatsCollector(interfaces), every=2.0)
+    else:
+        sampler.add_metric("net", net.io_counters, every=2.0)
+    sampler.add_metric("net_ips", net.addresses, every=60.0)
+    if _procfs.is_available():
+        sampler.add_metric("procs", _procfs.ProcfsProcessCollector(), every=6.0)
+    else:
+        sampler.add_metric("procs", ProcessCollector(), every=6.0)
+    sampler.add_metric("battery", get_battery, every=10.0)
+    if cadence is not None:
+        for name in list(sampler.metrics):
+            if sampler.cadence(name) != inf:
+                sampler.add_metric(name, sampler.collector(name), every=cadence)
+    return sampler
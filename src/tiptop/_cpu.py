@@ -1,14 +1,12 @@
-import re
-from pathlib import Path
-
-import psutil
 from rich import box
 from rich.panel import Panel
 from rich.table import Table
 from rich.text import Text
 from textual.widget import Widget
 
-from .braille_stream import BrailleStream
+from ._history import History
+from ._sampler import Sampler
+from .braille_stream import BrailleMultiStream, BrailleStream
 
 
 def val_to_color(val: float, minval: float, maxval: float) -> str:
@@ -32,112 +30,68 @@ def flatten(lst):
     return [item for sublist in lst for item in sublist]
 
 
-def get_cpu_model():
-    # cpuinfo does computation in addition to reading data, see
-    # <https://github.com/workhorsy/py-cpuinfo/issues/155#issuecomment-678923252>.
-    # Try to work around this.
-    # TODO keep an eye on the above bug.
-    try:
-        # On Linux, the file contains lines like
-        # ```
-        # model name	: Intel(R) Core(TM) i5-8350U CPU @ 1.70GHz
-        # ```
-        with open("/proc/cpuinfo") as f:
-            content = f.read()
-        m = re.search(r"model name\t: (.*)", content)
-        model_name = m.group(1)
-    except Exception:
-        import cpuinfo
-
-        model_name = cpuinfo.get_cpu_info()["brand_raw"]
-    return model_name
-
-
-def get_current_temps():
-    # First try manually reading the temperatures. (pyutil is slow.)
-    for key in ["coretemp", "k10temp"]:
-        path = Path(f"/sys/devices/platform/{key}.0/hwmon/hwmon6/")
-        if not path.is_dir():
-            continue
-
-        k = 1
-        temps = []
-        while True:
-            file = path / f"temp{k}_input"
-            if not file.exists():
-                break
-            with open(file) as f:
-                content = f.read()
-            temps.append(int(content) / 1000)
-            k += 1
-
-        return temps
-
-    # Not try psutil.sensors_temperatures().
-    # Slow, see <https://github.com/giampaolo/psutil/issues/2082>.
-    try:
-        temps = psutil.sensors_temperatures()
-    except AttributeError:
-        return None
-    else:
-        # coretemp: intel, k10temp: amd
-        # <https://github.com/nschloe/tiptop/issues/37>
-        for key in ["coretemp", "k10temp"]:
-            if key not in temps:
-                continue
-            return [t.current for t in temps[key]]
-
-    return None
-
-
-def get_current_freq():
-    # psutil.cpu_freq() is slow, so first try something else:
-    # <https://github.com/nschloe/tiptop/issues/37>
-    candidates = [
-        "/sys/devices/system/cpu/cpufreq/policy0/scaling_cur_freq",
-        "/sys/devices/system/cpu/cpu0/cpufreq/scaling_cur_freq",
-    ]
-    for candidate in candidates:
-        if Path(candidate).exists():
-            with open(candidate) as f:
-                content = f.read()
-            return int(content) / 1000
-
-    try:
-        cpu_freq = psutil.cpu_freq().current
-    except Exception:
-        # https://github.com/nschloe/tiptop/issues/25#issuecomment-1061390966
-        return None
-
-    if psutil.__version__ == "5.9.0" and cpu_freq < 10:
-        # Work around <https://github.com/giampaolo/psutil/issues/2049>
-        cpu_freq *= 1000
-    return cpu_freq
-
-
 class CPU(Widget):
-    def on_mount(self):
+    def __init__(self, sampler: Sampler):
+        super().__init__()
+        self.sampler = sampler
         self.width = 0
         self.height = 0
 
         # self.max_graph_width = 200
 
-        self.num_cores = psutil.cpu_count(logical=False)
-        num_threads = psutil.cpu_count(logical=True)
+        host = self.sampler.get("host")
+        self.num_cores = host["num_cores"]
+        num_threads = host["num_threads"]
 
         # 8 threads, 4 cores -> [[0, 4], [1, 5], [2, 6], [3, 7]]
         assert num_threads % self.num_cores == 0
         self.core_threads = transpose(list(chunks(range(num_threads), self.num_cores)))
 
         self.cpu_total_stream = BrailleStream(50, 7, 0.0, 100.0)
-
-        self.thread_load_streams = [
-            BrailleStream(10, 1, 0.0, 100.0)
-            for _ in range(num_threads)
-            # BlockCharStream(10, 1, 0.0, 100.0) for _ in range(num_threads)
+        self.cpu_total_stream.history = History(interval=self.sampler.cadence("cpu"))
+
+        # Cycle through these windows with `cycle_history_window()`; None is the
+        # live graph. When showing a window from the history, the values are copied
+        # into cpu_history_stream.
+        self.history_windows = [
+            (None, ""),
+            (3600.0, "1h"),
+            (6 * 3600.0, "6h"),
+            (24 * 3600.0, "1d"),
+            (7 * 24 * 3600.0, "7d"),
+        ]
+        self.history_window_index = 0
+        self.cpu_history_stream = BrailleStream(50, 7, 0.0, 100.0)
+
+        # Cycle through the components of the CPU load with `cycle_component()`.
+        # "busy" is cpu_total_stream; the others have a stream each.
+        self.components = [
+            "busy",
+            "user",
+            "system",
+            "iowait",
+            "irq",
+            "softirq",
+            "steal",
+        ]
+        self.component_index = 0
+        self.component_streams = {
+            name: BrailleStream(50, 7, 0.0, 100.0) for name in self.components[1:]
+        }
+        # the big graphs that all have the same size
+        self.cpu_streams = [
+            self.cpu_total_stream,
+            self.cpu_history_stream,
+            *self.component_streams.values(),
         ]
 
-        temps = get_current_temps()
+        # one sparkline per thread, all in one buffer
+        self.thread_load_stream = BrailleMultiStream(num_threads, 10, 1, 0.0, 100.0)
+        # self.thread_load_stream = BlockCharMultiStream(
+        #     num_threads, 10, 1, 0.0, 100.0
+        # )
+
+        temps = self.sampler.get("temps")
 
         if temps is None:
             self.has_cpu_temp = False
@@ -156,18 +110,13 @@ class CPU(Widget):
                 )
 
             if self.has_core_temps:
-                self.core_temp_streams = [
-                    BrailleStream(5, 1, temp_low, temp_high)
-                    for _ in range(self.num_cores)
-                ]
-
-        self.has_fan_rpm = False
-        try:
-            fan_current = list(psutil.sensors_fans().values())[0][0].current
-        except (AttributeError, IndexError):
-            pass
-        else:
-            self.has_fan_rpm = True
+                self.core_temp_stream = BrailleMultiStream(
+                    self.num_cores, 5, 1, temp_low, temp_high
+                )
+
+        fan_current = self.sampler.get("fan")
+        self.has_fan_rpm = fan_current is not None
+        if self.has_fan_rpm:
             fan_low = 0
             # Sometimes, psutil/computers will incorrectly report a fan
             # speed of 2 ** 16 - 1; dismiss that.
@@ -195,39 +144,102 @@ class CPU(Widget):
 
         self.panel = Panel(
             "",
-            title=f"[b]cpu[/] - {get_cpu_model()}",
+            title=f"[b]cpu[/] - {self.sampler.get('cpu_model')}",
             title_align="left",
+            subtitle=None,
+            subtitle_align="left",
             border_style="white",
             box=box.SQUARE,
         )
 
-        # immediately collect data to refresh info_box_width
-        self.collect_data()
-        self.set_interval(2.0, self.collect_data)
+        self.cpu_freq = None
+
+        # The first call happens immediately, which also sets info_box_width.
+        self.sampler.subscribe(self.collect_data, "cpu", "temps", "freq", "fan")
 
-    def collect_data(self):
+    def collect_data(self, snapshot: dict):
+        # All four metrics have the same cadence, so they always arrive together.
         # CPU loads
-        self.cpu_total_stream.add_value(psutil.cpu_percent())
-        #
-        load_per_thread = psutil.cpu_percent(percpu=True)
-        assert isinstance(load_per_thread, list)
-        for stream, load in zip(self.thread_load_streams, load_per_thread):
-            stream.add_value(load)
+        cpu = snapshot["cpu"]
+        self.cpu_total_stream.add_value(cpu["total"])
+        # Threads can be taken offline or plugged in later. The layout stays as it
+        # was at start, and threads that aren't there show no load.
+        per_thread = cpu["per_thread"][: self.thread_load_stream.num_series]
+        per_thread += [0.0] * (self.thread_load_stream.num_series - len(per_thread))
+        self.thread_load_stream.add_values(per_thread)
+        for name, stream in self.component_streams.items():
+            stream.add_value(cpu["breakdown"][name])
 
         # CPU temperatures
         if self.has_cpu_temp or self.has_core_temps:
-            temps = get_current_temps()
+            temps = snapshot["temps"]
             assert temps is not None
 
+            # A sensor that couldn't be read is None; it keeps its last value.
             if self.has_cpu_temp:
-                self.temp_total_stream.add_value(temps[0])
+                temp = temps[0]
+                if temp is None:
+                    temp = self.temp_total_stream.last_value
+                self.temp_total_stream.add_value(temp)
 
             if self.has_core_temps:
-                for stream, temp in zip(self.core_temp_streams, temps[1:]):
-                    stream.add_value(temp)
+                self.core_temp_stream.add_values(
+                    [
+                        last if temp is None else temp
+                        for temp, last in zip(
+                            temps[1:], self.core_temp_stream.last_values
+                        )
+                    ]
+                )
 
-        lines_cpu = self.cpu_total_stream.graph
-        current_val_string = f"{self.cpu_total_stream.values[-1]:5.1f}%"
+        self.cpu_freq = snapshot["freq"]
+
+        if self.has_fan_rpm:
+            fan_current = snapshot["fan"]
+
+            # See comment above
+            if fan_current == 65535:
+                fan_current = self.fan_stream.maxval
+
+            if fan_current > self.fan_stream.maxval:
+                # rescale the history, too
+                self.fan_stream.reset_maxval(fan_current)
+
+            self.fan_stream.add_value(fan_current)
+
+        self.refresh_panel()
+
+    def cycle_history_window(self):
+        self.history_window_index = (self.history_window_index + 1) % len(
+            self.history_windows
+        )
+        self.refresh_panel()
+
+    def cycle_component(self):
+        self.component_index = (self.component_index + 1) % len(self.components)
+        # back to the live graph
+        self.history_window_index = 0
+        self.refresh_panel()
+
+    def refresh_panel(self):
+        window, label = self.history_windows[self.history_window_index]
+        if window is None:
+            component = self.components[self.component_index]
+            if component == "busy":
+                stream = self.cpu_total_stream
+                current_val_string = f"{stream.last_value:5.1f}%"
+            else:
+                stream = self.component_streams[component]
+                current_val_string = f"{component} {stream.last_value:5.1f}%"
+        else:
+            # the mean over the window, from the right history tier
+            stream = self.cpu_history_stream
+            values = self.cpu_total_stream.history.window(window, 2 * stream.width + 1)
+            stream.set_values(values)
+            mean = sum(values) / len(values) if values else 0.0
+            current_val_string = f"{label} avg {mean:5.1f}%"
+
+        lines_cpu = stream.graph
         lines0 = lines_cpu[0][: -len(current_val_string)] + current_val_string
         lines_cpu = [lines0] + lines_cpu[1:]
         #
@@ -235,13 +247,26 @@ class CPU(Widget):
         #
         if self.has_cpu_temp:
             lines_temp = self.temp_total_stream.graph
-            current_val_string = f"{round(self.temp_total_stream.values[-1]):3d}°C"
+            current_val_string = f"{round(self.temp_total_stream.last_value):3d}°C"
             lines0 = lines_temp[-1][: -len(current_val_string)] + current_val_string
             lines_temp = lines_temp[:-1] + [lines0]
             cpu_total_graph += "[magenta]" + "\n".join(lines_temp) + "[/]"
 
+        # steal and iowait are particularly interesting on virtual machines
+        self.panel.subtitle = " ".join(
+            f"{abbr} {self.component_streams[name].last_value:.1f}%"
+            for abbr, name in [
+                ("usr", "user"),
+                ("sys", "system"),
+                ("io", "iowait"),
+                ("irq", "irq"),
+                ("sirq", "softirq"),
+                ("st", "steal"),
+            ]
+        )
+
         # construct right info box
-        self._refresh_info_box(load_per_thread)
+        self._refresh_info_box(self.thread_load_stream.last_values)
 
         t = Table(expand=True, show_header=False, padding=0, box=None)
         # Add ratio 1 to expand that column as much as possible
@@ -250,18 +275,7 @@ class CPU(Widget):
         t.add_row(cpu_total_graph, self.info_box)
 
         if self.has_fan_rpm:
-            fan_current = list(psutil.sensors_fans().values())[0][0].current
-
-            # See comment above
-            if fan_current == 65535:
-                fan_current = self.fan_stream.maxval
-
-            if fan_current > self.fan_stream.maxval:
-                # TODO There should be a method that also rewrites all previous values
-                self.fan_stream.maxval = fan_current
-
-            self.fan_stream.add_value(fan_current)
-            string = f" {fan_current}rpm"
+            string = f" {self.fan_stream.last_value:.0f}rpm"
             graph = Text(
                 self.fan_stream.graph[-1][: -len(string)] + string,
                 style="cyan",
@@ -274,6 +288,35 @@ class CPU(Widget):
         self.refresh()
 
     def _refresh_info_box(self, load_per_thread):
+        lines = self._info_box_lines(load_per_thread)
+        self.info_box.renderable = "\n".join(lines)
+
+        freq = self.cpu_freq
+        if freq is None:
+            # https://github.com/nschloe/tiptop/issues/25
+            self.info_box.subtitle = None
+        elif freq["min"] == freq["max"]:
+            self.info_box.subtitle = f"{round(freq['avg']):4d} MHz"
+        else:
+            self.info_box.subtitle = (
+                f"{freq['min'] / 1000:.1f}/{freq['avg'] / 1000:.1f}/"
+                f"{freq['max'] / 1000:.1f} GHz"
+            )
+
+        # https://github.com/willmcgugan/rich/discussions/1559#discussioncomment-1459008
+        self.info_box_width = 4 + len(Text.from_markup(lines[0]))
+
+    def _info_box_lines(self, load_per_thread):
+        thread_graphs = self.thread_load_stream.graphs
+        thread_loads = self.thread_load_stream.last_values
+        if self.has_core_temps:
+            core_graphs = self.core_temp_stream.graphs
+            core_temps = self.core_temp_stream.last_values
+        # the frequency per core, if there is more than one
+        freqs = None
+        if self.cpu_freq is not None and self.num_cores > 1:
+            freqs = self.cpu_freq["per_thread"]
+
         lines = []
         for core_id, thread_ids in enumerate(self.core_threads):
             line = []
@@ -281,32 +324,22 @@ class CPU(Widget):
                 color = val_to_color(load_per_thread[i], 0.0, 100.0)
                 line.append(
                     f"[{color}]"
-                    + f"{self.thread_load_streams[i].graph[0]}"
-                    + f"{round(self.thread_load_streams[i].values[-1]):3d}%"
+                    + f"{thread_graphs[i][0]}"
+                    + f"{round(thread_loads[i]):3d}%"
                     + "[/]"
                 )
+            if freqs is not None:
+                # all threads of a core run at the same frequency
+                i = thread_ids[0]
+                val = freqs[i] if i < len(freqs) else None
+                line.append("    " if val is None else f"{val / 1000:3.1f}G")
             if self.has_core_temps:
-                stream = self.core_temp_streams[core_id]
-                val = stream.values[-1]
+                val = core_temps[core_id]
                 color = "magenta" if val < 70.0 else "red"
-                line.append(
-                    f"[{color}]{stream.graph[0]} {round(stream.values[-1])}°C[/]"
-                )
+                line.append(f"[{color}]{core_graphs[core_id][0]} {round(val)}°C[/]")
 
             lines.append(" ".join(line))
-
-        self.info_box.renderable = "\n".join(lines)
-
-        cpu_freq = get_current_freq()
-
-        if cpu_freq is None:
-            # https://github.com/nschloe/tiptop/issues/25
-            self.info_box.subtitle = None
-        else:
-            self.info_box.subtitle = f"{round(cpu_freq):4d} MHz"
-
-        # https://github.com/willmcgugan/rich/discussions/1559#discussioncomment-1459008
-        self.info_box_width = 4 + len(Text.from_markup(lines[0]))
+        return lines
 
     def render(self):
         return self.panel
@@ -317,7 +350,8 @@ class CPU(Widget):
 
         # reset graph widths
         graph_width = self.width - self.info_box_width - 5
-        self.cpu_total_stream.reset_width(graph_width)
+        for stream in self.cpu_streams:
+            stream.reset_width(graph_width)
         if self.has_cpu_temp:
             self.temp_total_stream.reset_width(graph_width)
         if self.has_fan_rpm:
@@ -328,7 +362,8 @@ class CPU(Widget):
         total_height = self.height - 2
         if self.has_cpu_temp:
             # cpu total stream height: divide by two and round _down_
-            self.cpu_total_stream.reset_height(total_height // 2)
+            for stream in self.cpu_streams:
+                stream.reset_height(total_height // 2)
             #
             # temp total stream height: divide by two and round _up_. Subtract
             # one if a fan stream is present.
@@ -343,4 +378,5 @@ class CPU(Widget):
             if self.has_fan_rpm:
                 cpu_stream_height -= 1
 
-            self.cpu_total_stream.reset_height(cpu_stream_height)
+            for stream in self.cpu_streams:
+                stream.reset_height(cpu_stream_height)
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import psutil
 from rich import box
 from rich.console import Group
 from rich.panel import Panel
@@ -8,31 +7,18 @@ from rich.table import Table
 from rich.text import Text
 from textual.widget import Widget
 
-from ._helpers import sizeof_fmt
-from .braille_stream import BrailleStream
+from ._helpers import render_key, sizeof_fmt
+from ._sampler import Sampler
+from .braille_stream import BrailleMultiStream, BrailleStream
 
 
 class Disk(Widget):
-    def __init__(self):
+    def __init__(self, sampler: Sampler):
         super().__init__()
-
-    def on_mount(self):
-        # kick out /dev/loop* devices
-        self.mountpoints = [
-            item.mountpoint
-            for item in psutil.disk_partitions()
-            if not item.device.startswith("/dev/loop")
-        ]
-
+        self.sampler = sampler
         # io counters aren't always available, see
         # <https://github.com/nschloe/tiptop/issues/79>
-        self.has_io_counters = False
-        try:
-            psutil.disk_io_counters()
-        except Exception:
-            pass
-        else:
-            self.has_io_counters = True
+        self.has_io_counters = self.sampler.get("disk_io") is not None
 
         if self.has_io_counters:
             self.down_box = Panel(
@@ -58,16 +44,29 @@ class Disk(Widget):
             self.table.add_row("", self.down_box)
             self.table.add_row("", self.up_box)
 
-            self.group = Group(self.table, "")
+            # one line per disk, and the usage table
+            self.group = Group(self.table, "", "")
 
-            self.last_io = None
             self.max_read_bytes_s = 0
             self.max_read_bytes_s_str = ""
             self.max_write_bytes_s = 0
             self.max_write_bytes_s_str = ""
 
-            self.read_stream = BrailleStream(20, 5, 0.0, 1.0e6)
-            self.write_stream = BrailleStream(20, 5, 0.0, 1.0e6, flipud=True)
+            self.read_stream = BrailleStream(20, 5, 0.0, 1.0e6, autoscale=True)
+            self.write_stream = BrailleStream(
+                20, 5, 0.0, 1.0e6, flipud=True, autoscale=True
+            )
+            self.graphs_key = None
+
+            # one utilization sparkline per disk; recreated when disks come or go
+            self.device_names: list[str] = []
+            self.name_width = 0
+            self.device_rates: list[dict | None] = []
+            self.util_stream = BrailleMultiStream(0, 10, 1, 0.0, 100.0)
+            # the plain text of the disk lines, to see if they changed
+            self.device_lines_key = None
+            # None if all disks fit, see _layout()
+            self.max_device_lines: int | None = None
         else:
             self.group = Group("")
 
@@ -78,32 +77,38 @@ class Disk(Widget):
             border_style="white",
             title_align="left",
             box=box.SQUARE,
+            subtitle=None,
+            subtitle_align="right",
         )
 
-        self.refresh_panel()
+        self.width = 0
+        self.height = 0
+        self.disk_usage_rows = None
+        self.sampler.subscribe(self.refresh_panel, "disk_io", "disk_usage", "sensors")
 
-        self.interval_s = 2.0
-        self.set_interval(self.interval_s, self.refresh_panel)
+    def refresh_panel(self, snapshot: dict):
+        changed = False
+        if "sensors" in snapshot:
+            changed |= self.refresh_drive_temps(snapshot["sensors"])
 
-    def refresh_panel(self):
-        if self.has_io_counters:
-            self.refresh_io_counters()
+        if self.has_io_counters and "disk_io" in snapshot:
+            changed |= self.refresh_io_counters(snapshot["disk_io"])
 
-        self.refresh_disk_usage()
-        self.refresh()
+        if "disk_usage" in snapshot:
+            changed |= self.refresh_disk_usage(snapshot["disk_usage"])
 
-    def refresh_io_counters(self):
-        io = psutil.disk_io_counters()
+        # only repaint if anything changed
+        if changed:
+            self.refresh()
 
-        if self.last_io is None:
+    def refresh_io_counters(self, io: dict) -> bool:
+        read_bytes_s = io["read_bytes_s"]
+        write_bytes_s = io["write_bytes_s"]
+        if read_bytes_s is None:
             read_bytes_s_string = ""
             write_bytes_s_string = ""
         else:
-            read_bytes_s = (io.read_bytes - self.last_io.read_bytes) / self.interval_s
             read_bytes_s_string = sizeof_fmt(read_bytes_s, fmt=".1f") + "/s"
-            write_bytes_s = (
-                io.write_bytes - self.last_io.write_bytes
-            ) / self.interval_s
             write_bytes_s_string = sizeof_fmt(write_bytes_s, fmt=".1f") + "/s"
 
             if read_bytes_s > self.max_read_bytes_s:
@@ -117,36 +122,170 @@ class Disk(Widget):
             self.read_stream.add_value(read_bytes_s)
             self.write_stream.add_value(write_bytes_s)
 
-        self.last_io = io
+        total_read_string = sizeof_fmt(io["read_bytes"], sep=" ", fmt=".1f")
+        total_write_string = sizeof_fmt(io["write_bytes"], sep=" ", fmt=".1f")
 
-        total_read_string = sizeof_fmt(io.read_bytes, sep=" ", fmt=".1f")
-        total_write_string = sizeof_fmt(io.write_bytes, sep=" ", fmt=".1f")
-
-        self.down_box.renderable = "\n".join(
+        down_string = "\n".join(
             [
                 f"{read_bytes_s_string}",
                 f"max   {self.max_read_bytes_s_str}",
                 f"total {total_read_string}",
             ]
         )
-        self.up_box.renderable = "\n".join(
+        up_string = "\n".join(
             [
                 f"{write_bytes_s_string}",
                 f"max   {self.max_write_bytes_s_str}",
                 f"total {total_write_string}",
             ]
         )
-        self.refresh_graphs()
+        changed = (
+            down_string != self.down_box.renderable
+            or up_string != self.up_box.renderable
+        )
+        self.down_box.renderable = down_string
+        self.up_box.renderable = up_string
+
+        changed |= self.refresh_devices(io["devices"])
+        return self.refresh_graphs() or changed
+
+    def _sparkline_width(self) -> int:
+        # the panel border and padding, the name, and the numbers take the rest
+        return self.width - 4 - self.name_width - 50
+
+    def _layout(self):
+        # The panel has a fixed height. The graphs need at least the height of the
+        # boxes next to them. Then come the disk lines, as many as fit, and the usage
+        # table. If there's room left, the graphs get it.
+        if not self.has_io_counters or self.height == 0:
+            return
+        box_height = 5
+        usage_lines = 1 + len(self.disk_usage_rows) if self.disk_usage_rows else 1
+        # the border, and the header of the disk lines
+        room = self.height - 2 - 2 * box_height - usage_lines - 1
+        num_lines = len(self.device_names)
+        if num_lines > max(room, 0):
+            # the last line says how many disks aren't shown
+            self.max_device_lines = max(room - 1, 0)
+            num_lines = max(room, 0)
+        else:
+            self.max_device_lines = None
+        graph_height = box_height + max(room - num_lines, 0) // 2
+        if graph_height != self.read_stream.height:
+            self.read_stream.reset_height(graph_height)
+            self.write_stream.reset_height(graph_height)
+
+    def refresh_devices(self, devices: dict) -> bool:
+        names = list(devices)
+        if names != self.device_names:
+            self.device_names = names
+            self.name_width = max([len("disk"), *map(len, names)])
+            self.util_stream = BrailleMultiStream(
+                len(names), self._sparkline_width(), 1, 0.0, 100.0
+            )
+            self._layout()
+        self.device_rates = list(devices.values())
+        if any(r is not None for r in self.device_rates):
+            self.util_stream.add_values(
+                [
+                    0.0 if r is None or r["util"] is None else r["util"]
+                    for r in self.device_rates
+                ]
+            )
+        return self.refresh_device_lines()
+
+    def refresh_device_lines(self) -> bool:
+        nw = self.name_width
+        sw = self.util_stream.width
+        lines = [
+            Text(
+                f"{'disk':<{nw}} {'':<{sw}} {'read':>10} {'write':>10} {'IOPS':>6} "
+                f"{'await':>7} {'qd':>5} {'util':>5}",
+                style="bold",
+            )
+        ]
+        rows = list(zip(self.device_names, self.device_rates, self.util_stream.graphs))
+        hidden = 0
+        if self.max_device_lines is not None:
+            hidden = len(rows) - self.max_device_lines
+            rows = rows[: self.max_device_lines]
+        for name, r, graph in rows:
+            line = Text(f"{name:<{nw}} ")
+            line.append(graph[0], style="cyan")
+            if r is None:
+                lines.append(line)
+                continue
+            latency = r["latency_ms"]
+            qd = r["queue_depth"]
+            util = r["util"]
+            line.append(
+                f" {sizeof_fmt(r['read_bytes_s'], fmt='.1f', sep='') + '/s':>10}"
+                f" {sizeof_fmt(r['write_bytes_s'], fmt='.1f', sep='') + '/s':>10}"
+                f" {r['read_iops'] + r['write_iops']:6.0f}"
+                f" {'-' if latency is None else f'{latency:.1f}ms':>7}"
+                f" {'-' if qd is None else f'{qd:.1f}':>5}"
+            )
+            if util is None:
+                line.append(f" {'-':>5}")
+            else:
+                style = "red" if util > 90 else "yellow" if util > 60 else None
+                line.append(f" {util:4.0f}%", style=style)
+            lines.append(line)
+        if hidden > 0:
+            lines.append(Text(f"+{hidden} more", style="dim"))
+
+        # The styles follow from the numbers, so the plain text tells if anything
+        # changed.
+        key = tuple(line.plain for line in lines)
+        if key == self.device_lines_key:
+            return False
+        self.device_lines_key = key
+        text = Text("\n").join(lines)
+        text.no_wrap = True
+        text.overflow = "crop"
+        self.group.renderables[1] = text
+        return True
+
+    def refresh_graphs(self) -> bool:
+        key = render_key(self.read_stream, self.write_stream)
+        if key == self.graphs_key:
+            return False
+        self.graphs_key = key
 
-    def refresh_graphs(self):
         self.table.columns[0]._cells[0] = Text(
             "\n".join(self.read_stream.graph), style="green"
         )
         self.table.columns[0]._cells[1] = Text(
             "\n".join(self.write_stream.graph), style="blue"
         )
+        return True
+
+    def refresh_drive_temps(self, sensors: dict) -> bool:
+        # one temperature per drive; the NVMe "Composite" is the first one
+        temps = {}
+        for key, temp in sensors.items():
+            name = key.split(" ", 1)[0]
+            if name.startswith(("nvme", "drivetemp")) and name not in temps:
+                temps[name] = temp
+        subtitle = (
+            " ".join(f"{name} {round(temp)}°C" for name, temp in temps.items()) or None
+        )
+        if subtitle == self.panel.subtitle:
+            return False
+        self.panel.subtitle = subtitle
+        return True
+
+    def refresh_disk_usage(self, rows: list) -> bool:
+        if rows == self.disk_usage_rows:
+            return False
+        relayout = len(rows) != len(self.disk_usage_rows or [])
+        self.disk_usage_rows = rows
+        if relayout:
+            self._layout()
+            if self.has_io_counters:
+                self.refresh_graphs()
+                self.refresh_device_lines()
 
-    def refresh_disk_usage(self):
         table = Table(box=None, expand=False, padding=(0, 1), show_header=True)
         table.add_column("", justify="left", no_wrap=True, style="bold")
         table.add_column(Text("free", justify="left"), justify="right", no_wrap=True)
@@ -154,34 +293,34 @@ class Disk(Widget):
         table.add_column(Text("total", justify="left"), justify="right", no_wrap=True)
         table.add_column("", justify="right", no_wrap=True)
 
-        for mp in self.mountpoints:
-            try:
-                du = psutil.disk_usage(mp)
-            except PermissionError:
-                # https://github.com/nschloe/tiptop/issues/71
-                continue
-
+        for mp, free, used, total, percent in rows:
             style = None
-            if du.percent > 99:
+            if percent > 99:
                 style = "red reverse bold"
-            elif du.percent > 95:
+            elif percent > 95:
                 style = "yellow"
 
             table.add_row(
                 mp,
-                sizeof_fmt(du.free, fmt=".1f"),
-                sizeof_fmt(du.used, fmt=".1f"),
-                sizeof_fmt(du.total, fmt=".1f"),
-                f"({du.percent:.1f}%)",
+                sizeof_fmt(free, fmt=".1f"),
+                sizeof_fmt(used, fmt=".1f"),
+                sizeof_fmt(total, fmt=".1f"),
+                f"({percent:.1f}%)",
                 style=style,
             )
         self.group.renderables[-1] = table
+        return True
 
     def render(self):
         return self.panel
 
     async def on_resize(self, event):
+        self.width = event.width
+        self.height = event.height
         if self.has_io_counters:
+            self._layout()
             self.read_stream.reset_width(event.width - 25)
             self.write_stream.reset_width(event.width - 25)
+            self.util_stream.reset_width(self._sparkline_width())
             self.refresh_graphs()
+            self.refresh_device_lines()
@@ -12,3 +12,22 @@ def sizeof_fmt(num, fmt=".0f", suffix: str = "iB", sep=" "):
         num /= 1024
     string = f"{{:{fmt}}}".format(num)
     return f"{string}{sep}Y{suffix}"
+
+
+def render_key(*streams):
+    """Key for caching renderables built from the graphs of the given streams. It
+    changes whenever one of the graphs changes.
+    """
+    return tuple((s.version, s.width, s.height) for s in streams)
+
+
+def count_fmt(num, fmt=".0f", sep=" "):
+    """Like sizeof_fmt, for counts, e.g., packets: 1000 is 1 k."""
+    assert num >= 0
+    for unit in ["", "k", "M", "G", "T"]:
+        if num < 1000:
+            string = f"{{:{fmt}}}".format(num)
+            return f"{string}{sep}{unit}".rstrip()
+        num /= 1000
+    string = f"{{:{fmt}}}".format(num)
+    return f"{string}{sep}P"
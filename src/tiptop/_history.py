@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from array import array
+from math import ceil
+
+
+class _Tier:
+    """Fixed-size ring buffers with the min, max, and mean of `factor` consecutive
+    samples each.
+    """
+
+    def __init__(self, factor: int, capacity: int):
+        self.factor = factor
+        self.capacity = capacity
+        self.mins = array("d", [0.0]) * capacity
+        if factor == 1:
+            # min, max, and mean of one sample are the same
+            self.maxs = self.means = self.mins
+        else:
+            self.maxs = array("d", [0.0]) * capacity
+            self.means = array("d", [0.0]) * capacity
+        self.head = 0
+        self.filled = 0
+
+        # the bucket that is currently being filled
+        self._num = 0
+        self._min = 0.0
+        self._max = 0.0
+        self._sum = 0.0
+
+    def add(self, vmin: float, vmax: float, vmean: float) -> bool:
+        """Add one bucket of the previous tier, summarized by min, max, and mean.
+        Returns True if this completed a bucket.
+        """
+        if self._num == 0:
+            self._min = vmin
+            self._max = vmax
+            self._sum = 0.0
+        else:
+            if vmin < self._min:
+                self._min = vmin
+            if vmax > self._max:
+                self._max = vmax
+        # all buckets of the previous tier have the same weight
+        self._sum += vmean
+        self._num += 1
+
+        if self._num < self.factor:
+            return False
+
+        head = self.head
+        self.mins[head] = self._min
+        self.maxs[head] = self._max
+        self.means[head] = self._sum / self._num
+        self.head = (head + 1) % self.capacity
+        self.filled = min(self.filled + 1, self.capacity)
+        self._num = 0
+        return True
+
+    def last(self, buf: array, n: int) -> list[float]:
+        # the newest n buckets, oldest first
+        n = min(n, self.filled)
+        head = self.head
+        if n <= head:
+            return buf[head - n : head].tolist()
+        return (buf[head - n :] + buf[:head]).tolist()
+
+
+class History:
+    """Long-term history of one metric with a fixed memory footprint.
+
+    The samples are kept at full resolution for the most recent time, and as
+    min/max/mean rollups of increasingly many samples further back. `tiers` is a
+    list of (samples per bucket, number of buckets); every entry's samples per
+    bucket must be a multiple of the previous one. The default, with samples every
+    2 s, keeps 1 h at full resolution, 6 h at 10 s, 1 day at 1 min, and one week at
+    10 min, in about 125 kB.
+
+    Adding a sample is O(1); only when a bucket is complete is it passed on to the
+    next coarser tier.
+    """
+
+    def __init__(
+        self,
+        interval: float = 2.0,
+        tiers: list[tuple[int, int]] | None = None,
+    ):
+        if tiers is None:
+            tiers = [(1, 1800), (5, 2160), (30, 1440), (300, 1008)]
+        assert tiers[0][0] == 1
+        self.interval = interval
+        self.tiers = []
+        for k, (samples_per_bucket, capacity) in enumerate(tiers):
+            prev = tiers[k - 1][0] if k > 0 else 1
+            assert samples_per_bucket % prev == 0
+            self.tiers.append(_Tier(samples_per_bucket // prev, capacity))
+        self.samples_per_bucket = [spb for spb, _ in tiers]
+
+    def add_value(self, value: float):
+        # The first tier has one sample per bucket, so min, max, and mean are all
+        # the same. Cascade completed buckets to the coarser tiers.
+        vmin = vmax = vmean = value
+        for tier in self.tiers:
+            if not tier.add(vmin, vmax, vmean):
+                break
+            h = tier.head - 1
+            vmin, vmax, vmean = tier.mins[h], tier.maxs[h], tier.means[h]
+
+    def span(self, k: int) -> float:
+        """The time covered by tier k in seconds."""
+        return self.tiers[k].capacity * self.samples_per_bucket[k] * self.interval
+
+    def window(
+        self,
+        duration: float,
+        num_points: int | None = None,
+        reduce: str = "mean",
+    ) -> list[float]:
+        """The values of the last `duration` seconds, oldest first, from the finest
+        tier that covers the whole window. `reduce` is one of "min", "max", or
+        "mean". If `num_points` is given, neighboring buckets are combined such that
+        at most `num_points` values are returned.
+        """
+        for k, tier in enumerate(self.tiers):
+            if self.span(k) >= duration:
+                break
+        step = self.samples_per_bucket[k] * self.interval
+        buf = {"min": tier.mins, "max": tier.maxs, "mean": tier.means}[reduce]
+        values = tier.last(buf, ceil(duration / step))
+
+        if num_points is None or len(values) <= num_points:
+            return values
+
+        # combine groups of n buckets
+        n = ceil(len(values) / num_points)
+        # align the groups to the newest value
+        groups = [values[max(k - n, 0) : k] for k in range(len(values), 0, -n)][::-1]
+        combine = {"min": min, "max": max, "mean": lambda g: sum(g) / len(g)}[reduce]
+        return [combine(group) for group in groups]
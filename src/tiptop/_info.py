@@ -1,63 +1,78 @@
-import getpass
-import platform
-import time
 from datetime import datetime, timedelta
 
-import distro
-import psutil
 from rich.table import Table
 from textual.widget import Widget
 
+from ._sampler import Sampler
+
 
 class InfoLine(Widget):
-    def on_mount(self):
+    def __init__(self, sampler: Sampler):
+        super().__init__()
+        self.sampler = sampler
         self.width = 0
         self.height = 0
-        self.set_interval(1.0, self.refresh)
-
-        # The getlogin docs say:
-        # > For most purposes, it is more useful to use getpass.getuser() [...]
-        # username = os.getlogin()
-        username = getpass.getuser()
-        ustring = f"{username} @"
-        node = platform.node()
-        if node:
-            ustring += f" [b]{platform.node()}[/]"
-
-        system = platform.system()
-        if system == "Linux":
-            ri = distro.os_release_info()
-            system_list = [ri["name"]]
-            if "version_id" in ri:
-                system_list.append(ri["version_id"])
-            system_list.append(f"{platform.architecture()[0]} / {platform.release()}")
-            system_string = " ".join(system_list)
-        elif system == "Darwin":
-            system_string = f"macOS {platform.mac_ver()[0]}"
-        else:
-            # fallback
-            system_string = ""
 
-        self.left_string = " ".join([ustring, system_string])
-        self.boot_time = psutil.boot_time()
+        host = self.sampler.get("host")
+        ustring = f"{host['username']} @"
+        if host["node"]:
+            ustring += f" [b]{host['node']}[/]"
+        self.left_string = " ".join([ustring, host["system"]])
+        self.boot_time = host["boot_time"]
+
+        self.time = None
+        self.battery = None
+        self.sampler.subscribe(self.collect_data, "time", "battery")
+        # the playback state when replaying a recording
+        self.replay = None
+        if "replay" in self.sampler.metrics:
+            self.sampler.subscribe(self.collect_data, "replay")
+
+    def collect_data(self, snapshot: dict):
+        if "time" in snapshot:
+            self.time = snapshot["time"]
+        if "battery" in snapshot:
+            self.battery = snapshot["battery"]
+        if "replay" in snapshot:
+            self.replay = snapshot["replay"]
+        self.refresh()
 
     def render(self):
-        uptime = timedelta(seconds=time.time() - self.boot_time)
+        uptime = timedelta(seconds=self.time - self.boot_time)
         h, m = seconds_to_h_m(uptime.seconds)
 
         right = [f"up {uptime.days}d, {h}:{m:02d}h"]
 
-        bat = psutil.sensors_battery()
+        # Ticks are missed if collecting took longer than the interval, e.g., on an
+        # overloaded system. The rates use the real time between two samples, so
+        # they're still right, but the graphs get fewer points.
+        missed = self.sampler.missed_ticks
+        if missed > 0:
+            right.insert(
+                0, f"[yellow]{missed} missed tick{'s' if missed > 1 else ''}[/]"
+            )
+
+        replay = self.replay
+        if replay is not None:
+            if replay["end"]:
+                state = "end"
+            elif replay["paused"]:
+                state = "paused"
+            else:
+                state = f"{replay['speed']:g}x"
+            right.insert(0, f"[reverse] replay {state} [/]")
+
+        bat = self.battery
         if bat is not None:
-            # hh, mm = seconds_to_h_m(bat.secsleft)
-            bat_string = f"bat {bat.percent:.1f}%"
-            if bat.power_plugged:
+            # hh, mm = seconds_to_h_m(bat["secsleft"])
+            bat_string = f"bat {bat['percent']:.1f}%"
+            if bat["power_plugged"]:
                 bat_string = "[green]" + bat_string + "[/]"
-            elif bat.percent < 10:
+            elif bat["percent"] < 10:
                 bat_string = "[red reverse bold]" + bat_string + "[/]"
-            elif bat.percent < 15:
+            elif bat["percent"] < 15:
                 bat_string = "[red]" + bat_string + "[/]"
-            elif bat.percent < 20:
+            elif bat["percent"] < 20:
                 bat_string = "[yellow]" + bat_string + "[/]"
             right.append(bat_string)
 
@@ -71,7 +86,9 @@ class InfoLine(Widget):
             table.add_column(justify="center", no_wrap=True, ratio=1)
             table.add_column(justify="right", no_wrap=True, ratio=1)
             table.add_row(
-                self.left_string, datetime.now().strftime("%c"), "  ".join(right)
+                self.left_string,
+                datetime.fromtimestamp(self.time).strftime("%c"),
+                "  ".join(right),
             )
         return table
 
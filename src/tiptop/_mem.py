@@ -1,28 +1,29 @@
-import psutil
 from rich import box
 from rich.console import Group
 from rich.panel import Panel
 from rich.text import Text
 from textual.widget import Widget
 
-from ._helpers import sizeof_fmt
+from ._helpers import render_key, sizeof_fmt
+from ._sampler import Sampler
 from .braille_stream import BrailleStream
 
 
 class Mem(Widget):
-    def on_mount(self):
-        mem = psutil.virtual_memory()
-        self.mem_total_bytes = mem.total
+    def __init__(self, sampler: Sampler):
+        super().__init__()
+        self.sampler = sampler
+        mem = self.sampler.get("mem")
+        self.mem_total_bytes = mem["total"]
 
-        # check which mem sections are available on the machine
+        # the mem sections that are available on the machine
         self.attrs = []
         self.colors = ["yellow", "green", "blue", "magenta", "red"]
         for attr in ["free", "available", "cached", "used"]:
-            if hasattr(mem, attr):
+            if attr in mem:
                 self.attrs.append(attr)
 
-        swap = psutil.swap_memory()
-        if swap is not None:
+        if "swap_total" in mem:
             self.attrs.append("swap")
 
         # append spaces to make all names equally long
@@ -35,10 +36,12 @@ class Mem(Widget):
         # since that only creates one BrailleStream, references n times.
         self.mem_streams = []
         for attr in self.attrs:
-            total = swap.total if attr == "swap" else self.mem_total_bytes
+            total = mem["swap_total"] if attr == "swap" else self.mem_total_bytes
             self.mem_streams.append(BrailleStream(40, 4, 0.0, total))
 
         self.group = Group("", "", "", "", "")
+        self.val_strings = [""] * len(self.attrs)
+        self.graph_keys = [None] * len(self.attrs)
 
         mem_total_string = sizeof_fmt(self.mem_total_bytes, fmt=".2f")
         self.panel = Panel(
@@ -49,39 +52,53 @@ class Mem(Widget):
             box=box.SQUARE,
         )
 
-        self.refresh_table()
-        self.set_interval(2.0, self.refresh_table)
+        self.sampler.subscribe(self.collect_data, "mem")
 
-    def refresh_table(self):
-        mem = psutil.virtual_memory()
-        swap = psutil.swap_memory()
+    def collect_data(self, snapshot: dict):
+        mem = snapshot["mem"]
 
         for k, (attr, label, stream, col) in enumerate(
             zip(self.attrs, self.labels, self.mem_streams, self.colors)
         ):
             if attr == "swap":
-                val = swap.used
-                total = swap.total
+                val = mem["swap_used"]
+                total = mem["swap_total"]
                 if total == 0:
                     total = 1
             else:
-                val = getattr(mem, attr)
+                val = mem[attr]
                 total = self.mem_total_bytes
 
             stream.add_value(val)
-            val_string = " ".join(
+            self.val_strings[k] = " ".join(
                 [
                     label,
                     sizeof_fmt(val, fmt=".2f"),
                     f"({val / total * 100:.0f}%)",
                 ]
             )
+
+        # only repaint if anything changed
+        if self.refresh_graphs():
+            self.refresh()
+
+    def refresh_graphs(self) -> bool:
+        changed = False
+        for k, (val_string, stream, col) in enumerate(
+            zip(self.val_strings, self.mem_streams, self.colors)
+        ):
+            key = (render_key(stream), val_string)
+            if key == self.graph_keys[k]:
+                continue
+            self.graph_keys[k] = key
+            changed = True
+
             graph = "\n".join(
                 [val_string + stream.graph[0][len(val_string) :]] + stream.graph[1:]
             )
             self.group.renderables[k] = Text(graph, style=col)
 
-        self.refresh()
+        return changed
 
     def render(self) -> Panel:
         return self.panel
@@ -103,4 +120,4 @@ class Mem(Widget):
         for ms, h in zip(self.mem_streams, heights):
             ms.reset_height(h)
 
-        self.refresh_table()
+        self.refresh_graphs()
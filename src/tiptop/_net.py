@@ -1,8 +1,5 @@
 from __future__ import annotations
 
-import socket
-
-import psutil
 from rich import box
 from rich.console import Group
 from rich.panel import Panel
@@ -11,53 +8,74 @@ from rich.text import Text
 from textual.widget import Widget
 
 from .__about__ import __version__
-from ._helpers import sizeof_fmt
+from ._helpers import count_fmt, render_key, sizeof_fmt
+from ._sampler import Sampler, Snapshot
 from .braille_stream import BrailleStream
 
-# def get_ip():
-#     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-#     s.connect(("8.8.8.8", 80))
-#     ip = s.getsockname()[0]
-#     s.close()
-#     return ip
-
-
-def _autoselect_interface():
-    """try to find non-lo and non-docker interface that is up"""
-    stats = psutil.net_if_stats()
-    score_dict = {}
-    for name, stats in stats.items():
-        if not stats.isup:
-            score_dict[name] = 0
-        elif (
-            # On Unix, we have `lo`, on Windows `Loopback Pseudo-Interface k`
-            # and `Local Area Connection k` (the latter is valid)
-            name.startswith("lo")
-            or name.lower().startswith("loopback")
-            or name.lower().startswith("docker")
-        ):
-            score_dict[name] = 1
-        elif name.lower().startswith("fw") or name.lower().startswith("Bluetooth"):
-            # firewire <https://github.com/nschloe/tiptop/issues/45#issuecomment-991884364>
-            # or bluetooth
-            score_dict[name] = 2
-        else:
-            score_dict[name] = 3
+# The views of the net panel: (name, counter in, counter out, smallest graph scale).
+# The counters have the same names as in psutil.
+views = [
+    ("bytes", "bytes_recv", "bytes_sent", 1.0e6),
+    ("packets", "packets_recv", "packets_sent", 1.0e3),
+    ("errors", "errin", "errout", 1.0),
+    ("drops", "dropin", "dropout", 1.0),
+]
+
+
+def _fmt(view: str, num: float) -> str:
+    if view == "bytes":
+        return sizeof_fmt(num, fmt=".1f")
+    return count_fmt(num, fmt=".1f")
+
+
+class _Rate:
+    """The current and max rate of one counter, and its graph."""
+
+    def __init__(self, minval: float, flipud: bool):
+        self.rate = None
+        self.max = 0
+        self.stream = BrailleStream(20, 5, 0.0, minval, flipud=flipud, autoscale=True)
+
+    def add(self, rate: float):
+        self.rate = rate
+        self.max = max(self.max, rate)
+        self.stream.add_value(rate)
+
 
-    # Amongst all keys with max score, get the alphabetically first.
-    # This is to prefer en0 over en5, <https://github.com/nschloe/tiptop/issues/81>.
-    max_score = max(score_dict.values())
-    max_keys = [key for key, score in score_dict.items() if score == max_score]
-    return sorted(max_keys)[0]
+class _Traffic:
+    """The rates of all counters of one watched interface or pattern."""
+
+    def __init__(self):
+        self.last_net = None
+        self.last_time = None
+        # counter name -> rate
+        self.rates = {}
+        for _, counter_in, counter_out, minval in views:
+            self.rates[counter_in] = _Rate(minval, flipud=False)
+            self.rates[counter_out] = _Rate(minval, flipud=True)
+
+    def add(self, net: dict, now: float):
+        # the time that really passed, not the nominal interval
+        if self.last_net is not None and now > self.last_time:
+            dt = now - self.last_time
+            for name, rate in self.rates.items():
+                # The counters start over if an interface is created again.
+                rate.add(max(net[name] - self.last_net[name], 0) / dt)
+        self.last_net = net
+        self.last_time = now
 
 
 class Net(Widget):
-    def __init__(self, interface: str | None = None):
-        self.interface = _autoselect_interface() if interface is None else interface
-        self.tiptop_string = f"tiptop v{__version__}"
+    def __init__(self, sampler: Sampler, interfaces: list[str]):
         super().__init__()
-
-    def on_mount(self):
+        self.sampler = sampler
+        # Interface names or glob patterns. With more than one, the graphs show the
+        # selected one, and a list shows the rates of all of them.
+        self.interfaces = interfaces
+        self.selected = 0
+        # cycle through `views` with `cycle_view()`
+        self.view_index = 0
+        self.tiptop_string = f"tiptop v{__version__}"
         self.down_box = Panel(
             "",
             title="▼ down",
@@ -81,10 +99,15 @@ class Net(Widget):
         self.table.add_row("", self.down_box)
         self.table.add_row("", self.up_box)
 
-        self.group = Group(self.table, "", "")
+        # The graphs, then errors and drops if there are any, the list of interfaces
+        # if there's more than one, and the IP addresses
+        self.group = Group(self.table)
+        self.problems = None
+        self.interface_list = None
+        self.ip_lines = []
         self.panel = Panel(
             self.group,
-            title=f"[b]net[/] - {self.interface}",
+            title="",
             # border_style="red",
             border_style="white",
             title_align="left",
@@ -92,100 +115,176 @@ class Net(Widget):
             subtitle=self.tiptop_string,
             subtitle_align="right",
         )
+        self.refresh_title()
 
-        self.last_net = None
-        self.max_recv_bytes_s = 0
-        self.max_recv_bytes_s_str = ""
-        self.max_sent_bytes_s = 0
-        self.max_sent_bytes_s_str = ""
-
-        self.recv_stream = BrailleStream(20, 5, 0.0, 1.0e6)
-        self.sent_stream = BrailleStream(20, 5, 0.0, 1.0e6, flipud=True)
-
-        self.refresh_ips()
-        self.refresh_panel()
-
-        self.interval_s = 2.0
-        self.set_interval(self.interval_s, self.refresh_panel)
-        self.set_interval(60.0, self.refresh_ips)
-
-    def refresh_ips(self):
-        addrs = psutil.net_if_addrs()[self.interface]
-        ipv4 = []
-        for addr in addrs:
-            # ipv4?
-            if addr.family == socket.AF_INET:
-                ipv4.append(addr.address + " / " + addr.netmask)
-        ipv6 = []
-        for addr in addrs:
-            # ipv4?
-            if addr.family == socket.AF_INET6:
-                ipv6.append(addr.address)
-
-        ipv4 = "\n      ".join(ipv4)
-        ipv6 = "\n      ".join(ipv6)
-        self.group.renderables[1] = f"[b]IPv4:[/] {ipv4}"
-        self.group.renderables[2] = f"[b]IPv6:[/] {ipv6}"
+        self.traffic = {name: _Traffic() for name in self.interfaces}
+        self.graphs_key = None
+        self.ips = {}
 
-    # would love to collect data upon each render(), but render is called too often
-    # <https://github.com/willmcgugan/textual/issues/162>
-    def refresh_panel(self):
-        net = psutil.net_io_counters(pernic=True)[self.interface]
-        if self.last_net is None:
-            recv_bytes_s_string = ""
-            sent_bytes_s_string = ""
-        else:
-            recv_bytes_s = (net.bytes_recv - self.last_net.bytes_recv) / self.interval_s
-            recv_bytes_s_string = sizeof_fmt(recv_bytes_s, fmt=".1f") + "/s"
-            sent_bytes_s = (net.bytes_sent - self.last_net.bytes_sent) / self.interval_s
-            sent_bytes_s_string = sizeof_fmt(sent_bytes_s, fmt=".1f") + "/s"
+        self.sampler.subscribe(self.refresh_ips, "net_ips")
+        self.sampler.subscribe(self.refresh_panel, "net")
 
-            if recv_bytes_s > self.max_recv_bytes_s:
-                self.max_recv_bytes_s = recv_bytes_s
-                self.max_recv_bytes_s_str = sizeof_fmt(recv_bytes_s, fmt=".1f") + "/s"
+    @property
+    def selected_traffic(self) -> _Traffic:
+        return self.traffic[self.interfaces[self.selected]]
 
-            if sent_bytes_s > self.max_sent_bytes_s:
-                self.max_sent_bytes_s = sent_bytes_s
-                self.max_sent_bytes_s_str = sizeof_fmt(sent_bytes_s, fmt=".1f") + "/s"
+    def cycle_interface(self):
+        self.selected = (self.selected + 1) % len(self.interfaces)
+        self.refresh_ip_lines()
+        self.refresh_all()
 
-            self.recv_stream.add_value(recv_bytes_s)
-            self.sent_stream.add_value(sent_bytes_s)
+    def cycle_view(self):
+        self.view_index = (self.view_index + 1) % len(views)
+        self.refresh_all()
 
-        self.last_net = net
+    def refresh_all(self):
+        self.refresh_title()
+        self.refresh_boxes()
+        self.refresh_problems()
+        self.refresh_interface_list()
+        self.refresh_group()
+        self.refresh_graphs()
+        self.refresh()
 
-        total_recv_string = sizeof_fmt(net.bytes_recv, sep=" ", fmt=".1f")
-        total_sent_string = sizeof_fmt(net.bytes_sent, sep=" ", fmt=".1f")
+    def refresh_title(self):
+        title = f"[b]net[/] - {self.interfaces[self.selected]}"
+        view = views[self.view_index][0]
+        if view != "bytes":
+            title += f" - {view}"
+        self.panel.title = title
 
-        self.down_box.renderable = "\n".join(
-            [
-                f"{recv_bytes_s_string}",
-                f"max   {self.max_recv_bytes_s_str}",
-                f"total {total_recv_string}",
-            ]
-        )
-        self.up_box.renderable = "\n".join(
-            [
-                f"{sent_bytes_s_string}",
-                f"max   {self.max_sent_bytes_s_str}",
-                f"total {total_sent_string}",
-            ]
+    def refresh_group(self):
+        extra = [self.problems, self.interface_list, *self.ip_lines]
+        self.group.renderables[1:] = [r for r in extra if r is not None]
+
+    def refresh_ips(self, snapshot: dict):
+        self.ips = snapshot["net_ips"]
+        if self.refresh_ip_lines():
+            self.refresh_group()
+            self.refresh()
+
+    def refresh_ip_lines(self) -> bool:
+        ips = self.ips.get(self.interfaces[self.selected])
+        if ips is None:
+            # a pattern
+            ip_lines = []
+        else:
+            ipv4 = "\n      ".join(ips["ipv4"])
+            ipv6 = "\n      ".join(ips["ipv6"])
+            ip_lines = [f"[b]IPv4:[/] {ipv4}", f"[b]IPv6:[/] {ipv6}"]
+        if ip_lines == self.ip_lines:
+            return False
+        self.ip_lines = ip_lines
+        return True
+
+    # would love to collect data upon each render(), but render is called too often
+    # <https://github.com/willmcgugan/textual/issues/162>
+    def refresh_panel(self, snapshot: Snapshot):
+        now = snapshot.times["net"]
+        for name, net in snapshot["net"].items():
+            self.traffic[name].add(net, now)
+
+        changed = self.refresh_boxes()
+        changed |= self.refresh_problems()
+        self.refresh_interface_list()
+        self.refresh_group()
+        # only repaint if anything changed
+        if self.refresh_graphs() or changed or self.interface_list is not None:
+            self.refresh()
+
+    def refresh_boxes(self) -> bool:
+        view, counter_in, counter_out, _ = views[self.view_index]
+        traffic = self.selected_traffic
+        strings = []
+        for counter in [counter_in, counter_out]:
+            rate = traffic.rates[counter]
+            rate_string = "" if rate.rate is None else _fmt(view, rate.rate) + "/s"
+            max_string = "" if rate.max == 0 else _fmt(view, rate.max) + "/s"
+            total_string = _fmt(view, traffic.last_net[counter])
+            strings.append(
+                "\n".join(
+                    [
+                        f"{rate_string}",
+                        f"max   {max_string}",
+                        f"total {total_string}",
+                    ]
+                )
+            )
+        down_string, up_string = strings
+        changed = (
+            down_string != self.down_box.renderable
+            or up_string != self.up_box.renderable
         )
-        self.refresh_graphs()
+        self.down_box.renderable = down_string
+        self.up_box.renderable = up_string
+        return changed
 
-        self.refresh()
+    def refresh_problems(self) -> bool:
+        # Errors and drops are often the first sign of trouble, so they're shown in
+        # all views as soon as there are any.
+        traffic = self.selected_traffic
+        parts = []
+        for view, counter_in, counter_out, _ in views[2:]:
+            rate_in = traffic.rates[counter_in].rate or 0.0
+            rate_out = traffic.rates[counter_out].rate or 0.0
+            if rate_in or rate_out:
+                parts.append(
+                    f"{view} ▼ {count_fmt(rate_in, fmt='.1f')}/s "
+                    f"▲ {count_fmt(rate_out, fmt='.1f')}/s"
+                )
+        problems = Text("  ".join(parts), style="red") if parts else None
+        changed = problems != self.problems
+        self.problems = problems
+        return changed
+
+    def refresh_interface_list(self):
+        if len(self.interfaces) < 2:
+            return
+        view, counter_in, counter_out, _ = views[self.view_index]
+        table = Table(box=None, expand=False, padding=(0, 1), show_header=False)
+        table.add_column("", no_wrap=True)
+        table.add_column("", justify="right", no_wrap=True, style="green")
+        table.add_column("", justify="right", no_wrap=True, style="blue")
+        for k, name in enumerate(self.interfaces):
+            rates = self.traffic[name].rates
+            rate_in = rates[counter_in].rate
+            rate_out = rates[counter_out].rate
+            if rate_in is None:
+                down = up = ""
+            else:
+                down = _fmt(view, rate_in) + "/s"
+                up = _fmt(view, rate_out) + "/s"
+            table.add_row(
+                name,
+                f"▼ {down}",
+                f"▲ {up}",
+                style="bold" if k == self.selected else None,
+            )
+        self.interface_list = table
+
+    def refresh_graphs(self) -> bool:
+        _, counter_in, counter_out, _ = views[self.view_index]
+        rates = self.selected_traffic.rates
+        recv_stream = rates[counter_in].stream
+        sent_stream = rates[counter_out].stream
+        key = (self.selected, self.view_index, render_key(recv_stream, sent_stream))
+        if key == self.graphs_key:
+            return False
+        self.graphs_key = key
 
-    def refresh_graphs(self):
         self.table.columns[0]._cells[0] = Text(
-            "\n".join(self.recv_stream.graph), style="green"
+            "\n".join(recv_stream.graph), style="green"
         )
         self.table.columns[0]._cells[1] = Text(
-            "\n".join(self.sent_stream.graph), style="blue"
+            "\n".join(sent_stream.graph), style="blue"
         )
+        return True
 
     def render(self):
         return self.panel
 
     async def on_resize(self, event):
-        self.sent_stream.reset_width(event.width - 25)
-        self.recv_stream.reset_width(event.width - 25)
+        for traffic in self.traffic.values():
+            for rate in traffic.rates.values():
+                rate.stream.reset_width(event.width - 25)
         self.refresh_graphs()
@@ -0,0 +1,364 @@
+"""The metrics that tiptop collects, served over HTTP in the OpenMetrics text format,
+<https://github.com/OpenObservability/OpenMetrics/blob/main/specification/OpenMetrics.md>.
+"""
+
+from __future__ import annotations
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from math import inf
+
+from .__about__ import __version__
+from ._sampler import Sampler, Snapshot
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# psutil counter names -> (metric name, help)
+_net_counters = {
+    "bytes_recv": ("receive_bytes", "Bytes received"),
+    "bytes_sent": ("transmit_bytes", "Bytes sent"),
+    "packets_recv": ("receive_packets", "Packets received"),
+    "packets_sent": ("transmit_packets", "Packets sent"),
+    "errin": ("receive_errors", "Errors while receiving"),
+    "errout": ("transmit_errors", "Errors while sending"),
+    "dropin": ("receive_drops", "Incoming packets that were dropped"),
+    "dropout": ("transmit_drops", "Outgoing packets that were dropped"),
+}
+
+# DiskIOCollector rates -> (metric name, help, factor)
+_disk_rates = {
+    "read_bytes_s": ("read_bytes_per_second", "Bytes read per second", 1.0),
+    "write_bytes_s": ("written_bytes_per_second", "Bytes written per second", 1.0),
+    "read_iops": ("reads_per_second", "Reads completed per second", 1.0),
+    "write_iops": ("writes_per_second", "Writes completed per second", 1.0),
+    "latency_ms": ("latency_seconds", "Average time per IO", 1.0e-3),
+    "queue_depth": ("queue_depth", "Average number of IOs in flight", 1.0),
+    "util": ("utilization_percent", "Time the device was busy", 1.0),
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if value != value:
+        return "NaN"
+    if value in (inf, -inf):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class _Exposition:
+    """The lines of one exposition, family by family."""
+
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def add(self, name: str, kind: str, help: str, samples: list[tuple[dict, float]]):
+        # `samples` are (labels, value); samples without a value are left out
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        self.lines.append(f"# TYPE {name} {kind}")
+        self.lines.append(f"# HELP {name} {help}")
+        sample_name = name + {"counter": "_total", "info": "_info"}.get(kind, "")
+        for labels, value in samples:
+            if labels:
+                label_string = ",".join(
+                    f'{key}="{_escape(val)}"' for key, val in labels.items()
+                )
+                self.lines.append(f"{sample_name}{{{label_string}}} {_number(value)}")
+            else:
+                self.lines.append(f"{sample_name} {_number(value)}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines + ["# EOF", ""])
+
+
+def _info(out: _Exposition, data: dict):
+    labels = {"version": __version__}
+    host = data.get("host")
+    if host is not None:
+        labels["node"] = host["node"]
+    if data.get("cpu_model") is not None:
+        labels["cpu_model"] = data["cpu_model"]
+    out.add("tiptop", "info", "Information about tiptop", [(labels, 1)])
+
+
+def _cpu(out: _Exposition, data: dict):
+    cpu = data.get("cpu")
+    if cpu is not None:
+        out.add("tiptop_cpu_busy_percent", "gauge", "CPU load", [({}, cpu["total"])])
+        out.add(
+            "tiptop_cpu_thread_busy_percent",
+            "gauge",
+            "CPU load per thread",
+            [({"thread": k}, load) for k, load in enumerate(cpu["per_thread"])],
+        )
+        out.add(
+            "tiptop_cpu_mode_percent",
+            "gauge",
+            "CPU load by mode",
+            [({"mode": mode}, load) for mode, load in cpu["breakdown"].items()],
+        )
+
+    freq = data.get("freq")
+    if freq is not None:
+        out.add(
+            "tiptop_cpu_frequency_hertz",
+            "gauge",
+            "Current CPU frequency per thread",
+            [
+                ({"thread": k}, None if f is None else f * 1.0e6)
+                for k, f in enumerate(freq["per_thread"])
+            ],
+        )
+
+    temps = data.get("temps")
+    if temps is not None:
+        out.add(
+            "tiptop_cpu_temperature_celsius",
+            "gauge",
+            "CPU temperatures as in the cpu panel",
+            [({"index": k}, temp) for k, temp in enumerate(temps)],
+        )
+    out.add(
+        "tiptop_temperature_celsius",
+        "gauge",
+        "Temperatures of all sensors",
+        [({"sensor": name}, temp) for name, temp in data.get("sensors", {}).items()],
+    )
+    out.add("tiptop_fan_speed_rpm", "gauge", "Fan speed", [({}, data.get("fan"))])
+
+
+def _mem(out: _Exposition, data: dict):
+    for key, value in (data.get("mem") or {}).items():
+        what = key.replace("_", " ")
+        out.add(f"tiptop_memory_{key}_bytes", "gauge", f"Memory {what}", [({}, value)])
+
+
+def _disk(out: _Exposition, data: dict):
+    disk_io = data.get("disk_io")
+    if disk_io is not None:
+        out.add(
+            "tiptop_disk_read_bytes",
+            "counter",
+            "Bytes read from all disks",
+            [({}, disk_io["read_bytes"])],
+        )
+        out.add(
+            "tiptop_disk_written_bytes",
+            "counter",
+            "Bytes written to all disks",
+            [({}, disk_io["write_bytes"])],
+        )
+        devices = {
+            name: rates
+            for name, rates in disk_io["devices"].items()
+            if rates is not None
+        }
+        for key, (name, help, factor) in _disk_rates.items():
+            out.add(
+                f"tiptop_disk_{name}",
+                "gauge",
+                help,
+                [
+                    ({"device": device}, None if r[key] is None else r[key] * factor)
+                    for device, r in devices.items()
+                ],
+            )
+
+    rows = data.get("disk_usage") or []
+    for k, (name, help) in enumerate(
+        [("free", "Free space"), ("used", "Used space"), ("size", "Size")]
+    ):
+        out.add(
+            f"tiptop_filesystem_{name}_bytes",
+            "gauge",
+            help,
+            # (mountpoint, free, used, total, percent)
+            [({"mountpoint": row[0]}, row[1 + k]) for row in rows],
+        )
+
+
+def _net(out: _Exposition, data: dict, net_rates: dict):
+    net = data.get("net") or {}
+    for counter, (name, help) in _net_counters.items():
+        out.add(
+            f"tiptop_network_{name}",
+            "counter",
+            help,
+            [({"interface": iface}, values[counter]) for iface, values in net.items()],
+        )
+        out.add(
+            f"tiptop_network_{name}_per_second",
+            "gauge",
+            f"{help} per second",
+            [
+                ({"interface": iface}, rates[counter])
+                for iface, rates in net_rates.items()
+            ],
+        )
+
+
+def _procs(out: _Exposition, data: dict):
+    # The top processes change all the time, so they're labelled by their rank, not
+    # by pid, to keep the number of series bounded. Which process has which rank is
+    # in the info metric.
+    procs = data.get("procs") or []
+    labels = [{"rank": k + 1} for k in range(len(procs))]
+    out.add(
+        "tiptop_process",
+        "info",
+        "The top processes",
+        [
+            ({**lab, "name": p["name"], "user": p["username"] or ""}, 1)
+            for lab, p in zip(labels, procs)
+        ],
+    )
+    for key, name, help in [
+        ("cpu_percent", "cpu_percent", "CPU load of the top processes"),
+        ("rss", "resident_memory_bytes", "Resident memory of the top processes"),
+        ("num_threads", "threads", "Threads of the top processes"),
+    ]:
+        out.add(
+            f"tiptop_process_{name}",
+            "gauge",
+            help,
+            [(lab, p[key]) for lab, p in zip(labels, procs)],
+        )
+
+
+def _battery(out: _Exposition, data: dict):
+    bat = data.get("battery")
+    if bat is not None:
+        out.add(
+            "tiptop_battery_percent", "gauge", "Battery charge", [({}, bat["percent"])]
+        )
+        out.add(
+            "tiptop_battery_power_plugged",
+            "gauge",
+            "If the power cable is plugged in",
+            [({}, bat["power_plugged"])],
+        )
+
+
+def format_metrics(data: dict, net_rates: dict, missed_ticks: int = 0) -> str:
+    """The OpenMetrics exposition of `data`, the latest data of a sampler.
+    `net_rates` are the rates of the "net" counters by interface.
+    """
+    out = _Exposition()
+    _info(out, data)
+    _cpu(out, data)
+    _mem(out, data)
+    _disk(out, data)
+    _net(out, data, net_rates)
+    _procs(out, data)
+    _battery(out, data)
+    out.add(
+        "tiptop_missed_ticks",
+        "counter",
+        "Collections that were skipped because the previous one took too long",
+        [({}, missed_ticks)],
+    )
+    return out.text()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _HTTPServer
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.exporter.exposition()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        # Don't write to stderr; that's where the user interface is.
+        pass
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    exporter: MetricsServer
+
+
+class MetricsServer:
+    """Serves the latest data of `sampler` at http://host:port/metrics, from a
+    background thread.
+
+    Scrapes never collect anything. The exposition is built at most once per
+    sampler tick, on the first scrape after new data arrived, so any number of
+    scrapers cost about the same as one.
+    """
+
+    def __init__(self, sampler: Sampler, host: str, port: int):
+        self.sampler = sampler
+        self.lock = threading.Lock()
+        # copies of the latest data, and the exposition of it once it's built
+        self.data: dict = {}
+        self.missed_ticks = 0
+        self.body: bytes | None = None
+        # The net counters are exported as they are, and as rates. The rates are
+        # computed here since they're not in the sampler data.
+        self.last_net: tuple[float, dict] | None = None
+        self.net_rates: dict = {}
+
+        self.httpd = _HTTPServer((host, port), _Handler)
+        self.httpd.exporter = self
+        self._thread: threading.Thread | None = None
+        # Subscribe to everything; the callback runs wherever the sampler notifies.
+        self.sampler.subscribe(self._update, *self.sampler.metrics)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="tiptop-metrics", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _update(self, snapshot: Snapshot):
+        with self.lock:
+            if "net" in snapshot:
+                self._update_net_rates(snapshot["net"], snapshot.times["net"])
+            # a shallow copy, so that the data doesn't change while it's formatted
+            self.data = dict(self.sampler.latest)
+            self.missed_ticks = self.sampler.missed_ticks
+            self.body = None
+
+    def _update_net_rates(self, net: dict, now: float):
+        if self.last_net is not None and now > self.last_net[0]:
+            last_time, last_net = self.last_net
+            self.net_rates = {
+                iface: {
+                    # the counters start over if an interface is created again
+                    key: max(value - last_net[iface][key], 0) / (now - last_time)
+                    for key, value in counters.items()
+                }
+                for iface, counters in net.items()
+                if iface in last_net
+            }
+        self.last_net = (now, net)
+
+    def exposition(self) -> bytes:
+        with self.lock:
+            if self.body is None:
+                self.body = format_metrics(
+                    self.data, self.net_rates, self.missed_ticks
+                ).encode()
+            return self.body
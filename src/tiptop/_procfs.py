@@ -0,0 +1,400 @@
+"""Fast paths for Linux that read /proc directly instead of going through psutil."""
+
+from __future__ import annotations
+
+import heapq
+import os
+import pwd
+import re
+import select
+import time
+from functools import lru_cache
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGESIZE = os.sysconf("SC_PAGESIZE") if hasattr(os, "sysconf") else 4096
+
+# the same status strings as psutil
+# <https://man7.org/linux/man-pages/man5/proc.5.html>
+_status = {
+    "R": "running",
+    "S": "sleeping",
+    "D": "disk-sleep",
+    "T": "stopped",
+    "t": "tracing-stop",
+    "Z": "zombie",
+    "X": "dead",
+    "x": "dead",
+    "K": "wake-kill",
+    "W": "waking",
+    "P": "parked",
+    "I": "idle",
+}
+
+
+def is_available(root: str = "/proc") -> bool:
+    return os.path.isfile(f"{root}/self/stat")
+
+
+def read_file(path: str) -> bytes:
+    # os.read is a lot faster than the buffered open(); most files in /proc are
+    # small, so one read is enough.
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        data = os.read(fd, 65536)
+        if len(data) < 65536:
+            return data
+        chunks = [data]
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+
+def _unescape(string: str) -> str:
+    # spaces etc. in paths are escaped as octal, e.g., \040
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), string)
+
+
+class MountInfo:
+    """The mounted file systems from /proc/self/mountinfo.
+
+    The file is kept open. The kernel signals every change of the mount table with
+    POLLPRI on it, so `changed()` is a cheap check if the file needs to be read
+    again.
+    """
+
+    def __init__(self, root: str = "/proc"):
+        self.fd = os.open(f"{root}/self/mountinfo", os.O_RDONLY)
+        self.poller = select.poll()
+        self.poller.register(self.fd, select.POLLPRI | select.POLLERR)
+
+    def close(self):
+        os.close(self.fd)
+
+    def changed(self) -> bool:
+        """If the mount table changed since the previous call. Doesn't block."""
+        return bool(self.poller.poll(0))
+
+    def read(self) -> list[tuple[str, str, str, str]]:
+        """(device number, mount point, file system type, source) of all mounts, in
+        the order they were mounted.
+        """
+        chunks = []
+        offset = 0
+        while True:
+            chunk = os.pread(self.fd, 65536, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+
+        mounts = []
+        for line in b"".join(chunks).decode(errors="replace").splitlines():
+            # 36 35 98:0 /mnt1 /mnt2 rw,noatime master:1 - ext3 /dev/root rw
+            # The number of optional fields before the "-" varies.
+            fields, _, rest = line.partition(" - ")
+            fields = fields.split()
+            rest = rest.split()
+            if len(fields) < 5 or len(rest) < 2:
+                continue
+            mounts.append(
+                (fields[2], _unescape(fields[4]), rest[0], _unescape(rest[1]))
+            )
+        return mounts
+
+
+# The columns of the cpu lines in /proc/stat. guest and guest_nice are already
+# included in user and nice.
+_cpu_time_fields = [
+    "user",
+    "nice",
+    "system",
+    "idle",
+    "iowait",
+    "irq",
+    "softirq",
+    "steal",
+]
+cpu_breakdown_fields = ["user", "system", "iowait", "irq", "softirq", "steal"]
+
+
+class ProcStatCPUCollector:
+    """The CPU load from one read of /proc/stat: the total, per thread, and the
+    total split up into `cpu_breakdown_fields` (user includes nice). All values are
+    in percent, averaged since the previous call. Like psutil, iowait doesn't count
+    as busy.
+    """
+
+    def __init__(self, root: str = "/proc"):
+        self.path = f"{root}/stat"
+        # the times of the previous call; the total first, then one per thread
+        self.last_times: list[list[int]] = []
+
+    def __call__(self):
+        n = len(_cpu_time_fields)
+        times = []
+        for line in read_file(self.path).split(b"\n"):
+            # the cpu lines come first
+            if not line.startswith(b"cpu"):
+                break
+            values = [int(val) for val in line.split()[1 : n + 1]]
+            # older kernels don't have all columns
+            values += [0] * (n - len(values))
+            times.append(values)
+
+        last_times = self.last_times
+        if len(last_times) != len(times):
+            # first call or CPUs were hotplugged: average since boot
+            last_times = [[0] * n] * len(times)
+        self.last_times = times
+
+        loads = []
+        for values, last in zip(times, last_times):
+            user, nice, system, idle, iowait, irq, softirq, steal = (
+                a - b for a, b in zip(values, last)
+            )
+            total = sum(values) - sum(last)
+            if total <= 0:
+                loads.append((0.0, [0.0] * len(cpu_breakdown_fields)))
+                continue
+            scale = 100.0 / total
+            breakdown = [user + nice, system, iowait, irq, softirq, steal]
+            loads.append(
+                (
+                    (total - idle - iowait) * scale,
+                    [val * scale for val in breakdown],
+                )
+            )
+
+        total, breakdown = loads[0]
+        return {
+            "total": total,
+            "per_thread": [load for load, _ in loads[1:]],
+            "breakdown": dict(zip(cpu_breakdown_fields, breakdown)),
+        }
+
+
+disk_counter_fields = [
+    "reads",
+    "writes",
+    "read_bytes",
+    "write_bytes",
+    "read_ms",
+    "write_ms",
+    "busy_ms",
+    "weighted_ms",
+]
+
+
+class Diskstats:
+    """The IO counters of all disks from one read of /proc/diskstats. Partitions are
+    left out, so every IO is only counted once.
+
+    Returns a dictionary with a tuple of `disk_counter_fields` per device. Times are
+    in milliseconds; "busy" is the time with at least one request in flight,
+    "weighted" is the sum of the times all requests were in flight.
+    """
+
+    # loop devices and RAM disks aren't disks
+    skip_prefixes = ("loop", "ram", "zram")
+
+    def __init__(self, root: str = "/proc", sys_block: str = "/sys/block"):
+        self.path = f"{root}/diskstats"
+        self.sys_block = sys_block
+        # device name -> if it's a disk, i.e., not a partition
+        self.is_disk: dict[str, bool] = {}
+
+    def _is_disk(self, name: str) -> bool:
+        if name.startswith(self.skip_prefixes):
+            return False
+        if not os.path.isdir(self.sys_block):
+            # no sysfs, e.g., in some containers
+            return True
+        # Partitions live in the directory of their disk, e.g., /sys/block/sda/sda1.
+        # A "/" in device names (cciss/c0d0) is a "!" in sysfs.
+        return os.path.exists(f"{self.sys_block}/{name.replace('/', '!')}")
+
+    def __call__(self) -> dict[str, tuple[int, ...]]:
+        out = {}
+        for line in read_file(self.path).split(b"\n"):
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            name = fields[2].decode()
+            is_disk = self.is_disk.get(name)
+            if is_disk is None:
+                is_disk = self.is_disk[name] = self._is_disk(name)
+            if not is_disk:
+                continue
+            # <https://www.kernel.org/doc/Documentation/ABI/testing/procfs-diskstats>
+            # Sectors are always 512 bytes here.
+            out[name] = (
+                int(fields[3]),
+                int(fields[7]),
+                int(fields[5]) * 512,
+                int(fields[9]) * 512,
+                int(fields[6]),
+                int(fields[10]),
+                int(fields[12]),
+                int(fields[13]),
+            )
+        return out
+
+
+# the fields of /proc/net/dev in the order of _sysfs.NetStatsCollector.counters
+_net_dev_fields = (0, 8, 1, 9, 2, 10, 3, 11)
+
+
+def read_net_dev(path: str = "/proc/net/dev") -> dict[str, list[int]]:
+    """The counters of all network interfaces, like _sysfs.NetStatsCollector."""
+    out = {}
+    # two header lines
+    for line in read_file(path).split(b"\n")[2:]:
+        name, _, rest = line.rpartition(b":")
+        fields = rest.split()
+        if len(fields) < 16:
+            continue
+        out[name.strip().decode()] = [int(fields[k]) for k in _net_dev_fields]
+    return out
+
+
+@lru_cache(maxsize=1024)
+def _username(uid: int) -> str:
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        # no user with this uid, e.g., in a container
+        return str(uid)
+
+
+class ProcfsProcessCollector:
+    """The top processes by CPU load, read from /proc.
+
+    Returns the same data as ProcessCollector, but only reads /proc/<pid>/stat for
+    every process. The CPU load is computed from the difference of the CPU times to
+    the previous call. For the top `max_num_procs` processes, cmdline and status are
+    read once and cached per (pid, start time).
+    """
+
+    def __init__(self, max_num_procs: int = 100, root: str = "/proc"):
+        # set by the process list according to its height
+        self.max_num_procs = max_num_procs
+        self.root = root
+        # pid -> (start time, cpu time in clock ticks) of the previous call
+        self.cpu_times: dict[int, tuple[int, int]] = {}
+        self.last_time: float | None = None
+        # pid -> (start time, static attributes)
+        self.static_cache: dict[int, tuple[int, dict]] = {}
+
+    def __call__(self):
+        root = self.root
+        now = time.monotonic()
+        # CPU time is measured in clock ticks; convert to percent of one CPU
+        scale = (
+            0.0 if self.last_time is None else 100.0 / (now - self.last_time) / CLK_TCK
+        )
+        prev_cpu_times = self.cpu_times
+        cpu_times = {}
+
+        # First pass: /proc/<pid>/stat for all processes
+        loads = []
+        with os.scandir(root) as it:
+            for entry in it:
+                name = entry.name
+                if not name.isdigit():
+                    continue
+                try:
+                    data = read_file(f"{root}/{name}/stat")
+                except OSError:
+                    # the process has exited in the meantime
+                    continue
+                # The process name is in parentheses and can contain spaces and
+                # parentheses itself, so split after the last one.
+                rpar = data.rfind(b")")
+                fields = data[rpar + 2 :].split()
+                pid = int(name)
+                # utime + stime
+                cpu_time = int(fields[11]) + int(fields[12])
+                start_time = int(fields[19])
+                cpu_times[pid] = (start_time, cpu_time)
+
+                prev = prev_cpu_times.get(pid)
+                if prev is None or prev[0] != start_time:
+                    # a new process; psutil returns 0.0 here, too
+                    cpu_percent = 0.0
+                else:
+                    cpu_percent = (cpu_time - prev[1]) * scale
+                loads.append((cpu_percent, pid, data, rpar, fields))
+
+        self.cpu_times = cpu_times
+        self.last_time = now
+
+        # evict the processes that have exited
+        for pid in self.static_cache.keys() - cpu_times.keys():
+            del self.static_cache[pid]
+
+        top = heapq.nlargest(self.max_num_procs, loads, key=lambda item: item[0])
+
+        # Second pass: cmdline and user of the top processes, if not cached yet
+        processes = []
+        for cpu_percent, pid, data, rpar, fields in top:
+            start_time = cpu_times[pid][0]
+            cached = self.static_cache.get(pid)
+            if cached is not None and cached[0] == start_time:
+                static = cached[1]
+            else:
+                comm = data[data.find(b"(") + 1 : rpar].decode(errors="replace")
+                static = self._static_attrs(pid, comm)
+                if static is None:
+                    continue
+                self.static_cache[pid] = (start_time, static)
+
+            processes.append(
+                {
+                    "pid": pid,
+                    **static,
+                    "cpu_percent": cpu_percent,
+                    "num_threads": int(fields[17]),
+                    "rss": int(fields[21]) * PAGESIZE,
+                    "status": _status.get(fields[0].decode(), "?"),
+                }
+            )
+        return processes
+
+    def _static_attrs(self, pid: int, comm: str) -> dict | None:
+        root = self.root
+        try:
+            data = read_file(f"{root}/{pid}/cmdline")
+        except PermissionError:
+            cmdline = None
+        except OSError:
+            return None
+        else:
+            # arguments are separated by and end with a null byte
+            cmdline = data.decode(errors="replace").split("\0")
+            if cmdline[-1] == "":
+                cmdline = cmdline[:-1]
+
+        try:
+            status = read_file(f"{root}/{pid}/status")
+        except PermissionError:
+            username = None
+        except OSError:
+            return None
+        else:
+            # the real uid is the first one
+            k = status.find(b"\nUid:")
+            username = _username(int(status[k + 5 :].split(maxsplit=1)[0]))
+
+        # The name in stat is truncated to 15 characters. Like psutil, take the
+        # full name from the cmdline if it matches.
+        name = comm
+        if len(comm) >= 15 and cmdline:
+            exe = os.path.basename(cmdline[0])
+            if exe.startswith(comm):
+                name = exe
+
+        return {"name": name, "username": username, "cmdline": cmdline}
@@ -1,4 +1,3 @@
-import psutil
 from rich import box
 from rich.panel import Panel
 from rich.table import Table
@@ -6,53 +5,17 @@ from rich.text import Text
 from textual.widget import Widget
 
 from ._helpers import sizeof_fmt
-
-
-def get_process_list(num_procs: int):
-    processes = list(
-        psutil.process_iter(
-            [
-                "pid",
-                "name",
-                "username",
-                "cmdline",
-                "cpu_percent",
-                "num_threads",
-                "memory_info",
-                "status",
-            ]
-        )
-    )
-
-    if processes[0].pid == 0:
-        # Remove process with PID 0. On Windows, that's SYSTEM IDLE, and we
-        # don't want that to appear at the top of the list.
-        # <https://twitter.com/andre_roberge/status/1488885893716975622/photo/1>
-        processes = processes[1:]
-
-    processes = [p.info for p in processes]
-
-    processes = sorted(
-        processes,
-        # The item.info["cpu_percent"] can be `ad_value` (default None).
-        # It gets assigned to a dict key in case AccessDenied or
-        # ZombieProcess exception is raised when retrieving that particular
-        # process information.
-        key=lambda p: (p["cpu_percent"] or 0.0),
-        reverse=True,
-    )
-    processes = processes[:num_procs]
-    return processes
+from ._sampler import Sampler
 
 
 class ProcsList(Widget):
-    def on_mount(self):
-        self.max_num_procs = 100
-        self.collect_data()
-        self.set_interval(6.0, self.collect_data)
+    def __init__(self, sampler: Sampler):
+        super().__init__()
+        self.sampler = sampler
+        self.sampler.subscribe(self.collect_data, "procs")
 
-    def collect_data(self):
-        processes = get_process_list(self.max_num_procs)
+    def collect_data(self, snapshot: dict):
+        processes = snapshot["procs"]
 
         table = Table(
             show_header=True,
@@ -101,10 +64,8 @@ class ProcsList(Widget):
             if username is None:
                 username = ""
             #
-            mem_info = p["memory_info"]
-            mem_info = (
-                "" if mem_info is None else sizeof_fmt(mem_info.rss, suffix="", sep="")
-            )
+            rss = p["rss"]
+            mem_info = "" if rss is None else sizeof_fmt(rss, suffix="", sep="")
             #
             cpu_percent = p["cpu_percent"]
             cpu_percent = "" if cpu_percent is None else f"{cpu_percent:.1f}"
@@ -130,4 +91,7 @@ class ProcsList(Widget):
         return self.panel
 
     async def on_resize(self, event):
-        self.max_num_procs = event.height - 3
+        collector = self.sampler.collector("procs")
+        # not when replaying; recordings have a fixed number of processes
+        if hasattr(collector, "max_num_procs"):
+            collector.max_num_procs = event.height - 3
@@ -0,0 +1,534 @@
+"""Recording of samples into a compact binary file.
+
+The file starts with a header: the magic bytes, the length of the JSON description,
+and the JSON description itself, padded to a multiple of 8 bytes. The description
+holds the size of the records and the names of the metrics. It is followed by
+records of a fixed size. Every record starts with
+
+- the time (float64, seconds since the epoch, but monotonic),
+- the kind (uint8): a sample, the rest of a sample, or a piece of the string table,
+- the number of used bytes (uint16, for pieces of the string table),
+- the index of the latest string table record before it (uint32).
+
+A sample holds one column per number. Strings are stored once in the string table,
+and the samples only hold their offset in it. That's also where the shape of a
+sample is, i.e., its columns as JSON, and a sample starts with its offset. The shape
+changes when the metrics do, e.g., when a disk is added. Samples that don't fit into
+one record go on in the next ones. New strings are written as
+string table records right before the first sample that uses them. Since every
+record knows where the latest string table record is, the string table can be
+collected without reading all records. The string table starts over when it gets too
+large; the first record of a new table points to no previous one.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from typing import Any
+
+from ._sampler import Sampler
+
+MAGIC = b"TIPTOP\x02\n"
+_header_length = struct.Struct("<I")
+# time, kind, number of used bytes, index of the latest string table record
+_record_header = struct.Struct("<dBxHI")
+
+SAMPLE = 0
+STRINGS = 1
+MORE = 2
+# no string table record yet, no string, no int
+NONE_INDEX = 0xFFFFFFFF
+_none_int = -(2**63)
+
+# The smallest record size, such that the string table doesn't get too fragmented
+_min_payload = 240
+
+
+def _merge(a, b):
+    # the shape that can hold the values of both shapes
+    if a is None:
+        return b
+    if b is None or a == b:
+        return a
+    if isinstance(a, str) and isinstance(b, str):
+        # an int and a float
+        return "f" if {a, b} == {"q", "f"} else a
+    if isinstance(a, str) or isinstance(b, str):
+        return a
+    if "dict" in a and "dict" in b:
+        items = dict(a["dict"])
+        for key, shape in b["dict"]:
+            items[key] = _merge(items.get(key), shape)
+        return {"dict": [[key, shape] for key, shape in items.items()]}
+    if "tuple" in a and "tuple" in b and len(a["tuple"]) == len(b["tuple"]):
+        return {"tuple": [_merge(x, y) for x, y in zip(a["tuple"], b["tuple"])]}
+    if "list" in a and "list" in b:
+        return {"list": _merge(a["list"], b["list"]), "n": max(a["n"], b["n"])}
+    # incompatible; the values from now on matter more
+    return b
+
+
+def shape_of(value: Any, capacities: dict[str, int] | None = None, name: str = ""):
+    """The shape of `value`, which determines the columns of the records.
+
+    Numbers, strings, and lists of strings are one column each. Dictionaries and
+    tuples have the columns of their items. Lists have a count and a fixed number of
+    items of the same shape: as many as in `value`, or `capacities[name]` for the
+    top-level metric `name`.
+    """
+    if value is None:
+        # most likely a number that isn't available right now
+        return None
+    if isinstance(value, bool):
+        return "b"
+    if isinstance(value, int):
+        return "q"
+    if isinstance(value, float):
+        return "f"
+    if isinstance(value, str):
+        return "s"
+    if isinstance(value, dict):
+        return {"dict": [[key, shape_of(val)] for key, val in value.items()]}
+    if isinstance(value, tuple):
+        return {"tuple": [shape_of(val) for val in value]}
+    if isinstance(value, list):
+        if all(isinstance(val, str) for val in value):
+            return "S"
+        item = None
+        for val in value:
+            item = _merge(item, shape_of(val))
+        n = len(value)
+        if capacities is not None and name in capacities:
+            n = capacities[name]
+        return {"list": item, "n": n}
+    raise TypeError(f"Can't record {value!r}")
+
+
+def _format(shape) -> str:
+    if shape is None or shape == "f":
+        return "f"
+    if shape == "q":
+        return "q"
+    if shape == "b":
+        return "b"
+    if shape in ("s", "S"):
+        return "I"
+    if "dict" in shape:
+        return "".join(_format(s) for _, s in shape["dict"])
+    if "tuple" in shape:
+        return "".join(_format(s) for s in shape["tuple"])
+    return "H" + _format(shape["list"]) * shape["n"]
+
+
+def _flatten(shape, value, out: list, intern):
+    # Values that don't fit the shape are left out, e.g., a metric that was None
+    # in the first sample.
+    if shape is None or shape == "f":
+        out.append(value if isinstance(value, (int, float)) else math.nan)
+    elif shape in ("q", "b"):
+        if isinstance(value, (int, float)) and math.isfinite(value):
+            out.append(int(value))
+        else:
+            out.append(_none_int if shape == "q" else -1)
+    elif shape == "s":
+        out.append(intern(value) if isinstance(value, str) else NONE_INDEX)
+    elif shape == "S":
+        out.append(NONE_INDEX if value is None else intern("\0".join(value)))
+    elif "dict" in shape:
+        if not isinstance(value, dict):
+            value = {}
+        for key, s in shape["dict"]:
+            _flatten(s, value.get(key), out, intern)
+    elif "tuple" in shape:
+        if not isinstance(value, (tuple, list)):
+            value = ()
+        for k, s in enumerate(shape["tuple"]):
+            _flatten(s, value[k] if k < len(value) else None, out, intern)
+    else:
+        items = value[: shape["n"]] if isinstance(value, list) else []
+        out.append(len(items))
+        for item in items:
+            _flatten(shape["list"], item, out, intern)
+        for _ in range(shape["n"] - len(items)):
+            _flatten(shape["list"], None, out, intern)
+
+
+def _unflatten(shape, values, strings):
+    # `values` is an iterator over the values of a record
+    if shape is None or shape == "f":
+        val = next(values)
+        return None if math.isnan(val) else val
+    if shape == "q":
+        val = next(values)
+        return None if val == _none_int else val
+    if shape == "b":
+        val = next(values)
+        return None if val == -1 else bool(val)
+    if shape == "s":
+        val = next(values)
+        return None if val == NONE_INDEX else strings(val)
+    if shape == "S":
+        val = next(values)
+        if val == NONE_INDEX:
+            return None
+        string = strings(val)
+        return string.split("\0") if string else []
+    if "dict" in shape:
+        return {key: _unflatten(s, values, strings) for key, s in shape["dict"]}
+    if "tuple" in shape:
+        return tuple(_unflatten(s, values, strings) for s in shape["tuple"])
+    n = next(values)
+    items = [_unflatten(shape["list"], values, strings) for _ in range(shape["n"])]
+    return items[:n]
+
+
+def _struct(shape) -> struct.Struct:
+    # the offset of the shape in the string table, and the columns
+    return struct.Struct("<I" + _format(shape))
+
+
+class Recorder:
+    """Writes samples, i.e., dictionaries of metrics, to a new file at `path`.
+
+    The columns follow the samples, see `shape_of()`: if a sample doesn't fit the
+    columns so far, e.g., a metric that was None before or a new disk, they're
+    merged with the ones of the sample. Lists of the top-level metrics in
+    `capacities` are cut, e.g., process lists.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        info: dict | None = None,
+        capacities: dict[str, int] | None = None,
+        max_string_table_size: int = 2**20,
+    ):
+        # don't overwrite existing recordings
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        # extra information for the header, e.g., the number of CPU cores
+        self.info = {} if info is None else info
+        self.capacities = {} if capacities is None else capacities
+        self.shape = None
+        self.shape_json = ""
+        self.struct = None
+        self.record_size = 0
+        self.num_records = 0
+
+        # string -> offset in the string table, and the strings that haven't been
+        # written yet
+        self.string_ids: dict[str, int] = {}
+        self.string_table_size = 0
+        self.pending_strings: list[bytes] = []
+        self.last_strings_record = NONE_INDEX
+        # New process names and command lines keep coming in a long recording, so
+        # the string table starts over once it's larger than this.
+        self.max_string_table_size = max_string_table_size
+
+        # monotonic times, but on the scale of time.time()
+        self.time_offset = time.time() - time.monotonic()
+
+    def close(self):
+        os.close(self.fd)
+
+    def _write_header(self, sample: dict):
+        # most samples fit into one record
+        self.record_size = _record_header.size + max(self.struct.size, _min_payload)
+        # align the records to 8 bytes
+        self.record_size = -(-self.record_size // 8) * 8
+
+        description = json.dumps(
+            {
+                "record_size": self.record_size,
+                "metrics": list(sample),
+                "info": self.info,
+            }
+        ).encode()
+        header = MAGIC + _header_length.pack(len(description)) + description
+        header += b"\0" * (-len(header) % 8)
+        os.write(self.fd, header)
+
+    def _intern(self, string: str) -> int:
+        idx = self.string_ids.get(string)
+        if idx is None:
+            data = string.encode(errors="replace")
+            entry = _header_length.pack(len(data)) + data
+            idx = self.string_table_size
+            self.string_ids[string] = idx
+            self.string_table_size += len(entry)
+            self.pending_strings.append(entry)
+        return idx
+
+    def write(self, sample: dict, monotonic_time: float | None = None):
+        """Append a sample. It's written with one write(), so a crash never leaves
+        more than one broken record at the end of the file.
+        """
+        if monotonic_time is None:
+            monotonic_time = time.monotonic()
+        t = self.time_offset + monotonic_time
+        if self.string_table_size > self.max_string_table_size:
+            # The samples only point to the latest string table record, so the
+            # strings of this one can go into a new table. The columns of disks
+            # etc. that are gone are dropped, too.
+            self.string_ids = {}
+            self.string_table_size = 0
+            self.last_strings_record = NONE_INDEX
+            self.shape = None
+
+        shape = {
+            "dict": [
+                [name, shape_of(val, self.capacities, name)]
+                for name, val in sample.items()
+            ]
+        }
+        if self.shape is not None:
+            shape = _merge(self.shape, shape)
+        if shape != self.shape:
+            self.shape = shape
+            self.shape_json = json.dumps(shape)
+            self.struct = _struct(shape)
+        if self.record_size == 0:
+            self._write_header(sample)
+
+        values: list = [self._intern(self.shape_json)]
+        _flatten(self.shape, sample, values, self._intern)
+
+        records = []
+        payload_size = self.record_size - _record_header.size
+        if self.pending_strings:
+            data = b"".join(self.pending_strings)
+            self.pending_strings = []
+            for k in range(0, len(data), payload_size):
+                chunk = data[k : k + payload_size]
+                records.append(
+                    _record_header.pack(
+                        t, STRINGS, len(chunk), self.last_strings_record
+                    )
+                    + chunk.ljust(payload_size, b"\0")
+                )
+                self.last_strings_record = self.num_records
+                self.num_records += 1
+
+        data = self.struct.pack(*values)
+        for k in range(0, len(data), payload_size):
+            chunk = data[k : k + payload_size]
+            records.append(
+                _record_header.pack(
+                    t, SAMPLE if k == 0 else MORE, 0, self.last_strings_record
+                )
+                + chunk.ljust(payload_size, b"\0")
+            )
+            self.num_records += 1
+        os.write(self.fd, b"".join(records))
+
+
+def read_header(data: bytes) -> tuple[dict, int]:
+    """The description from the header, and the offset of the first record."""
+    start = len(MAGIC) + _header_length.size
+    if len(data) < start or data[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a tiptop recording")
+    (length,) = _header_length.unpack_from(data, len(MAGIC))
+    if len(data) < start + length:
+        # cut off in the header
+        raise ValueError("Not a tiptop recording")
+    try:
+        description = json.loads(data[start : start + length])
+    except ValueError:
+        raise ValueError("Not a tiptop recording") from None
+    offset = start + length
+    offset += -offset % 8
+    return description, offset
+
+
+class _Times:
+    # The record times as a sequence, for bisect. They never go down, since string
+    # table records have the time of the sample they precede.
+    def __init__(self, recording: Recording):
+        self.recording = recording
+
+    def __len__(self):
+        return self.recording.num_records
+
+    def __getitem__(self, k: int) -> float:
+        return self.recording.time(k)
+
+
+class Recording:
+    """A recording at `path`, memory-mapped. Nothing is parsed up front: samples are
+    found by a binary search over the record times, and only the string table
+    records that a sample needs are read.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            try:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                raise ValueError("Not a tiptop recording") from None
+        description, self.offset = read_header(self.mmap)
+        self.record_size = description["record_size"]
+        self.payload_size = self.record_size - _record_header.size
+        self.metrics = description["metrics"]
+        self.info = description["info"]
+        # a broken record at the end is left out
+        self.num_records = (len(self.mmap) - self.offset) // self.record_size
+        # shape as JSON -> (shape, struct)
+        self.shapes: dict[str, tuple[Any, struct.Struct]] = {}
+
+        # the string table from its first record `strings_start` up to and including
+        # the record `strings_until`
+        self.string_table = bytearray()
+        self.strings_start = 0
+        self.strings_until = -1
+
+        self.last = self.prev_sample(self.num_records - 1)
+        if (
+            self.last is not None
+            and self.last + self._size(self.last) > self.num_records
+        ):
+            # so is a sample that was cut short
+            self.num_records = self.last
+            self.last = self.prev_sample(self.last - 1)
+        if self.last is None:
+            raise ValueError("The recording has no samples")
+        self.first = self.next_sample(0)
+
+    def close(self):
+        self.mmap.close()
+
+    def _header(self, k: int) -> tuple[float, int, int, int]:
+        return _record_header.unpack_from(self.mmap, self.offset + k * self.record_size)
+
+    def time(self, k: int) -> float:
+        return self._header(k)[0]
+
+    def next_sample(self, k: int) -> int | None:
+        """The index of the first sample record at or after `k`."""
+        while k < self.num_records:
+            if self._header(k)[1] == SAMPLE:
+                return k
+            k += 1
+        return None
+
+    def prev_sample(self, k: int) -> int | None:
+        """The index of the last sample record at or before `k`."""
+        while k >= 0:
+            if self._header(k)[1] == SAMPLE:
+                return k
+            k -= 1
+        return None
+
+    def find(self, t: float) -> int:
+        """The index of the first sample at or after the time `t`, or the last
+        sample if there is none.
+        """
+        k = bisect.bisect_left(_Times(self), t, 0, self.num_records)
+        out = self.next_sample(k)
+        return self.last if out is None else out
+
+    def _load_strings(self, last: int):
+        # The string table records are chained backwards. Collect the ones that
+        # aren't loaded yet and append them in order. A table only has the records
+        # between its first and last one, so if the chain goes back to its start
+        # without reaching the loaded ones, it's another table.
+        if self.strings_start <= last <= self.strings_until:
+            return
+        chain = []
+        k = last
+        while k != NONE_INDEX and not self.strings_start <= k <= self.strings_until:
+            chain.append(k)
+            k = self._header(k)[3]
+        if k == NONE_INDEX:
+            self.string_table = bytearray()
+            self.strings_start = chain[-1]
+        for k in reversed(chain):
+            start = self.offset + k * self.record_size + _record_header.size
+            used = self._header(k)[2]
+            self.string_table += self.mmap[start : start + used]
+        self.strings_until = last
+
+    def _string(self, idx: int) -> str:
+        (length,) = _header_length.unpack_from(self.string_table, idx)
+        start = idx + _header_length.size
+        return self.string_table[start : start + length].decode()
+
+    def _shape(self, k: int) -> tuple[Any, struct.Struct]:
+        # the shape of the sample record `k`
+        _, kind, _, last_strings = self._header(k)
+        assert kind == SAMPLE
+        self._load_strings(last_strings)
+        start = self.offset + k * self.record_size + _record_header.size
+        (idx,) = _header_length.unpack_from(self.mmap, start)
+        string = self._string(idx)
+        if string not in self.shapes:
+            shape = json.loads(string)
+            self.shapes[string] = (shape, _struct(shape))
+        return self.shapes[string]
+
+    def _size(self, k: int) -> int:
+        # the number of records of the sample record `k`
+        return -(-self._shape(k)[1].size // self.payload_size)
+
+    def sample(self, k: int) -> tuple[float, dict]:
+        """The time and the sample of the sample record `k`."""
+        shape, sample_struct = self._shape(k)
+        data = b"".join(
+            self.mmap[start : start + self.payload_size]
+            for start in (
+                self.offset + j * self.record_size + _record_header.size
+                for j in range(k, k + self._size(k))
+            )
+        )
+        values = iter(sample_struct.unpack_from(data))
+        # the offset of the shape
+        next(values)
+        return self.time(k), _unflatten(shape, values, self._string)
+
+
+def read(path: str):
+    """All (time, sample) pairs of the recording at `path`, in order."""
+    recording = Recording(path)
+    try:
+        k = recording.first
+        while k is not None:
+            yield recording.sample(k)
+            k = recording.next_sample(k + 1)
+    finally:
+        recording.close()
+
+
+def record(sampler: Sampler, path: str, every: float = 2.0, max_num_procs: int = 20):
+    """Record all metrics of `sampler` to `path` every `every` seconds, without a
+    user interface, until interrupted. Only the top `max_num_procs` processes are
+    recorded.
+    """
+    if "procs" in sampler.metrics:
+        sampler.collector("procs").max_num_procs = max_num_procs
+    recorder = Recorder(path, {"every": every}, capacities={"procs": max_num_procs})
+    # Rates need two collections, so the first sample is written after one period.
+    warmup_ticks = max(round(every / sampler.interval), 1)
+    last_write = None
+    next_time = time.monotonic()
+    try:
+        while True:
+            sampler.tick()
+            now = time.monotonic()
+            if sampler.num_ticks > warmup_ticks and (
+                last_write is None or now - last_write > every - sampler.interval / 2
+            ):
+                # the time is in the record header
+                sample = {k: v for k, v in sampler.latest.items() if k != "time"}
+                recorder.write(sample, now)
+                last_write = now
+            next_time = max(next_time + sampler.interval, time.monotonic())
+            time.sleep(max(next_time - time.monotonic(), 0.0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
@@ -0,0 +1,361 @@
+"""Remote monitoring: an agent streams the data of its sampler over a TCP or Unix
+socket, and viewers show it.
+
+Every frame is a 4-byte length followed by JSON. A frame holds patches against the
+data that was sent before, so metrics and process rows that didn't change aren't
+sent again. A patch is one of
+
+- `["."]`: unchanged,
+- `["=", value]`: a new value,
+- `["{", {key: patch}, [removed keys]]`: a dictionary with changed items,
+- `["#", {pid: patch}, [pids]]`: a list of processes with changed rows, and the new
+  order of all rows.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import queue
+import socket
+import stat
+import struct
+import threading
+from functools import partial
+from math import inf
+from typing import Any, BinaryIO, Callable
+
+from ._sampler import Sampler, Snapshot
+
+DEFAULT_PORT = 9179
+
+_length = struct.Struct("<I")
+SAME = ["."]
+
+
+def _is_rows(value: Any) -> bool:
+    # process lists
+    return (
+        isinstance(value, list)
+        and len(value) > 0
+        and all(isinstance(row, dict) and "pid" in row for row in value)
+    )
+
+
+def delta(old: Any, new: Any) -> list:
+    """The patch that turns `old` into `new`."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = {}
+        for key, value in new.items():
+            patch = delta(old[key], value) if key in old else ["=", value]
+            if patch != SAME:
+                changes[key] = patch
+        removed = [key for key in old if key not in new]
+        if not changes and not removed:
+            return SAME
+        return ["{", changes, removed]
+
+    if _is_rows(old) and _is_rows(new):
+        old_rows = {row["pid"]: row for row in old}
+        changes = {}
+        for row in new:
+            old_row = old_rows.get(row["pid"])
+            patch = ["=", row] if old_row is None else delta(old_row, row)
+            if patch != SAME:
+                # JSON keys are strings
+                changes[str(row["pid"])] = patch
+        order = [row["pid"] for row in new]
+        if not changes and order == [row["pid"] for row in old]:
+            return SAME
+        return ["#", changes, order]
+
+    return SAME if old == new else ["=", new]
+
+
+def apply(old: Any, patch: list) -> Any:
+    """`old` with `patch` applied. `old` isn't changed."""
+    op = patch[0]
+    if op == ".":
+        return old
+    if op == "=":
+        return patch[1]
+    if op == "{":
+        out = dict(old)
+        for key, p in patch[1].items():
+            out[key] = apply(old.get(key), p)
+        for key in patch[2]:
+            del out[key]
+        return out
+    # "#"
+    rows = {row["pid"]: row for row in old}
+    changes = patch[1]
+    return [
+        apply(rows.get(pid), changes[str(pid)]) if str(pid) in changes else rows[pid]
+        for pid in patch[2]
+    ]
+
+
+def parse_address(address: str) -> tuple[int, Any]:
+    """The socket family and address of "host[:port]", "[ipv6][:port]", or the path
+    of a Unix socket.
+    """
+    if "/" in address:
+        return socket.AF_UNIX, address
+    host, port = address, DEFAULT_PORT
+    if address.startswith("["):
+        host, _, rest = address[1:].partition("]")
+        if rest:
+            port = int(rest.lstrip(":"))
+        return socket.AF_INET6, (host, port, 0, 0)
+    if ":" in address:
+        host, port_string = address.rsplit(":", 1)
+        port = int(port_string)
+    return socket.AF_INET, (host, port)
+
+
+def read_frame(f: BinaryIO) -> dict | None:
+    """The next frame, or None if the connection was closed."""
+    header = f.read(_length.size)
+    if len(header) < _length.size:
+        return None
+    (length,) = _length.unpack(header)
+    data = f.read(length)
+    if len(data) < length:
+        return None
+    return json.loads(data)
+
+
+class _Viewer:
+    """A viewer of an agent. A thread sends the queued frames, so that the agent
+    never waits for the network.
+    """
+
+    def __init__(self, sock: socket.socket, max_queued: int):
+        self.sock = sock
+        self.queue: queue.Queue[bytes | None] = queue.Queue(max_queued)
+        self.closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="tiptop-agent-viewer", daemon=True
+        )
+        self._thread.start()
+
+    def send(self, data: bytes) -> bool:
+        """Queue `data`. False if the viewer is gone, or if it's dropped now because
+        its queue is full.
+        """
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        self.closed = True
+        # wakes up the thread if it's blocked in sendall()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            # the thread isn't waiting for frames, and the next send fails
+            pass
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            if data is None or self.closed:
+                break
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                break
+        self.closed = True
+        self.sock.close()
+
+
+def _encode(frame: dict) -> bytes:
+    data = json.dumps(frame, separators=(",", ":")).encode()
+    return _length.pack(len(data)) + data
+
+
+class Agent:
+    """Streams the data of `sampler` to every viewer that connects to `address`.
+
+    Pass the snapshots of the sampler to `broadcast()`. New viewers get all data
+    with the next snapshot, and after that only the patches. The patches are the
+    same for all viewers, so they're encoded once per snapshot. Every viewer has its
+    own thread that sends the frames, and a viewer that falls more than `max_queued`
+    frames behind is dropped, so that a slow viewer can't stall the sampler.
+    """
+
+    def __init__(self, sampler: Sampler, address: str, max_queued: int = 10):
+        self.sampler = sampler
+        self.max_queued = max_queued
+        family, addr = parse_address(address)
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_UNIX:
+            # the socket of an agent that wasn't stopped cleanly; other files stay
+            try:
+                if stat.S_ISSOCK(os.stat(addr).st_mode):
+                    os.unlink(addr)
+            except FileNotFoundError:
+                pass
+        else:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(addr)
+        self.unix_path = addr if family == socket.AF_UNIX else None
+        self.server.listen()
+
+        # the data that was sent to the viewers
+        self.data: dict[str, Any] = {}
+        self.times: dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.viewers: list[_Viewer] = []
+        # connected, but they didn't get any data yet
+        self.new_viewers: list[socket.socket] = []
+        self._thread: threading.Thread | None = None
+
+    @property
+    def address(self):
+        return self.server.getsockname()
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._accept, name="tiptop-agent", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self.server.close()
+        if self.unix_path is not None:
+            try:
+                os.unlink(self.unix_path)
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            for viewer in self.viewers:
+                viewer.close()
+            for sock in self.new_viewers:
+                sock.close()
+            self.viewers = []
+            self.new_viewers = []
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                # closed
+                return
+            with self.lock:
+                self.new_viewers.append(sock)
+
+    def broadcast(self, snapshot: Snapshot):
+        frame = {
+            "data": {
+                name: (
+                    delta(self.data[name], value) if name in self.data else ["=", value]
+                )
+                for name, value in snapshot.items()
+            },
+            "times": snapshot.times,
+            "missed_ticks": snapshot.missed_ticks,
+        }
+        self.data.update(snapshot)
+        self.times.update(snapshot.times)
+
+        with self.lock:
+            data = _encode(frame)
+            self.viewers = [viewer for viewer in self.viewers if viewer.send(data)]
+            if self.new_viewers:
+                cadences = {
+                    name: self.sampler.cadence(name) for name in self.sampler.metrics
+                }
+                full_frame = {
+                    "data": {name: ["=", value] for name, value in self.data.items()},
+                    "times": self.times,
+                    "missed_ticks": self.sampler.missed_ticks,
+                    # None for metrics that are collected only once
+                    "cadences": {
+                        name: None if cadence == inf else cadence
+                        for name, cadence in cadences.items()
+                    },
+                }
+                data = _encode(full_frame)
+                for sock in self.new_viewers:
+                    viewer = _Viewer(sock, self.max_queued)
+                    if viewer.send(data):
+                        self.viewers.append(viewer)
+                self.new_viewers = []
+
+
+class Connection:
+    """A connection to an agent, in place of a SamplerThread.
+
+    `sampler` has the metrics of the agent, so the widgets subscribe to it as usual.
+    The first frame with all data is read right away. After `start()`, every frame is
+    passed to the callback as a Snapshot with the full values of the metrics it
+    contains, and the collection times on the agent.
+    """
+
+    def __init__(self, address: str, timeout: float = 10.0):
+        family, addr = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(addr)
+        self.file = self.sock.makefile("rb")
+        frame = read_frame(self.file)
+        if frame is None:
+            raise ConnectionError("The agent closed the connection")
+        # frames can be far apart
+        self.sock.settimeout(None)
+        self.data: dict[str, Any] = {}
+        self.first = self._apply(frame)
+
+        # with the cadences on the agent, e.g., for the time axis of the history
+        cadences = frame.get("cadences", {})
+        self.sampler = Sampler()
+        for name in self.data:
+            self.sampler.add_metric(
+                name, partial(self.data.get, name), every=cadences.get(name, 1.0)
+            )
+        self._thread: threading.Thread | None = None
+
+    def _apply(self, frame: dict) -> Snapshot:
+        for name, patch in frame["data"].items():
+            self.data[name] = apply(self.data.get(name), patch)
+        return Snapshot(
+            {name: self.data[name] for name in frame["data"]},
+            frame["times"],
+            frame["missed_ticks"],
+        )
+
+    def start(self, callback: Callable[[Snapshot], Any]):
+        self._thread = threading.Thread(
+            target=self._run, args=(callback,), name="tiptop-connect", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _run(self, callback: Callable[[Snapshot], Any]):
+        callback(self.first)
+        while True:
+            try:
+                frame = read_frame(self.file)
+            except (OSError, ValueError):
+                # stopped
+                return
+            if frame is None:
+                return
+            callback(self._apply(frame))
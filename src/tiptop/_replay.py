@@ -0,0 +1,137 @@
+"""Playback of recordings, see _recording.py."""
+
+from __future__ import annotations
+
+import threading
+import time
+from functools import partial
+from typing import Any, Callable
+
+from ._recording import Recording
+from ._sampler import Sampler, Snapshot
+
+
+class Player:
+    """Plays a recording back in place of a SamplerThread.
+
+    `sampler` has the recorded metrics, so the widgets subscribe to it as usual. The
+    samples are passed to the callback of `start()` with the recorded times, so the
+    rates are the same as they were live. Besides the recorded metrics, there is
+    "replay" with the playback state.
+
+    Playback starts at the time `start`, or at the beginning. Long gaps in the
+    recording, e.g., while the machine was down, are skipped.
+    """
+
+    def __init__(
+        self, recording: Recording, speed: float = 1.0, start: float | None = None
+    ):
+        self.recording = recording
+        self.speed = speed
+        self.paused = False
+        # the recording interval
+        self.every = recording.info.get("every", 2.0)
+        # gaps longer than this take one interval in playback
+        self.max_gap = 10 * self.every
+
+        self.index = recording.first if start is None else recording.find(start)
+        self.t, self.sample = recording.sample(self.index)
+        # the monotonic time at which the current sample was shown
+        self.shown_at = time.monotonic()
+        # set by seek(), shown next
+        self._seek_index: int | None = None
+
+        self.sampler = Sampler(interval=self.every)
+        for name in recording.metrics:
+            self.sampler.add_metric(name, partial(self._value, name), self.every)
+        self.sampler.add_metric("time", partial(self._value, "time"), self.every)
+        self.sampler.add_metric("replay", self._state, self.every)
+
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread: threading.Thread | None = None
+
+    def _value(self, name: str) -> Any:
+        # the time isn't in the sample, but in the record
+        return self.t if name == "time" else self.sample[name]
+
+    def _state(self) -> dict:
+        return {
+            "speed": self.speed,
+            "paused": self.paused,
+            "end": self.recording.next_sample(self.index + 1) is None,
+        }
+
+    def _snapshot(self, missed_ticks: int = 0) -> Snapshot:
+        data = {**self.sample, "time": self.t, "replay": self._state()}
+        return Snapshot(data, {name: self.t for name in data}, missed_ticks)
+
+    def start(self, callback: Callable[[Snapshot], Any]):
+        self._thread = threading.Thread(
+            target=self._run, args=(callback,), name="tiptop-replay", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def toggle_pause(self):
+        with self._cond:
+            self.paused = not self.paused
+            self._cond.notify()
+
+    def set_speed(self, speed: float):
+        with self._cond:
+            self.speed = speed
+            self._cond.notify()
+
+    def seek(self, t: float):
+        """Jump to the first sample at or after the time `t`, in seconds since the
+        epoch.
+        """
+        with self._cond:
+            self._seek_index = self.recording.find(t)
+            self._cond.notify()
+
+    def _show(self, index: int, callback: Callable[[Snapshot], Any], jump: bool):
+        # called with the lock held
+        dt = self.recording.time(index) - self.t
+        self.index = index
+        self.t, self.sample = self.recording.sample(index)
+        self.shown_at = time.monotonic()
+        # Gaps show up as missed ticks, like when collecting took too long live.
+        missed_ticks = 0 if jump else max(round(dt / self.every) - 1, 0)
+        callback(self._snapshot(missed_ticks))
+
+    def _run(self, callback: Callable[[Snapshot], Any]):
+        with self._cond:
+            callback(self._snapshot())
+            state = self._state()
+            while not self._stopped:
+                if self._seek_index is not None:
+                    index = self._seek_index
+                    self._seek_index = None
+                    self._show(index, callback, jump=True)
+                    state = self._state()
+                    continue
+
+                if self._state() != state:
+                    # paused, resumed, or another speed
+                    state = self._state()
+                    callback(Snapshot({"replay": state}, {"replay": self.t}))
+
+                index = self.recording.next_sample(self.index + 1)
+                if self.paused or index is None:
+                    self._cond.wait()
+                    continue
+
+                dt = min(self.recording.time(index) - self.t, self.max_gap)
+                timeout = self.shown_at + dt / self.speed - time.monotonic()
+                if timeout > 0:
+                    # woken up early by stop(), seek(), etc.
+                    self._cond.wait(timeout)
+                    continue
+                self._show(index, callback, jump=False)
+                state = self._state()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import threading
+import time
+from math import inf
+from typing import Any, Callable
+
+
+class Snapshot(dict):
+    """The data of some metrics by name. `times` holds the monotonic time at which
+    each metric was collected, so rates can be computed from the real time between
+    two samples. `missed_ticks` is the number of ticks that were skipped before this
+    one, e.g., because collecting took longer than the interval.
+    """
+
+    def __init__(self, data=(), times=None, missed_ticks: int = 0):
+        super().__init__(data)
+        self.times: dict[str, float] = {} if times is None else times
+        self.missed_ticks = missed_ticks
+
+
+class Sampler:
+    """Runs all collectors from one timer.
+
+    Every metric has a collector and a cadence, which is rounded to a multiple of
+    the base interval. On every tick, the metrics that are due are collected into
+    one snapshot, and afterwards the subscribers of those metrics are notified once,
+    with the part of the snapshot they subscribed to. This way, the process only
+    wakes up once per base interval, no matter how many widgets there are.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        # name -> (collector, cadence in ticks); 0 means only once
+        self.metrics: dict[str, tuple[Callable[[], Any], int]] = {}
+        self.subscribers: list[tuple[Callable[[dict], Any], tuple[str, ...]]] = []
+        # the most recent data of all metrics that were passed to the subscribers
+        self.latest: dict[str, Any] = {}
+        # the monotonic collection times of the latest data
+        self.times: dict[str, float] = {}
+        self.num_ticks = 0
+        # the start of the previous collect(), and all ticks that were missed
+        self.last_collect: float | None = None
+        self.missed_ticks = 0
+        # metrics that were collected on subscription, before they were due
+        self._fresh: set[str] = set()
+
+    def add_metric(self, name: str, collector: Callable[[], Any], every: float | None):
+        """Collect `name` every `every` seconds. If `every` is None, it is only
+        collected in the first tick, e.g., for static information like the CPU model.
+        """
+        ticks = 0 if every is None else max(round(every / self.interval), 1)
+        self.metrics[name] = (collector, ticks)
+
+    def collector(self, name: str):
+        return self.metrics[name][0]
+
+    def cadence(self, name: str) -> float:
+        """The time between two collections of `name` in seconds."""
+        ticks = self.metrics[name][1]
+        return inf if ticks == 0 else ticks * self.interval
+
+    def get(self, name: str) -> Any:
+        """The latest data of the metric `name`, collected now if there is none."""
+        if name not in self.latest:
+            self.latest[name] = self.metrics[name][0]()
+            self.times[name] = time.monotonic()
+            self._fresh.add(name)
+        return self.latest[name]
+
+    def subscribe(self, callback: Callable[[dict], Any], *names: str):
+        """Call `callback(snapshot)` whenever one of the metrics in `names` was
+        collected. `snapshot` is a dictionary with the metrics that were collected.
+        The callback is called once immediately with the latest data, which is
+        collected now if necessary.
+
+        `snapshot` is a Snapshot, so it also has the collection times.
+        """
+        self.subscribers.append((callback, names))
+        data = {name: self.get(name) for name in names}
+        callback(Snapshot(data, {name: self.times[name] for name in names}))
+
+    def collect(self) -> Snapshot:
+        """Collect all metrics that are due in this tick, without notifying. This
+        doesn't touch the subscribers and the latest data, so it can run in another
+        thread than `notify()`.
+        """
+        now = time.monotonic()
+        missed_ticks = 0
+        if self.last_collect is not None:
+            # e.g., the previous tick took too long, or the system was suspended
+            missed_ticks = max(round((now - self.last_collect) / self.interval) - 1, 0)
+        self.last_collect = now
+
+        snapshot = Snapshot(missed_ticks=missed_ticks)
+        for name, (collector, ticks) in self.metrics.items():
+            if ticks == 0:
+                if self.num_ticks > 0:
+                    continue
+            elif self.num_ticks % ticks != 0:
+                continue
+            if name in self._fresh:
+                # collected just before; don't do it again
+                self._fresh.discard(name)
+                continue
+            snapshot[name] = collector()
+            snapshot.times[name] = time.monotonic()
+        self.num_ticks += 1
+        return snapshot
+
+    def notify(self, snapshot: Snapshot):
+        self.latest.update(snapshot)
+        self.times.update(snapshot.times)
+        self.missed_ticks += snapshot.missed_ticks
+        for callback, names in self.subscribers:
+            data = {name: snapshot[name] for name in names if name in snapshot}
+            if data:
+                callback(
+                    Snapshot(
+                        data,
+                        {name: snapshot.times[name] for name in data},
+                        snapshot.missed_ticks,
+                    )
+                )
+
+    def tick(self) -> Snapshot:
+        snapshot = self.collect()
+        self.notify(snapshot)
+        return snapshot
+
+
+class SamplerThread:
+    """Runs the collectors of a sampler in a background thread, such that slow
+    collectors (e.g., listing 20k processes) don't block the user interface.
+
+    Every `sampler.interval` seconds, the metrics that are due are collected and the
+    snapshot is passed to `callback`, in the background thread. The callback is
+    responsible for handing it over to `sampler.notify()` in the main thread. If
+    collecting takes longer than one interval, the next tick starts right away.
+    """
+
+    def __init__(self, sampler: Sampler):
+        self.sampler = sampler
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, callback: Callable[[Snapshot], Any]):
+        self._thread = threading.Thread(
+            target=self.run, args=(callback,), name="tiptop-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        # Don't wait for the thread; a slow collector could take a while to return.
+        # The thread is a daemon, so it doesn't keep the process alive.
+        self._stopped.set()
+
+    def run(self, callback: Callable[[Snapshot], Any]):
+        """Like `start()`, but in the calling thread, until `stop()` is called. This
+        is for running without a user interface; `callback` can then be
+        `sampler.notify`.
+        """
+        next_time = time.monotonic()
+        while not self._stopped.is_set():
+            callback(self.sampler.collect())
+            next_time = max(next_time + self.sampler.interval, time.monotonic())
+            self._stopped.wait(next_time - time.monotonic())
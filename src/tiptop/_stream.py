@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from itertools import chain
+from math import ceil, floor, log10
+
+from ._history import History
+
+
+class GlyphColumns(dict):
+    """Maps column keys to the column of characters displaying them, top row first.
+    Columns are computed by `make_column` on first use and then served from the
+    table.
+    """
+
+    # Bound the table size for very tall graphs; there are many possible keys, but
+    # only few of them appear at any given time.
+    max_size = 4096
+
+    def __init__(self, make_column):
+        super().__init__()
+        self.make_column = make_column
+
+    def __missing__(self, key: int):
+        column = self.make_column(key)
+        if len(self) >= self.max_size:
+            self.clear()
+        self[key] = column
+        return column
+
+
+def quantize(values, minval: float, maxval: float, num_levels: int) -> array:
+    """Convert all values to levels in [0, num_levels] in one pass."""
+    diff = maxval - minval
+    if diff == 0:
+        diff = 1
+    return array(
+        "l",
+        [
+            ceil((min(max(value, minval), maxval) - minval) / diff * num_levels)
+            for value in values
+        ],
+    )
+
+
+def nice_ceil(value: float) -> float:
+    """Smallest number of the form 1, 2, 5 times a power of 10 that is >= value."""
+    if value <= 0.0:
+        return 0.0
+    exponent = floor(log10(value))
+    for mantissa in [1, 2, 5, 10]:
+        nice = mantissa * 10.0**exponent
+        if nice >= value:
+            return nice
+    # rounding issues
+    return 10.0 ** (exponent + 1)
+
+
+class Stream(ABC):
+    """History and quantization core shared by all stream types.
+
+    Every character row of the graph is split into `levels_per_row` levels, and
+    each character displays `samples_per_char` values. Subclasses only define how
+    levels map to characters (`_column_keys` and `_glyph_columns`).
+    """
+
+    levels_per_row: int
+    samples_per_char: int
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        minval: float,
+        maxval: float,
+        flipud: bool = False,
+        autoscale: bool = False,
+    ):
+        self.width = max(width, 0)
+        self.height = height
+        self.minval = minval
+        self.maxval = maxval
+        self.flipud = flipud
+
+        # Store all values for resize purposes; we store one more value than what
+        # is displayed, e.g., to account for the left half of the first Braille
+        # character.
+        # The values and their quantized levels live in two fixed-size ring
+        # buffers; `_head` points at the oldest entry, i.e., the one that gets
+        # overwritten next.
+        self._size = self._buffer_size(self.width)
+        self._values = array("d", [minval]) * self._size
+        self._levels = array("l", [0]) * self._size
+        self._head = 0
+        # number of newest consecutive entries with the same level
+        self._run = self._size
+
+        # The rows are only rendered when `graph` is read after a change.
+        self._graph: list[str] | None = None
+        # incremented whenever `graph` changes; use it to cache renderables
+        self.version = 0
+        # Total number of values added, and a counter that is incremented when
+        # the quantization or size changes. For every phase, i.e., value count
+        # modulo `samples_per_char`, the last rendered rows are kept with the
+        # counters at render time; that's enough to render later graphs by only
+        # shifting the rows.
+        self._count = 0
+        self._layout = 0
+        self._renders: dict[int, tuple[int, int, list[str]]] = {}
+
+        # With autoscale, maxval follows the maximum of the stored values, rounded
+        # up to a "nice" number. The initial maxval is the smallest scale.
+        # The window maximum is tracked with a monotonic deque of (count, value)
+        # pairs, decreasing in value, so every append is amortized O(1).
+        self.autoscale = autoscale
+        self.min_maxval = maxval
+        self._window_max: deque[tuple[int, float]] = deque()
+
+        # optional long-term history, see History
+        self.history: History | None = None
+
+    def _buffer_size(self, width: int) -> int:
+        return self.samples_per_char * width + 1
+
+    def value_to_level(self, value: float) -> int:
+        diff = self.maxval - self.minval
+        if diff == 0:
+            diff = 1
+        value = min(max(value, self.minval), self.maxval)
+        return ceil((value - self.minval) / diff * self.levels_per_row * self.height)
+
+    def value_to_blocks(self, value: float):
+        k = self.value_to_level(value)
+        n = self.levels_per_row
+        # form blocks of n
+        blocks = [n] * (k // n)
+        if k % n > 0:
+            blocks += [k % n]
+        blocks += [0] * (self.height - len(blocks))
+        return blocks
+
+    def add_value(self, value: float):
+        head = self._head
+        level = self.value_to_level(value)
+        # If all stored entries have the same level as the new one, shifting the
+        # graph doesn't change it. This is the common case for idle machines.
+        unchanged = level == self._levels[head - 1] and self._run >= self._size
+        self._run = self._run + 1 if level == self._levels[head - 1] else 1
+
+        self._values[head] = value
+        self._levels[head] = level
+        self._head = (head + 1) % self._size
+        self._count += 1
+        if not unchanged:
+            self._changed()
+
+        if self.autoscale:
+            self._track_max(self._count, value)
+            self._rescale()
+
+        if self.history is not None:
+            self.history.add_value(value)
+
+    def set_values(self, values):
+        """Replace all stored values, e.g., by a window from the history. Missing
+        values on the left are filled up with minval.
+        """
+        values = array("d", values[-self._size :])
+        values = array("d", [self.minval]) * (self._size - len(values)) + values
+        self._values = values
+        self._head = 0
+        self._count += self._size
+        if self.autoscale:
+            self._window_max.clear()
+            for count, value in enumerate(values, self._count - self._size + 1):
+                self._track_max(count, value)
+            maxval = max(nice_ceil(self._window_max[0][1]), self.min_maxval)
+            # make sure to requantize even if maxval doesn't change
+            self.maxval = maxval
+        self._requantize()
+
+    def _track_max(self, count: int, value: float):
+        window = self._window_max
+        while window and window[-1][1] <= value:
+            window.pop()
+        window.append((count, value))
+        # drop the maximum if it has left the ring buffer
+        if window[0][0] <= count - self._size:
+            window.popleft()
+
+    def _rescale(self):
+        maxval = max(nice_ceil(self._window_max[0][1]), self.min_maxval)
+        self.reset_maxval(maxval)
+
+    def reset_maxval(self, maxval: float):
+        """Change the scale of the graph, including all stored values."""
+        if maxval == self.maxval:
+            return
+        self.maxval = maxval
+        self._requantize()
+
+    def _requantize(self):
+        num_levels = self.levels_per_row * self.height
+        self._levels = quantize(self._values, self.minval, self.maxval, num_levels)
+        self._run = 0
+        self._layout += 1
+        self._changed()
+
+    @property
+    def values(self) -> list[float]:
+        return self._linear(self._values).tolist()
+
+    @property
+    def last_value(self) -> float:
+        return self._values[self._head - 1]
+
+    def _changed(self):
+        self._graph = None
+        self.version += 1
+
+    @property
+    def graph(self) -> list[str]:
+        if self._graph is None:
+            self._graph = self._render()
+        return self._graph
+
+    def _linear(self, buf: array) -> array:
+        # oldest to newest
+        return buf[self._head :] + buf[: self._head]
+
+    def _tail(self, buf: array, n: int) -> array:
+        # the newest n entries, oldest first
+        head = self._head
+        if n <= head:
+            return buf[head - n : head]
+        return buf[head - n :] + buf[:head]
+
+    @abstractmethod
+    def _column_keys(self, levels: array) -> list[int]:
+        """The keys into `_glyph_columns()` for all characters, left to right."""
+
+    @abstractmethod
+    def _glyph_columns(self) -> GlyphColumns:
+        """The glyphs of every column key, for the current height."""
+
+    def _render(self) -> list[str]:
+        if self.width == 0:
+            return [""] * self.height
+
+        spc = self.samples_per_char
+        phase = self._count % spc
+        count, layout, rows = self._renders.get(phase, (0, -1, []))
+        shift = (self._count - count) // spc
+        if layout == self._layout and 0 <= shift < self.width:
+            # only render the `shift` newest characters and append them
+            levels = self._tail(self._levels, spc * shift + 1)
+        else:
+            levels = self._linear(self._levels)
+            rows = [""] * self.height
+            shift = self.width
+
+        columns = map(self._glyph_columns().__getitem__, self._column_keys(levels))
+        # transpose and join
+        new = map("".join, zip(*columns)) if shift > 0 else [""] * self.height
+        rows = [row[shift:] + n for row, n in zip(rows, new)]
+
+        self._renders[phase] = (self._count, self._layout, rows)
+        return rows
+
+    def reset_width(self, width: int):
+        width = max(width, 0)
+        if width == self.width:
+            return
+
+        size = self._buffer_size(width)
+        values = self._linear(self._values)
+        levels = self._linear(self._levels)
+        if size > self._size:
+            diff = size - self._size
+            values = array("d", [self.minval]) * diff + values
+            levels = array("l", [0]) * diff + levels
+        else:
+            values = values[-size:]
+            levels = levels[-size:]
+
+        self._values = values
+        self._levels = levels
+        self._head = 0
+        self._size = size
+        self._run = 0
+        self._layout += 1
+        self.width = width
+        self._changed()
+
+        if self.autoscale:
+            self._window_max.clear()
+            for count, value in enumerate(values, self._count - size + 1):
+                self._track_max(count, value)
+            self._rescale()
+
+    def reset_height(self, height: int):
+        if height == self.height:
+            return
+
+        # the levels depend on the height, so requantize all values
+        self.height = height
+        self._requantize()
+
+
+class MultiStream(ABC):
+    """Several streams of the same size and range that always get new values at the
+    same time, e.g., the loads of all CPU threads. All series are stored in one
+    matrix-like ring buffer with a shared head, so a whole vector of values is
+    appended with one strided assignment and all graphs are rendered together.
+    """
+
+    levels_per_row: int
+    samples_per_char: int
+
+    def __init__(
+        self,
+        num_series: int,
+        width: int,
+        height: int,
+        minval: float,
+        maxval: float,
+        flipud: bool = False,
+    ):
+        self.num_series = num_series
+        self.width = max(width, 0)
+        self.height = height
+        self.minval = minval
+        self.maxval = maxval
+        self.flipud = flipud
+
+        # series k occupies the entries [k * _size, (k + 1) * _size)
+        self._size = self.samples_per_char * self.width + 1
+        self._values = array("d", [minval]) * (num_series * self._size)
+        self._levels = array("l", [0]) * (num_series * self._size)
+        self._head = 0
+
+        self._graphs: list[list[str]] | None = None
+        self.version = 0
+        # see Stream
+        self._count = 0
+        self._layout = 0
+        self._renders: dict[int, tuple[int, int, list[list[str]]]] = {}
+
+    def add_values(self, values):
+        assert len(values) == self.num_series
+        head = self._head
+        self._values[head :: self._size] = array("d", values)
+        self._levels[head :: self._size] = quantize(
+            values, self.minval, self.maxval, self.levels_per_row * self.height
+        )
+        self._head = (head + 1) % self._size
+        self._count += 1
+        self._changed()
+
+    @property
+    def last_values(self) -> list[float]:
+        return self._values[(self._head - 1) % self._size :: self._size].tolist()
+
+    @property
+    def values(self) -> list[list[float]]:
+        return [series.tolist() for series in self._linear(self._values)]
+
+    def _changed(self):
+        self._graphs = None
+        self.version += 1
+
+    @property
+    def graphs(self) -> list[list[str]]:
+        """The graph rows of all series."""
+        if self._graphs is None:
+            self._graphs = self._render()
+        return self._graphs
+
+    def _linear(self, buf: array) -> list[array]:
+        # all series, oldest to newest
+        head = self._head
+        size = self._size
+        return [
+            buf[start + head : start + size] + buf[start : start + head]
+            for start in range(0, len(buf), size)
+        ]
+
+    @abstractmethod
+    def _column_keys(self, levels) -> list[int]:
+        """Like Stream._column_keys(), for one series."""
+
+    @abstractmethod
+    def _glyph_columns(self) -> GlyphColumns:
+        """Like Stream._glyph_columns()."""
+
+    def _render(self) -> list[list[str]]:
+        if self.width == 0:
+            return [[""] * self.height for _ in range(self.num_series)]
+
+        # like Stream._render, only render the newest characters if possible
+        spc = self.samples_per_char
+        phase = self._count % spc
+        count, layout, graphs = self._renders.get(phase, (0, -1, []))
+        shift = (self._count - count) // spc
+        if layout != self._layout or not 0 <= shift < self.width:
+            shift = self.width
+            graphs = [[""] * self.height] * self.num_series
+
+        if shift > 0:
+            # The newest spc * shift levels of all series; every strided slice is
+            # one point in time across all series. Transpose to get them series by
+            # series, and prepend a dummy for the oldest value which isn't
+            # displayed. Then the keys of all series come out in one go.
+            head = self._head
+            size = self._size
+            columns = [
+                self._levels[(head - k) % size :: size]
+                for k in range(spc * shift, 0, -1)
+            ]
+            levels = (0,) + tuple(chain.from_iterable(zip(*columns)))
+            glyphs = list(
+                map(self._glyph_columns().__getitem__, self._column_keys(levels))
+            )
+            if shift == 1:
+                # the common case: one new character per series
+                new_rows = glyphs
+            else:
+                new_rows = [
+                    list(map("".join, zip(*glyphs[k : k + shift])))
+                    for k in range(0, len(glyphs), shift)
+                ]
+            graphs = [
+                [row[shift:] + new for row, new in zip(rows, new)]
+                for rows, new in zip(graphs, new_rows)
+            ]
+
+        self._renders[phase] = (self._count, self._layout, graphs)
+        return graphs
+
+    def reset_width(self, width: int):
+        width = max(width, 0)
+        if width == self.width:
+            return
+
+        size = self.samples_per_char * width + 1
+        values = array("d")
+        levels = array("l")
+        for v, lev in zip(self._linear(self._values), self._linear(self._levels)):
+            if size > self._size:
+                diff = size - self._size
+                values += array("d", [self.minval]) * diff + v
+                levels += array("l", [0]) * diff + lev
+            else:
+                values += v[-size:]
+                levels += lev[-size:]
+
+        self._values = values
+        self._levels = levels
+        self._head = 0
+        self._size = size
+        self._layout += 1
+        self.width = width
+        self._changed()
+
+    def reset_height(self, height: int):
+        if height == self.height:
+            return
+        self.height = height
+        num_levels = self.levels_per_row * height
+        self._levels = quantize(self._values, self.minval, self.maxval, num_levels)
+        self._layout += 1
+        self._changed()
@@ -0,0 +1,362 @@
+"""Fast paths for Linux that read /sys directly. The files are found once and kept
+open; every sample is then a single pread() per file.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import os
+import re
+import time
+
+from . import _procfs
+
+
+def _read_text(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_int(fd: int) -> int:
+    # Reading from offset 0 makes sysfs generate the value again.
+    return int(os.pread(fd, 64, 0))
+
+
+def _natural_key(string: str):
+    # hwmon10 after hwmon9
+    return [int(s) if s.isdigit() else s for s in re.split(r"(\d+)", string)]
+
+
+class HwmonCollector:
+    """Temperatures of all hwmon devices, e.g., CPU, NVMe, and chipset.
+
+    The devices are identified by their `name`, not by the hwmon index, since the
+    index depends on the order in which the drivers were loaded.
+    """
+
+    # coretemp: intel, k10temp: amd
+    # <https://github.com/nschloe/tiptop/issues/37>
+    cpu_chips = ["coretemp", "k10temp"]
+
+    def __init__(self, root: str = "/sys/class/hwmon"):
+        # (device name, [(label, fd)])
+        self.chips: list[tuple[str, list[tuple[str, int]]]] = []
+        try:
+            hwmons = sorted(os.listdir(root), key=_natural_key)
+        except OSError:
+            hwmons = []
+
+        names = set()
+        for hwmon in hwmons:
+            path = f"{root}/{hwmon}"
+            name = _read_text(f"{path}/name")
+            if name is None:
+                continue
+            try:
+                files = os.listdir(path)
+            except OSError:
+                continue
+            indices = sorted(
+                int(m.group(1))
+                for m in (re.fullmatch(r"temp(\d+)_input", f) for f in files)
+                if m is not None
+            )
+            sensors = []
+            for k in indices:
+                label = _read_text(f"{path}/temp{k}_label") or f"temp{k}"
+                try:
+                    fd = os.open(f"{path}/temp{k}_input", os.O_RDONLY)
+                except OSError:
+                    continue
+                try:
+                    _read_int(fd)
+                except (OSError, ValueError):
+                    # some sensors exist, but can't be read
+                    os.close(fd)
+                    continue
+                sensors.append((label, fd))
+            if sensors:
+                # make names unique, e.g., with multiple NVMe drives
+                unique_name = name
+                k = 1
+                while unique_name in names:
+                    unique_name = f"{name}.{k}"
+                    k += 1
+                names.add(unique_name)
+                self.chips.append((unique_name, sensors))
+
+        self.cpu_chip = None
+        for name in self.cpu_chips:
+            for chip in self.chips:
+                if chip[0] == name:
+                    self.cpu_chip = chip
+                    break
+            if self.cpu_chip is not None:
+                break
+
+    def close(self):
+        for _, sensors in self.chips:
+            for _, fd in sensors:
+                os.close(fd)
+        self.chips = []
+        self.cpu_chip = None
+
+    def cpu_temps(self) -> list[float | None] | None:
+        """The CPU temperatures in °C. For coretemp, the first is the package
+        temperature and the others are the core temperatures. Sensors that can't be
+        read right now are None, so the others keep their positions.
+        """
+        if self.cpu_chip is None:
+            return None
+        return [temp for _, temp in self._read(self.cpu_chip[1])]
+
+    def sensors(self) -> dict[str, float | None]:
+        """All temperatures in °C by "<device name> <label>"."""
+        out = {}
+        for name, sensors in self.chips:
+            for label, temp in self._read(sensors):
+                out[f"{name} {label}"] = temp
+        return out
+
+    @staticmethod
+    def _read(sensors: list[tuple[str, int]]) -> list[tuple[str, float | None]]:
+        out: list[tuple[str, float | None]] = []
+        for label, fd in sensors:
+            try:
+                out.append((label, _read_int(fd) / 1000))
+            except (OSError, ValueError):
+                # temporarily unavailable
+                out.append((label, None))
+        return out
+
+
+def _parse_cpu_list(string: str) -> list[int]:
+    # "0 1 2 3" (affected_cpus) or "0-3,8" (cpu lists)
+    out = []
+    for part in string.replace(",", " ").split():
+        if "-" in part:
+            a, b = part.split("-")
+            out.extend(range(int(a), int(b) + 1))
+        else:
+            out.append(int(part))
+    return out
+
+
+def freq_summary(per_thread: list[float | None]) -> dict | None:
+    """Frequencies per thread, and their min, average, and max, in MHz."""
+    freqs = [f for f in per_thread if f is not None]
+    if not freqs:
+        return None
+    return {
+        "per_thread": per_thread,
+        "min": min(freqs),
+        "avg": sum(freqs) / len(freqs),
+        "max": max(freqs),
+    }
+
+
+class CpufreqCollector:
+    """The current frequency of every CPU thread from the cpufreq policies. Threads
+    that share a clock are in the same policy.
+    """
+
+    def __init__(self, root: str = "/sys/devices/system/cpu/cpufreq"):
+        # (CPU ids, fd of scaling_cur_freq)
+        self.policies: list[tuple[list[int], int]] = []
+        try:
+            policies = sorted(
+                (p for p in os.listdir(root) if p.startswith("policy")),
+                key=_natural_key,
+            )
+        except OSError:
+            policies = []
+
+        for policy in policies:
+            path = f"{root}/{policy}"
+            cpus = _read_text(f"{path}/affected_cpus")
+            if not cpus:
+                # an offline policy
+                continue
+            try:
+                fd = os.open(f"{path}/scaling_cur_freq", os.O_RDONLY)
+            except OSError:
+                continue
+            self.policies.append((_parse_cpu_list(cpus), fd))
+
+        self.num_threads = max((max(cpus) + 1 for cpus, _ in self.policies), default=0)
+
+    def close(self):
+        for _, fd in self.policies:
+            os.close(fd)
+        self.policies = []
+
+    def __call__(self) -> dict | None:
+        per_thread: list[float | None] = [None] * self.num_threads
+        for cpus, fd in self.policies:
+            try:
+                freq = _read_int(fd) / 1000
+            except (OSError, ValueError):
+                continue
+            for cpu in cpus:
+                per_thread[cpu] = freq
+        return freq_summary(per_thread)
+
+
+def net_interfaces_up(root: str = "/sys/class/net") -> dict[str, bool]:
+    """All network interfaces and if they're up, like psutil's `isup`."""
+    out = {}
+    for name in os.listdir(root):
+        flags = _read_text(f"{root}/{name}/flags")
+        # IFF_UP
+        out[name] = flags is not None and int(flags, 16) & 0x1 != 0
+    return out
+
+
+def is_pattern(string: str) -> bool:
+    return any(c in string for c in "*?[")
+
+
+class CounterTotals:
+    """Totals of counters over a set of interfaces that changes, e.g., all that match
+    a pattern, or all disks. The totals never go down.
+
+    Adding up the counters themselves would count the whole lifetime traffic of an
+    interface that starts to match in a single tick, and the totals would go down
+    when an interface is removed. Instead, the totals grow by the increase of every
+    interface since the previous update. An interface adds nothing in the update in
+    which it first shows up, and neither does a counter that started over.
+    """
+
+    def __init__(self, num_counters: int):
+        self.totals: list[int] | None = None
+        self.num_counters = num_counters
+        # interface -> counters at the previous update
+        self.last: dict[str, list[int]] = {}
+
+    def update(self, counters: dict[str, list[int]]) -> list[int]:
+        """The totals after the counters by interface are `counters`."""
+        if self.totals is None:
+            # start at the sum, so the totals are about what they would be otherwise
+            self.totals = [sum(values) for values in zip(*counters.values())]
+            if not self.totals:
+                self.totals = [0] * self.num_counters
+        else:
+            for name, values in counters.items():
+                last = self.last.get(name)
+                if last is None:
+                    continue
+                self.totals = [
+                    total + value - prev if value >= prev else total
+                    for total, value, prev in zip(self.totals, values, last)
+                ]
+        self.last = counters
+        return self.totals
+
+
+class NetStatsCollector:
+    """The counters of the watched network interfaces.
+
+    `patterns` are interface names or glob patterns like "eth*". The statistics
+    files of named interfaces are opened once and kept open. A pattern can match
+    thousands of interfaces, e.g., veths on a container host, so the counters of all
+    interfaces come from one read of /proc/net/dev instead, and the ones that match a
+    pattern are added up with CounterTotals. Named interfaces that don't exist (yet)
+    are looked for again every `rescan_interval` seconds.
+    """
+
+    # psutil names -> statistics files
+    counters = {
+        "bytes_recv": "rx_bytes",
+        "bytes_sent": "tx_bytes",
+        "packets_recv": "rx_packets",
+        "packets_sent": "tx_packets",
+        "errin": "rx_errors",
+        "errout": "tx_errors",
+        "dropin": "rx_dropped",
+        "dropout": "tx_dropped",
+    }
+
+    def __init__(
+        self,
+        patterns: list[str],
+        root: str = "/sys/class/net",
+        rescan_interval: float = 30.0,
+        net_dev: str = "/proc/net/dev",
+    ):
+        self.patterns = patterns
+        self.root = root
+        self.rescan_interval = rescan_interval
+        self.net_dev = net_dev
+        # named interface -> [fd per counter]
+        self.interfaces: dict[str, list[int]] = {}
+        self.totals = {
+            pattern: CounterTotals(len(self.counters))
+            for pattern in patterns
+            if is_pattern(pattern)
+        }
+        self.last_scan = 0.0
+        self._scan()
+
+    def _scan(self):
+        # open the named interfaces that aren't open yet
+        for name in self.patterns:
+            if is_pattern(name) or name in self.interfaces:
+                continue
+            try:
+                self.interfaces[name] = self._open(name)
+            except FileNotFoundError:
+                # the interface doesn't exist (yet)
+                pass
+        self.last_scan = time.monotonic()
+
+    def _open(self, name: str) -> list[int]:
+        fds: list[int] = []
+        try:
+            for filename in self.counters.values():
+                path = f"{self.root}/{name}/statistics/{filename}"
+                fds.append(os.open(path, os.O_RDONLY))
+        except BaseException:
+            for fd in fds:
+                os.close(fd)
+            raise
+        return fds
+
+    def _drop(self, name: str):
+        for fd in self.interfaces.pop(name):
+            os.close(fd)
+
+    def close(self):
+        for name in list(self.interfaces):
+            self._drop(name)
+
+    def __call__(self) -> dict[str, dict[str, int]]:
+        num_named = sum(not is_pattern(p) for p in self.patterns)
+        if (
+            len(self.interfaces) < num_named
+            and time.monotonic() - self.last_scan > self.rescan_interval
+        ):
+            self._scan()
+
+        all_counters = _procfs.read_net_dev(self.net_dev) if self.totals else {}
+
+        out = {}
+        for pattern in self.patterns:
+            if pattern in self.totals:
+                counters = {
+                    name: all_counters[name]
+                    for name in fnmatch.filter(all_counters, pattern)
+                }
+                values = self.totals[pattern].update(counters)
+            else:
+                values = [0] * len(self.counters)
+                if pattern in self.interfaces:
+                    try:
+                        values = [_read_int(fd) for fd in self.interfaces[pattern]]
+                    except (OSError, ValueError):
+                        # the interface was removed
+                        self._drop(pattern)
+            out[pattern] = dict(zip(self.counters, values))
+        return out
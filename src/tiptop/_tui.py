@@ -0,0 +1,169 @@
+"""The Textual app. It's only imported when the user interface is shown, so the
+other modes start without Textual and Rich.
+"""
+
+from __future__ import annotations
+
+import asyncio
+
+from textual.app import App
+from textual.message import Message
+
+from ._cpu import CPU
+from ._disk import Disk
+from ._info import InfoLine
+from ._mem import Mem
+from ._net import Net
+from ._procs_list import ProcsList
+from ._remote import Connection
+from ._replay import Player
+from ._sampler import Sampler, SamplerThread
+
+# class TiptopApp(App):
+#     async def on_mount(self) -> None:
+#         await self.view.dock(InfoLine(), edge="top", size=1, name="info")
+#         await self.view.dock(CPU(), edge="top", size=14, name="cpu")
+#         await self.view.dock(ProcsList(), edge="right", size=70, name="proc")
+#         await self.view.dock(Mem(), edge="top", size=20, name="mem")
+#         await self.view.dock(Net(), edge="bottom", name="net")
+#
+#     async def on_load(self, _):
+#         await self.bind("i", "view.toggle('info')", "Toggle info")
+#         await self.bind("c", "view.toggle('cpu')", "Toggle cpu")
+#         await self.bind("m", "view.toggle('mem')", "Toggle mem")
+#         await self.bind("n", "view.toggle('net')", "Toggle net")
+#         await self.bind("p", "view.toggle('proc')", "Toggle proc")
+#         await self.bind("q", "quit", "quit")
+
+
+class Snapshot(Message):
+    def __init__(self, sender, data: dict):
+        super().__init__(sender)
+        self.data = data
+
+
+# with a grid
+class TiptopApp(App):
+    def __init__(
+        self,
+        sampler: Sampler,
+        sampler_thread: SamplerThread | Player | Connection,
+        interfaces: list[str],
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.sampler = sampler
+        # runs the sampler in the background, replays a recording, or receives the
+        # data of an agent
+        self.sampler_thread = sampler_thread
+        self.interfaces = interfaces
+
+    async def on_mount(self) -> None:
+        self.cpu = None
+        self.net = None
+
+        loop = asyncio.get_running_loop()
+
+        def post_snapshot(data: dict):
+            # called from the sampler thread
+            try:
+                loop.call_soon_threadsafe(
+                    self.post_message_no_wait, Snapshot(self, data)
+                )
+            except RuntimeError:
+                # the event loop is closed; tiptop is shutting down
+                pass
+
+        self.sampler_thread.start(post_snapshot)
+
+    async def handle_snapshot(self, message: Snapshot):
+        self.sampler.notify(message.data)
+        if self.cpu is None:
+            # The widgets are created once the first snapshot, which contains
+            # all metrics, is there. That way, they don't collect anything
+            # themselves.
+            await self.place_widgets()
+
+    async def place_widgets(self):
+        grid = await self.view.dock_grid(edge="left")
+
+        # 34/55: approx golden ratio. See
+        # <https://gist.github.com/nschloe/ab6c3c90b4a6bc02c40405803fa8fa35>
+        # for the error.
+        grid.add_column(fraction=55, name="left")
+        grid.add_column(fraction=34, name="right")
+
+        grid.add_row(size=1, name="r0")
+        grid.add_row(fraction=1, name="r1")
+        grid.add_row(fraction=1, name="r2")
+        grid.add_row(fraction=1, name="r3")
+        grid.add_areas(
+            area0="left-start|right-end,r0",
+            area1="left,r1",
+            area2a="right,r1",
+            area2b="right,r2",
+            area2c="right,r3",
+            area3="left,r2-start|r3-end",
+        )
+        # The widgets set themselves up in __init__, not in on_mount: The view
+        # renders them as soon as they are placed, which can be before they
+        # get their Mount event.
+        self.cpu = CPU(self.sampler)
+        self.net = Net(self.sampler, self.interfaces)
+        grid.place(
+            area0=InfoLine(self.sampler),
+            area1=self.cpu,
+            area2a=Mem(self.sampler),
+            area2b=Disk(self.sampler),
+            area2c=self.net,
+            area3=ProcsList(self.sampler),
+        )
+
+    async def on_load(self, _):
+        await self.bind("q", "quit", "quit")
+        await self.bind("h", "cycle_history", "cycle cpu history window")
+        await self.bind("c", "cycle_cpu_component", "cycle cpu load component")
+        await self.bind("n", "cycle_net_interface", "cycle net interface")
+        await self.bind("p", "cycle_net_view", "cycle net bytes/packets/errors")
+
+    async def action_cycle_history(self):
+        if self.cpu is not None:
+            self.cpu.cycle_history_window()
+
+    async def action_cycle_cpu_component(self):
+        if self.cpu is not None:
+            self.cpu.cycle_component()
+
+    async def action_cycle_net_interface(self):
+        if self.net is not None:
+            self.net.cycle_interface()
+
+    async def action_cycle_net_view(self):
+        if self.net is not None:
+            self.net.cycle_view()
+
+
+class ReplayApp(TiptopApp):
+    """The app with the keys to control the playback of a recording."""
+
+    async def on_load(self, event):
+        await super().on_load(event)
+        await self.bind("+", "change_speed(2.0)", "faster replay")
+        await self.bind("-", "change_speed(0.5)", "slower replay")
+        await self.bind("left", "seek(-60)", "back 1 min")
+        await self.bind("right", "seek(60)", "forward 1 min")
+        await self.bind("pageup", "seek(-3600)", "back 1 h")
+        await self.bind("pagedown", "seek(3600)", "forward 1 h")
+
+    async def on_key(self, event):
+        # Bindings are stripped, so space can't be bound.
+        if event.key == " ":
+            self.sampler_thread.toggle_pause()
+        else:
+            await super().on_key(event)
+
+    async def action_change_speed(self, factor: float):
+        self.sampler_thread.set_speed(self.sampler_thread.speed * factor)
+
+    async def action_seek(self, seconds: float):
+        self.sampler_thread.seek(self.sampler_thread.t + seconds)
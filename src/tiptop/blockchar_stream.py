@@ -1,28 +1,49 @@
-from math import ceil
+from __future__ import annotations
+
+from functools import lru_cache
+
+from ._stream import GlyphColumns, MultiStream, Stream
 
 num_to_blockchar = [" ", "▁", "▂", "▃", "▄", "▅", "▆", "▇", "█"]
 
+# Widely available fonts only have the upper one eighth and the upper half block, so
+# round up to the next available one.
+num_to_blockchar_upside_down = [" ", "▔", "▀", "▀", "▀", "█", "█", "█", "█"]
+
+
+@lru_cache(maxsize=32)
+def _glyph_columns(height: int, flipud: bool) -> GlyphColumns:
+    # shared between all streams of the same height and orientation
+    lookup = num_to_blockchar_upside_down if flipud else num_to_blockchar
+
+    def make_column(level: int):
+        column = tuple(
+            lookup[min(max(level - offset, 0), 8)] for offset in range(0, 8 * height, 8)
+        )
+        return column if flipud else column[::-1]
+
+    return GlyphColumns(make_column)
+
+
+class _BlockCharGlyphs:
+    # Block characters come in eighths, one value per character.
+    levels_per_row = 8
+    samples_per_char = 1
+
+    height: int
+    flipud: bool
 
-class BlockCharStream:
-    def __init__(self, width: int, height: int, minval: float, maxval: float):
-        self.graph = [" " * width] * height
-        self.height = height
-        self.minval = minval
-        self.maxval = maxval
-        self.last_value: float = minval
+    def _column_keys(self, levels):
+        # skip the oldest value; it isn't displayed
+        return levels[1:]
 
-    def add_value(self, value):
-        k = ceil((value - self.minval) / (self.maxval - self.minval) * 8 * self.height)
+    def _glyph_columns(self) -> GlyphColumns:
+        return _glyph_columns(self.height, self.flipud)
 
-        blocks = [8] * (k // 8)
-        if k % 8 > 0:
-            blocks += [k % 8]
-        blocks += [0] * (self.height - len(blocks))
 
-        chars = [num_to_blockchar[i] for i in blocks]
+class BlockCharStream(_BlockCharGlyphs, Stream):
+    pass
 
-        # update stream
-        for k, char in enumerate(chars[::-1]):
-            self.graph[k] = self.graph[k][1:] + char
 
-        self.last_value = value
+class BlockCharMultiStream(_BlockCharGlyphs, MultiStream):
+    pass
@@ -0,0 +1,82 @@
+import threading
+
+import psutil
+
+from tiptop._collectors import DiskIOCollector, DiskUsageCollector
+
+
+def test_disk_usage(tmp_path, monkeypatch):
+    for name in ["a", "b", "hung"]:
+        (tmp_path / name).mkdir()
+    (tmp_path / "self").mkdir()
+    (tmp_path / "self" / "mountinfo").write_text(
+        f"1 0 8:1 / {tmp_path}/a rw - ext4 /dev/sda1 rw\n"
+        # a bind mount of the same device
+        f"2 1 8:1 /a {tmp_path}/b rw - ext4 /dev/sda1 rw\n"
+        f"3 1 0:40 / {tmp_path}/hung rw - nfs4 server:/ rw\n"
+        f"4 1 0:41 / {tmp_path}/b rw - tmpfs tmpfs rw\n"
+        # the root in a container is kept, other overlays aren't
+        "5 1 0:42 / / rw - overlay overlay rw\n"
+        f"6 1 0:43 / {tmp_path}/c rw - overlay overlay rw\n"
+    )
+
+    # the NFS server doesn't answer
+    release = threading.Event()
+    disk_usage = psutil.disk_usage
+
+    def hanging_disk_usage(path):
+        if path.endswith("hung"):
+            release.wait()
+        return disk_usage(path)
+
+    monkeypatch.setattr(psutil, "disk_usage", hanging_disk_usage)
+
+    collector = DiskUsageCollector(timeout=0.1, root=str(tmp_path))
+    assert collector.mountpoints == [f"{tmp_path}/a", f"{tmp_path}/hung", "/"]
+    rows = collector()
+    assert [row[0] for row in rows] == [f"{tmp_path}/a", "/"]
+    assert list(collector.pending) == [f"{tmp_path}/hung"]
+    # another thread took the place of the hung one
+    assert collector.workers.num_active == collector.workers.num_threads
+
+    # the pending call isn't started again
+    job = collector.pending[f"{tmp_path}/hung"]
+    collector()
+    assert collector.pending[f"{tmp_path}/hung"] is job
+
+    release.set()
+    job.done.wait()
+    rows = collector()
+    assert [row[0] for row in rows] == [f"{tmp_path}/a", f"{tmp_path}/hung", "/"]
+    assert collector.pending == {}
+    # the thread of the hung call exits, since there are enough threads
+    assert collector.workers.num_active == collector.workers.num_threads
+    collector.mountinfo.close()
+
+
+def test_disk_io():
+    counters = {"sda": (100, 10, 800 * 512, 80 * 512, 50, 20, 60, 70)}
+    collector = DiskIOCollector(lambda: counters)
+    io = collector()
+    assert io["read_bytes"] == 800 * 512
+    assert io["read_bytes_s"] is None
+    assert io["devices"] == {"sda": None}
+
+    # 2 s later: 40 reads and 10 writes of 4 KiB, 1 s busy
+    collector.last_time -= 2.0
+    counters = {"sda": (140, 20, 1120 * 512, 160 * 512, 150, 70, 1060, 2070)}
+    io = collector()
+    rates = io["devices"]["sda"]
+    assert 0.99 * 80 * 1024 < rates["read_bytes_s"] <= 80 * 1024
+    assert 0.99 * 20 < rates["read_iops"] <= 20
+    assert rates["latency_ms"] == 150 / 50
+    assert 0.99 < rates["queue_depth"] <= 1.0
+    assert 49.5 < rates["util"] <= 50.0
+    assert io["read_bytes_s"] == rates["read_bytes_s"]
+
+    # the disk is removed, and another one comes
+    counters = {"sdb": (10, 0, 5000 * 512, 0, 0, 0, 0, 0)}
+    io = collector()
+    assert io["read_bytes"] == 1120 * 512
+    counters = {"sdb": (20, 0, 5010 * 512, 0, 0, 0, 0, 0)}
+    assert collector()["read_bytes"] == 1130 * 512
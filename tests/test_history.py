@@ -0,0 +1,26 @@
+from tiptop._history import History
+
+
+def test_history_rollups():
+    history = History(interval=1.0, tiers=[(1, 4), (2, 3), (6, 2)])
+    for value in range(12):
+        history.add_value(float(value))
+
+    # full resolution, only the last four samples
+    assert history.window(4.0) == [8.0, 9.0, 10.0, 11.0]
+
+    # pairs of samples
+    assert history.window(6.0) == [6.5, 8.5, 10.5]
+    assert history.window(6.0, reduce="max") == [7.0, 9.0, 11.0]
+
+    # groups of six
+    assert history.window(12.0, reduce="min") == [0.0, 6.0]
+    assert history.window(12.0) == [2.5, 8.5]
+
+
+def test_history_num_points():
+    history = History(interval=1.0, tiers=[(1, 10)])
+    for value in range(10):
+        history.add_value(float(value))
+
+    assert history.window(10.0, num_points=4, reduce="max") == [0.0, 3.0, 6.0, 9.0]
@@ -0,0 +1,62 @@
+import itertools
+import json
+import subprocess
+import sys
+from functools import partial
+
+import pytest
+
+from tiptop import _app
+from tiptop._app import run
+from tiptop._collectors import create_sampler
+
+
+def test_json():
+    # a new interpreter, to check that neither Textual nor Rich are imported
+    code = (
+        "import sys\n"
+        "from tiptop._app import run\n"
+        "run(['--json', '--interval', '0.1', '--count', '3'])\n"
+        "assert not any(m.startswith(('textual', 'rich')) for m in sys.modules)\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    lines = [json.loads(line) for line in out.splitlines()]
+    assert len(lines) == 3
+    assert lines[1]["time"] > lines[0]["time"]
+    assert "cpu" in lines[0]
+    assert "procs" in lines[0]
+
+
+def test_json_new_samples(monkeypatch, capsys):
+    # Every line has new cpu and net samples, not only a new time. The collectors
+    # count their calls.
+    def create(*args, **kwargs):
+        sampler = create_sampler(*args, **kwargs)
+        for name in ["cpu", "net"]:
+            calls = itertools.count()
+            sampler.metrics[name] = (partial(next, calls), sampler.metrics[name][1])
+        return sampler
+
+    monkeypatch.setattr(_app, "create_sampler", create)
+    run(["--json", "--interval", "0.05", "--count", "3", "--net", "lo"])
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [line["cpu"] for line in lines] == [0, 1, 2]
+    assert [line["net"] for line in lines] == [0, 1, 2]
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["--json", "--count", "0"],
+        ["--json", "--count", "-1"],
+        ["--json", "--interval", "0"],
+        ["--interval", "0.5"],
+        ["--count", "3"],
+        ["--headless"],
+    ],
+)
+def test_json_options(argv):
+    with pytest.raises(SystemExit):
+        run(argv)
@@ -0,0 +1,79 @@
+import urllib.request
+
+from tiptop._openmetrics import MetricsServer, format_metrics
+from tiptop._sampler import Sampler
+from tiptop._sysfs import NetStatsCollector
+
+
+def test_format_metrics():
+    text = format_metrics(
+        {
+            "cpu": {"total": 50.0, "per_thread": [40.0, 60.0], "breakdown": {}},
+            "temps": None,
+            "mem": {"total": 1024, "available": 512},
+            "procs": [
+                {
+                    "pid": 1,
+                    "name": 'a "b"\\c',
+                    "username": None,
+                    "cpu_percent": 1.5,
+                    "rss": 4096,
+                    "num_threads": None,
+                }
+            ],
+            "net": {"eth*": {name: 10 for name in NetStatsCollector.counters}},
+        },
+        {
+            "eth*": {
+                name: float("nan") if name == "bytes_sent" else 5.0
+                for name in NetStatsCollector.counters
+            }
+        },
+        missed_ticks=2,
+    )
+    lines = text.splitlines()
+    assert lines[-1] == "# EOF"
+    assert 'tiptop_info{version="' in text
+    assert 'tiptop_cpu_thread_busy_percent{thread="1"} 60.0' in lines
+    assert "tiptop_memory_available_bytes 512" in lines
+    assert 'tiptop_process_info{rank="1",name="a \\"b\\"\\\\c",user=""} 1' in lines
+    assert 'tiptop_process_cpu_percent{rank="1"} 1.5' in lines
+    # no values, no family
+    assert "tiptop_process_threads" not in text
+    assert "tiptop_cpu_temperature_celsius" not in text
+    assert "# TYPE tiptop_network_receive_bytes counter" in lines
+    assert 'tiptop_network_receive_bytes_total{interface="eth*"} 10' in lines
+    assert 'tiptop_network_receive_bytes_per_second{interface="eth*"} 5.0' in lines
+    assert 'tiptop_network_transmit_bytes_per_second{interface="eth*"} NaN' in lines
+    assert "tiptop_missed_ticks_total 2" in lines
+
+
+def test_metrics_server():
+    calls = []
+
+    def get_mem():
+        calls.append(1)
+        return {"total": 1024, "used": 100 * len(calls)}
+
+    sampler = Sampler()
+    sampler.add_metric("mem", get_mem, every=1.0)
+    server = MetricsServer(sampler, "127.0.0.1", 0)
+    server.start()
+    url = f"http://127.0.0.1:{server.address[1]}/metrics"
+
+    def scrape():
+        with urllib.request.urlopen(url) as response:
+            assert response.headers["Content-Type"].startswith(
+                "application/openmetrics-text"
+            )
+            return response.read().decode().splitlines()
+
+    # scrapes don't collect
+    assert "tiptop_memory_used_bytes 100" in scrape()
+    assert "tiptop_memory_used_bytes 100" in scrape()
+    assert len(calls) == 1
+
+    sampler.notify(sampler.collect())
+    sampler.notify(sampler.collect())
+    assert "tiptop_memory_used_bytes 200" in scrape()
+    server.stop()
@@ -0,0 +1,111 @@
+import os
+
+from tiptop._procfs import (
+    CLK_TCK,
+    Diskstats,
+    MountInfo,
+    ProcfsProcessCollector,
+    ProcStatCPUCollector,
+)
+
+
+def _write_proc(root, pid, name, utime, start_time=100):
+    d = root / str(pid)
+    d.mkdir(exist_ok=True)
+    (d / "stat").write_text(
+        # the name can contain spaces and parentheses
+        f"{pid} ({name}) R 1 {pid} {pid} 0 -1 4194560 100 0 0 0 {utime} 0 0 0 20 0 "
+        f"3 0 {start_time} 100000000 10 18446744073709551615 1 1 0 0 0 0 0\n"
+    )
+    (d / "status").write_text(f"Name:\t{name}\nUid:\t{os.getuid()}\t0\t0\t0\n")
+    (d / "cmdline").write_bytes(f"/usr/bin/{name}\0-v\0".encode())
+
+
+def test_procfs(tmp_path):
+    _write_proc(tmp_path, 1, "init", 0)
+    _write_proc(tmp_path, 2, "a (b) c", 0)
+    (tmp_path / "self").mkdir()
+
+    collector = ProcfsProcessCollector(max_num_procs=1, root=str(tmp_path))
+    procs = collector()
+    assert len(procs) == 1
+    assert procs[0]["cpu_percent"] == 0.0
+
+    collector.last_time -= 2.0
+    _write_proc(tmp_path, 2, "a (b) c", 2 * CLK_TCK)
+    procs = collector()
+    assert len(procs) == 1
+    p = procs[0]
+    assert p["pid"] == 2
+    assert p["name"] == "a (b) c"
+    assert p["cmdline"] == ["/usr/bin/a (b) c", "-v"]
+    assert p["num_threads"] == 3
+    assert p["status"] == "running"
+    # 2 s of CPU time in about 2 s
+    assert 95.0 < p["cpu_percent"] <= 100.0
+
+    # pid 2 is reused by another process
+    _write_proc(tmp_path, 2, "other", 2 * CLK_TCK, start_time=200)
+    procs = collector()
+    assert procs[0]["name"] == "other"
+
+
+def test_proc_stat_cpu(tmp_path):
+    stat = tmp_path / "stat"
+    stat.write_text(
+        "cpu  100 0 100 800 0 0 0 0 0 0\n"
+        "cpu0 50 0 50 400 0 0 0 0 0 0\n"
+        "cpu1 50 0 50 400 0 0 0 0 0 0\n"
+        "intr 12345 0 0\n"
+    )
+    collector = ProcStatCPUCollector(root=str(tmp_path))
+    # since boot
+    assert collector()["total"] == 20.0
+
+    # cpu0 busy with user and iowait, cpu1 idle with some steal
+    stat.write_text(
+        "cpu  180 20 100 880 60 0 0 20 10 0\n"
+        "cpu0 130 20 50 400 60 0 0 0 10 0\n"
+        "cpu1 50 0 50 480 0 0 0 20 0 0\n"
+        "intr 12345 0 0\n"
+    )
+    cpu = collector()
+    # iowait doesn't count as busy
+    assert cpu["per_thread"] == [100 / 160 * 100, 20.0]
+    assert cpu["total"] == 120 / 260 * 100
+    assert cpu["breakdown"]["user"] == 100 / 260 * 100
+    assert cpu["breakdown"]["iowait"] == 60 / 260 * 100
+    assert cpu["breakdown"]["steal"] == 20 / 260 * 100
+
+
+def test_mountinfo(tmp_path):
+    (tmp_path / "self").mkdir()
+    (tmp_path / "self" / "mountinfo").write_text(
+        "23 28 0:22 / /proc rw,relatime - proc proc rw\n"
+        "28 1 254:0 / / rw,relatime shared:1 - ext4 /dev/vda rw\n"
+        "29 28 254:0 /data /mnt/my\\040data rw shared:1 master:2 - ext4 /dev/vda rw\n"
+    )
+    mountinfo = MountInfo(str(tmp_path))
+    assert mountinfo.read() == [
+        ("0:22", "/proc", "proc", "proc"),
+        ("254:0", "/", "ext4", "/dev/vda"),
+        ("254:0", "/mnt/my data", "ext4", "/dev/vda"),
+    ]
+    mountinfo.close()
+
+
+def test_diskstats(tmp_path):
+    for path in ["block/sda/sda1", "block/nvme0n1", "block/loop0"]:
+        (tmp_path / path).mkdir(parents=True)
+    (tmp_path / "diskstats").write_text(
+        "   8       0 sda 100 0 800 50 10 0 80 20 0 60 70 0 0 0 0 0 0\n"
+        "   8       1 sda1 100 0 800 50 10 0 80 20 0 60 70 0 0 0 0 0 0\n"
+        # older kernels don't have the discard and flush fields
+        " 259       0 nvme0n1 1 2 3 4 5 6 7 8 9 10 11\n"
+        "   7       0 loop0 1 0 8 0 0 0 0 0 0 0 0 0 0 0 0 0 0\n"
+    )
+    diskstats = Diskstats(root=str(tmp_path), sys_block=str(tmp_path / "block"))
+    assert diskstats() == {
+        "sda": (100, 10, 800 * 512, 80 * 512, 50, 20, 60, 70),
+        "nvme0n1": (1, 5, 3 * 512, 7 * 512, 4, 8, 10, 11),
+    }
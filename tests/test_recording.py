@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from tiptop._recording import Recorder, Recording, read
+
+
+def test_recording(tmp_path):
+    path = str(tmp_path / "tiptop.rec")
+    recorder = Recorder(path, info={"num_cores": 2}, capacities={"procs": 2})
+    samples = [
+        {
+            "cpu": {"total": 12.5, "per_thread": [10.0, 15.0]},
+            "temps": None,
+            "mem": {"total": 8 * 1024**3, "available": 2 * 1024**3},
+            "disk_usage": [("/", 10, 20, 30, 50.0)],
+            "procs": [
+                {"pid": 1, "name": "init", "cmdline": ["/sbin/init", "-v"]},
+                {"pid": 2, "name": "kthreadd", "cmdline": []},
+            ],
+        },
+        {
+            "cpu": {"total": 25.0, "per_thread": [20.0, 30.0]},
+            "temps": [45.0],
+            "mem": {"total": 8 * 1024**3, "available": 1024**3},
+            "disk_usage": [("/", 10, 20, 30, 50.0)],
+            # more processes than recorded
+            "procs": [
+                {"pid": 3, "name": "python", "cmdline": None},
+                {"pid": 1, "name": "init", "cmdline": ["/sbin/init", "-v"]},
+                {"pid": 4, "name": "bash", "cmdline": ["bash"]},
+            ],
+        },
+    ]
+    for k, sample in enumerate(samples):
+        recorder.write(sample, monotonic_time=100.0 + 2 * k)
+    recorder.close()
+
+    # a record that was cut short at the end is left out
+    with open(path, "ab") as f:
+        f.write(b"\0" * 10)
+
+    records = list(read(path))
+    assert records[1][0] - records[0][0] == 2.0
+    out = [sample for _, sample in records]
+    assert out[0] == samples[0]
+    # the columns grow when a metric isn't None anymore
+    assert out[1]["temps"] == [45.0]
+    assert out[1]["procs"] == samples[1]["procs"][:2]
+    assert out[1]["cpu"] == samples[1]["cpu"]
+
+
+def test_recording_shape_changes(tmp_path):
+    path = str(tmp_path / "tiptop.rec")
+    recorder = Recorder(path)
+    samples = [
+        {"disk_io": {"sda": 1.0}, "sensors": None},
+        # a disk is added, and there are sensors now
+        {"disk_io": {"sda": 2.0, "sdb": 3.0}, "sensors": {"nvme Composite": 40.0}},
+        # a sample that needs more than one record
+        {"disk_io": {f"loop{k}": float(k) for k in range(100)}, "sensors": None},
+        {"disk_io": {"sda": 4.0}, "sensors": None},
+    ]
+    for k, sample in enumerate(samples):
+        recorder.write(sample, monotonic_time=2.0 * k)
+    recorder.close()
+
+    out = [sample for _, sample in read(path)]
+    assert out[1] == samples[1]
+    assert out[2]["disk_io"] == {"sda": None, "sdb": None, **samples[2]["disk_io"]}
+    assert out[3]["disk_io"]["sda"] == 4.0
+
+    # the last sample, which still has the columns of the loop devices, is cut
+    # short
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        f.truncate(size - Recording(path).record_size - 10)
+    out = [sample for _, sample in read(path)]
+    assert len(out) == 3
+
+
+def test_recording_seek(tmp_path):
+    path = str(tmp_path / "tiptop.rec")
+    recorder = Recorder(path)
+    for k in range(100):
+        # new strings every now and then
+        recorder.write({"k": k, "name": f"proc{k // 10}"}, monotonic_time=2.0 * k)
+    recorder.close()
+
+    recording = Recording(path)
+    t0 = recording.time(recording.first)
+    # a time between two samples
+    k = recording.find(t0 + 101.0)
+    assert recording.sample(k)[1] == {"k": 51, "name": "proc5"}
+    # backwards, which needs fewer strings
+    assert recording.sample(recording.find(t0))[1] == {"k": 0, "name": "proc0"}
+    assert recording.sample(recording.find(t0 + 1.0e6))[1]["k"] == 99
+    recording.close()
+
+
+def test_recording_string_table_reset(tmp_path):
+    path = str(tmp_path / "tiptop.rec")
+    recorder = Recorder(path, max_string_table_size=100)
+    for k in range(100):
+        recorder.write({"k": k, "name": f"proc{k // 3}"}, monotonic_time=2.0 * k)
+        assert recorder.string_table_size < 150
+    recorder.close()
+
+    assert [sample["name"] for _, sample in read(path)] == [
+        f"proc{k // 3}" for k in range(100)
+    ]
+    # back and forth between tables
+    recording = Recording(path)
+    t0 = recording.time(recording.first)
+    for k in [90, 10, 11, 95, 0]:
+        assert recording.sample(recording.find(t0 + 2.0 * k))[1] == {
+            "k": k,
+            "name": f"proc{k // 3}",
+        }
+    recording.close()
+
+
+def test_recording_cut_in_header(tmp_path):
+    path = str(tmp_path / "tiptop.rec")
+    recorder = Recorder(path, info={"every": 2.0})
+    recorder.write({"k": 1}, monotonic_time=0.0)
+    recorder.close()
+    with open(path, "rb") as f:
+        data = f.read()
+
+    # in the length, and in the description
+    for size in [10, 30]:
+        with open(path, "wb") as f:
+            f.write(data[:size])
+        with pytest.raises(ValueError, match="Not a tiptop recording"):
+            Recording(path)
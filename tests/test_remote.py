@@ -0,0 +1,120 @@
+import json
+import math
+import os
+import queue
+import socket
+import threading
+import time
+
+import pytest
+
+from tiptop._remote import Agent, Connection, apply, delta
+from tiptop._sampler import Sampler
+
+
+def _procs(num, changed=()):
+    return [
+        {
+            "pid": pid,
+            "name": f"proc{pid}",
+            "cmdline": [f"/usr/bin/proc{pid}", "--flag"],
+            "cpu_percent": 50.0 if pid in changed else 0.0,
+        }
+        for pid in range(1, num + 1)
+    ]
+
+
+def test_delta():
+    old = {"cpu": {"total": 1.0, "per_thread": [1.0, 1.0]}, "procs": _procs(10_000)}
+    new = {
+        "cpu": {"total": 2.0, "per_thread": [1.0, 1.0]},
+        "procs": _procs(10_000, [7]),
+    }
+    # the process moves to the top
+    new["procs"].insert(0, new["procs"].pop(6))
+    patch = json.loads(json.dumps(delta(old, new)))
+    assert apply(old, patch) == new
+    assert patch[1]["cpu"] == ["{", {"total": ["=", 2.0]}, []]
+    # only the changed row, and the order
+    assert list(patch[1]["procs"][1]) == ["7"]
+    assert delta(new, new) == ["."]
+
+
+def _roundtrip(data):
+    # what arrives at the viewer, e.g., tuples become lists
+    return json.loads(json.dumps(data))
+
+
+@pytest.mark.parametrize("unix", [False, True])
+def test_agent(tmp_path, unix):
+    state = {"tick": 0}
+    sampler = Sampler()
+    sampler.add_metric("host", lambda: {"node": "box"}, every=None)
+    sampler.add_metric("mem", lambda: {"used": 100 * state["tick"]}, every=1.0)
+    sampler.add_metric("disk_usage", lambda: [("/", 1, 2, 3, 50.0)], every=2.0)
+    sampler.add_metric("procs", lambda: _procs(100, [state["tick"]]), every=1.0)
+
+    address = str(tmp_path / "agent.sock") if unix else "127.0.0.1:0"
+    agent = Agent(sampler, address)
+    agent.start()
+    if not unix:
+        address = "127.0.0.1:{}".format(agent.address[1])
+
+    # The viewer gets all data with the next snapshot of the agent.
+    connections = []
+    thread = threading.Thread(target=lambda: connections.append(Connection(address)))
+    thread.start()
+    for _ in range(100):
+        if agent.new_viewers:
+            break
+        time.sleep(0.01)
+    agent.broadcast(sampler.tick())
+    thread.join()
+    connection = connections[0]
+    assert connection.data == _roundtrip(sampler.latest)
+
+    snapshots = queue.Queue()
+    connection.start(snapshots.put)
+    first = snapshots.get(timeout=1.0)
+    assert set(first) == {"host", "mem", "disk_usage", "procs"}
+
+    for tick in range(1, 4):
+        state["tick"] = tick
+        agent.broadcast(sampler.tick())
+        snapshot = snapshots.get(timeout=1.0)
+        # only the metrics that were collected in this tick
+        assert set(snapshot) == (
+            {"mem", "procs", "disk_usage"} if tick % 2 == 0 else {"mem", "procs"}
+        )
+        assert snapshot.times["mem"] == sampler.times["mem"]
+        assert connection.data == _roundtrip(sampler.latest)
+    assert connection.sampler.cadence("disk_usage") == 2.0
+    assert connection.sampler.cadence("host") == math.inf
+
+    connection.stop()
+    agent.stop()
+    # stopping again doesn't fail, even though the socket file is gone
+    agent.stop()
+
+
+def test_agent_slow_viewer(tmp_path):
+    # a viewer that never reads can't stall the agent, and is dropped
+    sampler = Sampler()
+    sampler.add_metric("blob", lambda: os.urandom(500_000).hex(), every=1.0)
+    agent = Agent(sampler, str(tmp_path / "agent.sock"), max_queued=2)
+    agent.start()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(str(tmp_path / "agent.sock"))
+    for _ in range(100):
+        if agent.new_viewers:
+            break
+        time.sleep(0.01)
+
+    for _ in range(10):
+        start = time.monotonic()
+        agent.broadcast(sampler.tick())
+        assert time.monotonic() - start < 0.5
+    assert agent.viewers == []
+
+    sock.close()
+    agent.stop()
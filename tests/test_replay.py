@@ -0,0 +1,41 @@
+import queue
+
+from tiptop._recording import Recorder, Recording
+from tiptop._replay import Player
+
+
+def test_player(tmp_path):
+    path = str(tmp_path / "tiptop.rec")
+    recorder = Recorder(path, info={"every": 2.0})
+    for k in range(5):
+        recorder.write({"net": {"eth0": {"bytes_recv": 1000 * k}}}, 2.0 * k)
+    # a gap of an hour
+    recorder.write({"net": {"eth0": {"bytes_recv": 9000}}}, 3608.0)
+    recorder.close()
+
+    recording = Recording(path)
+    t0 = recording.time(recording.first)
+    player = Player(recording, speed=1000.0, start=t0 + 4.0)
+    assert player.sampler.get("net") == {"eth0": {"bytes_recv": 2000}}
+
+    snapshots = queue.Queue()
+    player.start(snapshots.put)
+    out = [snapshots.get(timeout=1.0) for _ in range(4)]
+    assert [s["net"]["eth0"]["bytes_recv"] for s in out] == [2000, 3000, 4000, 9000]
+    # the recorded times, so the rates are right
+    assert out[1].times["net"] - out[0].times["net"] == 2.0
+    assert out[1]["time"] == out[1].times["net"]
+    # the gap is skipped, but shows up as missed ticks
+    assert out[3].missed_ticks == 1799
+    assert out[3]["replay"]["end"]
+
+    player.toggle_pause()
+    assert snapshots.get(timeout=1.0)["replay"]["paused"]
+    # jump back while paused
+    player.seek(t0)
+    snapshot = snapshots.get(timeout=1.0)
+    assert snapshot["net"]["eth0"]["bytes_recv"] == 0
+    assert snapshot["replay"]["paused"]
+    assert snapshots.empty()
+    player.stop()
+    recording.close()
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from tiptop._sampler import Sampler, SamplerThread
+
+
+def test_cadences():
+    counts = {"a": 0, "b": 0}
+
+    def make_collector(name):
+        def collect():
+            counts[name] += 1
+            return counts[name]
+
+        return collect
+
+    sampler = Sampler(interval=1.0)
+    sampler.add_metric("a", make_collector("a"), every=1.0)
+    sampler.add_metric("b", make_collector("b"), every=3.0)
+    assert sampler.cadence("b") == 3.0
+
+    received = []
+    sampler.subscribe(received.append, "b")
+    # called immediately
+    assert received == [{"b": 1}]
+
+    snapshots = [sampler.tick() for _ in range(7)]
+    # "b" was collected on subscription, so the first tick doesn't collect it again
+    assert snapshots[0] == {"a": 1}
+    assert snapshots[3] == {"a": 4, "b": 2}
+    assert snapshots[6] == {"a": 7, "b": 3}
+    assert counts == {"a": 7, "b": 3}
+    # subscribers are only called if their metrics were collected
+    assert received == [{"b": 1}, {"b": 2}, {"b": 3}]
+
+
+def test_thread():
+    sampler = Sampler(interval=0.01)
+    sampler.add_metric("thread", lambda: threading.current_thread().name, every=0.01)
+    sampler.add_metric("once", lambda: 1, every=None)
+
+    snapshots = []
+    done = threading.Event()
+
+    def callback(snapshot):
+        snapshots.append(snapshot)
+        if len(snapshots) == 3:
+            done.set()
+
+    thread = SamplerThread(sampler)
+    thread.start(callback)
+    assert done.wait(5.0)
+    thread.stop()
+
+    # collected in the background thread
+    assert snapshots[0] == {"thread": "tiptop-sampler", "once": 1}
+    assert snapshots[1] == {"thread": "tiptop-sampler"}
+    # the subscribers and the latest data are only touched by notify()
+    assert sampler.latest == {}
+
+
+def test_missed_ticks():
+    sampler = Sampler(interval=0.01)
+    sampler.add_metric("a", lambda: 1, every=0.01)
+
+    received = []
+    sampler.subscribe(received.append, "a")
+    # "a" was just collected on subscription, so this tick skips it
+    sampler.tick()
+    # three ticks are missed
+    time.sleep(0.04)
+    snapshot = sampler.tick()
+    assert snapshot.missed_ticks >= 3
+    assert sampler.missed_ticks == snapshot.missed_ticks
+
+    # every sample has the time it was collected
+    t0, t1 = (r.times["a"] for r in received)
+    assert t1 - t0 >= 0.04
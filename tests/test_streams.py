@@ -52,6 +52,23 @@ def test_braille_stream_tall():
     assert stream.graph == [" ⢸⡀", " ⢸⡇", "⢰⢸⡇", "⢸⣼⡇"]
 
 
+def test_braille_stream_resize():
+    stream = tiptop.BrailleStream(3, 1, 0.0, 100.0)
+    for value in [10.0, 30.0, 60.0, 90.0]:
+        stream.add_value(value)
+
+    stream.reset_height(2)
+    assert stream.graph == ["  ⣸", " ⣰⣿"]
+
+    stream.reset_width(5)
+    assert stream.graph == ["    ⣸", "   ⣰⣿"]
+    assert stream.values == [0.0] * 7 + [10.0, 30.0, 60.0, 90.0]
+
+    stream.reset_width(2)
+    assert stream.graph == [" ⣸", "⣰⣿"]
+    assert stream.last_value == 90.0
+
+
 def test_blockchar_stream():
     stream = tiptop.BlockCharStream(5, 1, 0.0, 100.0)
 
@@ -88,3 +105,84 @@ def test_blockchar_stream_tall():
 
     stream.add_value(0.0)
     assert stream.graph == [" █ ", "▄█ ", "██ ", "██ "]
+
+
+def test_braille_stream_version():
+    stream = tiptop.BrailleStream(3, 1, 0.0, 100.0)
+
+    # adding minval to an empty graph doesn't change it
+    for _ in range(10):
+        stream.add_value(0.0)
+    assert stream.version == 0
+
+    stream.add_value(50.0)
+    assert stream.version == 1
+    assert stream.graph == ["  ⢠"]
+
+    # the graph keeps changing until the value has scrolled through
+    for _ in range(7):
+        stream.add_value(50.0)
+    version = stream.version
+    assert stream.graph == ["⣤⣤⣤"]
+    stream.add_value(50.0)
+    assert stream.version == version
+
+    stream.reset_width(4)
+    assert stream.version == version + 1
+
+
+def test_braille_stream_autoscale():
+    stream = tiptop.BrailleStream(2, 1, 0.0, 10.0, autoscale=True)
+
+    stream.add_value(5.0)
+    assert stream.maxval == 10.0
+    assert stream.graph == [" ⢠"]
+
+    # a burst rescales the history, too
+    stream.add_value(40.0)
+    assert stream.maxval == 50.0
+    assert stream.graph == [" ⣸"]
+
+    for _ in range(4):
+        stream.add_value(1.0)
+    assert stream.maxval == 50.0
+
+    # scale back down once the burst has left the window
+    stream.add_value(1.0)
+    assert stream.maxval == 10.0
+    assert stream.graph == ["⣀⣀"]
+
+
+def test_blockchar_stream_resize():
+    stream = tiptop.BlockCharStream(3, 2, 0.0, 100.0)
+    for value in [10.0, 60.0, 100.0]:
+        stream.add_value(value)
+    assert stream.graph == [" ▂█", "▂██"]
+
+    stream.reset_height(1)
+    assert stream.graph == ["▁▅█"]
+
+    stream.reset_width(5)
+    assert stream.graph == ["  ▁▅█"]
+    assert stream.last_value == 100.0
+
+
+def test_blockchar_stream_upside_down():
+    stream = tiptop.BlockCharStream(3, 1, 0.0, 100.0, flipud=True)
+    for value in [10.0, 40.0, 100.0]:
+        stream.add_value(value)
+    assert stream.graph == ["▔▀█"]
+
+
+def test_braille_multi_stream():
+    stream = tiptop.BrailleMultiStream(2, 3, 1, 0.0, 100.0)
+
+    stream.add_values([10.0, 90.0])
+    assert stream.graphs == [["  ⢀"], ["  ⢸"]]
+
+    stream.add_values([30.0, 60.0])
+    assert stream.graphs == [["  ⣠"], ["  ⣷"]]
+    assert stream.last_values == [30.0, 60.0]
+
+    stream.add_values([60.0, 30.0])
+    assert stream.graphs == [[" ⢀⣴"], [" ⢸⣦"]]
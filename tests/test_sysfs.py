@@ -0,0 +1,158 @@
+from tiptop._sysfs import (
+    CounterTotals,
+    CpufreqCollector,
+    HwmonCollector,
+    NetStatsCollector,
+)
+
+
+def _write_hwmon(root, hwmon, name, temps):
+    d = root / hwmon
+    d.mkdir()
+    (d / "name").write_text(name + "\n")
+    for k, (label, millidegrees) in temps.items():
+        if label is not None:
+            (d / f"temp{k}_label").write_text(label + "\n")
+        (d / f"temp{k}_input").write_text(f"{millidegrees}\n")
+
+
+def test_hwmon(tmp_path):
+    _write_hwmon(tmp_path, "hwmon0", "acpitz", {1: (None, 27800)})
+    _write_hwmon(tmp_path, "hwmon2", "nvme", {1: ("Composite", 40850)})
+    _write_hwmon(tmp_path, "hwmon10", "nvme", {1: ("Composite", 35850)})
+    _write_hwmon(
+        tmp_path,
+        "hwmon9",
+        "coretemp",
+        {1: ("Package id 0", 45000), 2: ("Core 0", 43000), 10: ("Core 1", 44000)},
+    )
+
+    hwmon = HwmonCollector(str(tmp_path))
+    assert hwmon.cpu_temps() == [45.0, 43.0, 44.0]
+    assert hwmon.sensors() == {
+        "acpitz temp1": 27.8,
+        "nvme Composite": 40.85,
+        "coretemp Package id 0": 45.0,
+        "coretemp Core 0": 43.0,
+        "coretemp Core 1": 44.0,
+        "nvme.1 Composite": 35.85,
+    }
+
+    # the files are kept open and read again
+    (tmp_path / "hwmon9" / "temp2_input").write_text("50000\n")
+    assert hwmon.cpu_temps() == [45.0, 50.0, 44.0]
+
+    # a sensor that can't be read keeps its position
+    (tmp_path / "hwmon9" / "temp2_input").write_text("\n")
+    assert hwmon.cpu_temps() == [45.0, None, 44.0]
+    assert hwmon.sensors()["coretemp Core 0"] is None
+    hwmon.close()
+
+
+def test_hwmon_missing(tmp_path):
+    hwmon = HwmonCollector(str(tmp_path / "nonexistent"))
+    assert hwmon.cpu_temps() is None
+    assert hwmon.sensors() == {}
+
+
+def test_cpufreq(tmp_path):
+    for k, (cpus, freq) in enumerate([("0 2", 800000), ("1 3", 4200000), ("", 0)]):
+        d = tmp_path / f"policy{k}"
+        d.mkdir()
+        (d / "affected_cpus").write_text(cpus + "\n")
+        (d / "scaling_cur_freq").write_text(f"{freq}\n")
+
+    cpufreq = CpufreqCollector(str(tmp_path))
+    freq = cpufreq()
+    assert freq["per_thread"] == [800.0, 4200.0, 800.0, 4200.0]
+    assert freq["min"] == 800.0
+    assert freq["avg"] == 2500.0
+    assert freq["max"] == 4200.0
+    cpufreq.close()
+
+
+def _write_net(root, name, rx, tx):
+    # the same value for all rx and all tx counters
+    d = root / name / "statistics"
+    d.mkdir(parents=True, exist_ok=True)
+    for filename in NetStatsCollector.counters.values():
+        (d / filename).write_text(f"{rx if filename.startswith('rx') else tx}\n")
+
+
+def _counters(rx, tx):
+    return {
+        name: rx if filename.startswith("rx") else tx
+        for name, filename in NetStatsCollector.counters.items()
+    }
+
+
+def _write_net_dev(path, interfaces):
+    # /proc/net/dev with the same value for all rx and all tx counters
+    lines = [
+        "Inter-|   Receive                            |  Transmit",
+        " face |bytes    packets errs drop fifo frame compressed multicast|bytes ...",
+    ]
+    for name, (rx, tx) in interfaces.items():
+        lines.append(
+            f"{name:>6}: {rx} {rx} {rx} {rx} 0 0 0 0 {tx} {tx} {tx} {tx} 0 0 0 0"
+        )
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_net_stats(tmp_path):
+    _write_net(tmp_path, "eth0", 100, 10)
+    net_dev = tmp_path / "net_dev"
+    interfaces = {"eth0": (100, 10), "veth1": (1, 2), "veth2": (3, 4)}
+    _write_net_dev(net_dev, interfaces)
+
+    net = NetStatsCollector(
+        ["eth0", "veth*", "bond0"], str(tmp_path), net_dev=str(net_dev)
+    )
+    # only the named interfaces are kept open
+    assert list(net.interfaces) == ["eth0"]
+    assert net() == {
+        "eth0": _counters(100, 10),
+        "veth*": _counters(4, 6),
+        "bond0": _counters(0, 0),
+    }
+    assert net()["eth0"]["packets_recv"] == 100
+    assert net()["eth0"]["dropout"] == 10
+
+    # Only what a new interface adds from then on counts, not its whole lifetime
+    # counter.
+    interfaces["veth3"] = (5000, 6000)
+    _write_net_dev(net_dev, interfaces)
+    assert net()["veth*"] == _counters(4, 6)
+    interfaces["veth3"] = (5007, 6008)
+    _write_net_dev(net_dev, interfaces)
+    assert net()["veth*"] == _counters(11, 14)
+
+    # a removed interface is dropped, and the totals don't go down
+    del interfaces["veth1"]
+    interfaces["veth2"] = (4, 5)
+    _write_net_dev(net_dev, interfaces)
+    assert net()["veth*"] == _counters(12, 15)
+
+    # A named interface that can't be read is dropped without a rescan, and picked
+    # up again by the next one.
+    (tmp_path / "eth0" / "statistics" / "rx_bytes").write_text("\n")
+    assert net()["eth0"] == _counters(0, 0)
+    assert list(net.interfaces) == []
+    _write_net(tmp_path, "eth0", 200, 20)
+    _write_net(tmp_path, "bond0", 1, 1)
+    net.last_scan -= net.rescan_interval
+    out = net()
+    assert out["eth0"] == _counters(200, 20)
+    assert out["bond0"] == _counters(1, 1)
+    net.close()
+    assert net.interfaces == {}
+
+
+def test_counter_totals():
+    totals = CounterTotals(2)
+    assert totals.update({}) == [0, 0]
+    assert totals.update({"a": [10, 20]}) == [0, 0]
+    assert totals.update({"a": [15, 20], "b": [1000, 1000]}) == [5, 0]
+    # "a" started over, e.g., it was created again
+    assert totals.update({"a": [1, 2], "b": [1001, 1003]}) == [6, 3]
+    assert totals.update({"b": [1002, 1003]}) == [7, 3]